@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cost of the alignment-head processing of one AlignAtt.infer call: re-processing the
+whole accumulated cross-attention after every token (previous `_process_cross_attention`)
+vs. the streaming AlignmentAccumulator.
+
+The decoder passes are simulated with random cross-attention logits: one prompt pass
+of --prompt tokens, then one pass per decoded token. The most attended frame of the
+last token and the max abs difference of its attention row are checked at every step.
+Alignment heads are Whisper's default ones (every head of the second half of the layers).
+
+    python scripts/benchmark_alignment.py --model base --tokens 100 --beams 1
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from whisperlivekit.simul_whisper.alignment import AlignmentAccumulator
+from whisperlivekit.whisper.timing import median_filter
+
+DECODER_DIMS = {
+    # n_text_head, n_text_layer
+    "tiny": (6, 4),
+    "base": (8, 6),
+    "small": (12, 12),
+    "medium": (16, 24),
+    "large-v3": (20, 32),
+    "large-v3-turbo": (20, 4),
+}
+
+
+def default_align_source(n_head, n_layer):
+    align_source, rank = {}, 0
+    for layer in range(n_layer // 2, n_layer):
+        align_source[layer] = []
+        for head in range(n_head):
+            align_source[layer].append((rank, head))
+            rank += 1
+    return align_source, rank
+
+
+def reprocess_all(accumulated, align_source, num_align_heads, single_row, content_mel_len):
+    """The per-token processing AlignAtt did before AlignmentAccumulator."""
+    per_head = [[] for _ in range(num_align_heads)]
+    n_layer = len(accumulated[0])
+    flattened = [attn for layers in accumulated for attn in layers]
+    for idx, attn_mat in enumerate(flattened):
+        heads = align_source.get(idx % n_layer, [])
+        if not heads:
+            continue
+        attn_mat = F.softmax(attn_mat, dim=-1)
+        for rank, head_id in heads:
+            a = attn_mat[0, head_id].unsqueeze(0) if single_row else attn_mat[:, head_id]
+            per_head[rank].append(a)
+    attn = torch.stack([torch.cat(mats, dim=1) for mats in per_head], dim=1)
+    std, mean = torch.std_mean(attn, dim=-2, keepdim=True, unbiased=False)
+    attn = (attn - mean) / (std + 1e-8)
+    attn = median_filter(attn, 7)
+    return attn.mean(dim=1)[:, :, :content_mel_len]
+
+
+def simulate_passes(n_head, n_layer, beams, prompt, tokens, audio_ctx, generator):
+    passes = []
+    for seq_len in [prompt] + [1] * tokens:
+        passes.append([torch.randn(beams, n_head, seq_len, audio_ctx, generator=generator) * 4 for _ in range(n_layer)])
+    return passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", choices=sorted(DECODER_DIMS))
+    parser.add_argument("--prompt", type=int, default=30)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--beams", type=int, default=1)
+    parser.add_argument("--audio-ctx", type=int, default=1500)
+    parser.add_argument("--content-frames", type=int, default=1000)
+    args = parser.parse_args()
+
+    n_head, n_layer = DECODER_DIMS[args.model]
+    align_source, num_align_heads = default_align_source(n_head, n_layer)
+    single_row = args.beams == 1
+    passes = simulate_passes(n_head, n_layer, args.beams, args.prompt, args.tokens, args.audio_ctx,
+                             torch.Generator().manual_seed(0))
+
+    reference_rows, reference_time = [], 0.0
+    accumulated = []
+    for cross_attns in passes:
+        beg = time.perf_counter()
+        accumulated.append(cross_attns)
+        row = reprocess_all(accumulated, align_source, num_align_heads, single_row, args.content_frames)[:, -1, :]
+        reference_time += time.perf_counter() - beg
+        reference_rows.append(row)
+
+    streaming_rows, streaming_time = [], 0.0
+    alignment = AlignmentAccumulator(align_source, num_align_heads, single_row=single_row)
+    for cross_attns in passes:
+        beg = time.perf_counter()
+        alignment.add(cross_attns)
+        row = alignment.last_row(args.content_frames, args.beams)[:, -1, :]
+        streaming_time += time.perf_counter() - beg
+        streaming_rows.append(row)
+
+    same_frames = all(torch.equal(a.argmax(-1), b.argmax(-1)) for a, b in zip(reference_rows, streaming_rows))
+    max_diff = max((a - b).abs().max().item() for a, b in zip(reference_rows, streaming_rows))
+    n_steps = len(passes)
+    print(f"{args.model} decoder dims, {num_align_heads} alignment heads, {args.beams} beams, "
+          f"{args.prompt} prompt tokens + {args.tokens} decoded tokens, {torch.get_num_threads()} threads")
+    print(f"re-process all : {reference_time / n_steps * 1000:8.2f}ms / token")
+    print(f"accumulator    : {streaming_time / n_steps * 1000:8.2f}ms / token "
+          f"({reference_time / streaming_time:.1f}x)")
+    print(f"same most attended frames: {same_frames}, max abs diff of the last row: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
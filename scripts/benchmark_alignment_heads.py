@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-token decoder cost when the cross-attention of every head of every layer is
+returned (previous AlignAtt decoding) vs. only the alignment heads
+(`TextDecoder.forward(alignment_heads=...)`, the other heads through SDPA).
+
+Reports the size of the returned cross-attention, the memory allocated per token
+(PyTorch profiler) and the latency, each followed by the alignment processing of
+AlignmentAccumulator. Weights are random; the alignment heads are the model's own.
+
+    python scripts/benchmark_alignment_heads.py --model large-v3-turbo --tokens 50
+"""
+
+import argparse
+import base64
+import gzip
+import time
+
+import numpy as np
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+from whisperlivekit.simul_whisper.alignment import AlignmentAccumulator
+from whisperlivekit.whisper import _ALIGNMENT_HEADS
+from whisperlivekit.whisper.model import TextDecoder
+
+DECODER_DIMS = {
+    # n_text_state, n_text_head, n_text_layer
+    "tiny": (384, 6, 4),
+    "base": (512, 8, 6),
+    "small": (768, 12, 12),
+    "medium": (1024, 16, 24),
+    "large-v3": (1280, 20, 32),
+    "large-v3-turbo": (1280, 20, 4),
+}
+
+
+def alignment_source(model, n_head, n_layer):
+    mask = np.frombuffer(gzip.decompress(base64.b85decode(_ALIGNMENT_HEADS[model])), dtype=bool)
+    mask = mask.reshape(n_layer, n_head)
+    align_source, rank = {}, 0
+    for layer, head in zip(*np.nonzero(mask)):
+        align_source.setdefault(int(layer), []).append((rank, int(head)))
+        rank += 1
+    return align_source, rank
+
+
+@torch.no_grad()
+def decode(decoder, features, prompt, n_tokens, align_source, num_align_heads, selected):
+    alignment_heads = {layer: [h for _, h in heads] for layer, heads in align_source.items()} if selected else None
+    alignment = AlignmentAccumulator(align_source, num_align_heads, single_row=True, selected_heads=selected)
+    kv_cache = {}
+    tokens = prompt
+    latencies, returned_bytes = [], []
+    for _ in range(n_tokens):
+        beg = time.perf_counter()
+        logits, cross_attns = decoder(
+            tokens, features, kv_cache=kv_cache, return_cross_attn=True, alignment_heads=alignment_heads
+        )
+        alignment.add(cross_attns)
+        alignment.last_row(features.shape[1])
+        tokens = logits[:, -1:].argmax(dim=-1)
+        latencies.append(time.perf_counter() - beg)
+        returned_bytes.append(sum(a.numel() * a.element_size() for a in cross_attns if a is not None))
+    return latencies[1:], returned_bytes[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", choices=sorted(DECODER_DIMS))
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--prompt", type=int, default=30)
+    parser.add_argument("--audio-ctx", type=int, default=1500)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    n_state, n_head, n_layer = DECODER_DIMS[args.model]
+    decoder = TextDecoder(51865, 448, n_state, n_head, n_layer).eval()
+    torch.nn.init.normal_(decoder.positional_embedding, std=0.01)
+    align_source, num_align_heads = alignment_source(args.model, n_head, n_layer)
+    features = torch.randn(1, args.audio_ctx, n_state)
+    prompt = torch.randint(0, 50000, (1, args.prompt))
+
+    print(f"{args.model} decoder dims, {num_align_heads} alignment heads out of {n_head * n_layer}, "
+          f"{args.tokens} tokens, {torch.get_num_threads()} threads")
+    for name, selected in (("all heads", False), ("alignment heads", True)):
+        decode(decoder, features, prompt, 3, align_source, num_align_heads, selected)  # warmup
+        latencies, returned_bytes = decode(decoder, features, prompt, args.tokens, align_source, num_align_heads, selected)
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            decode(decoder, features, prompt, args.tokens, align_source, num_align_heads, selected)
+        allocated = sum(e.cpu_memory_usage for e in prof.events() if e.cpu_memory_usage > 0)
+        latencies.sort()
+        print(
+            f"{name:15s}: cross-attention returned {np.mean(returned_bytes) / 1e6:7.3f} MB / token, "
+            f"allocated {allocated / args.tokens / 1e6:7.2f} MB / token, "
+            f"median {latencies[len(latencies) // 2] * 1000:.2f}ms / token"
+        )
+
+
+if __name__ == "__main__":
+    main()
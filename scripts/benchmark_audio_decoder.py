@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+CPU and memory per session of the decoders of the MediaRecorder audio (without
+--pcm-input): `FFmpegManager` (one ffmpeg process per session) vs. `PyAVDecoder`
+(--audio-decoder pyav, a decoding thread per session in the server process).
+
+--sessions sessions run on one event loop, as in the server. Each one writes a
+WebM/Opus stream (48 kHz mono, as MediaRecorder sends it) in --timeslice second
+slices in real time for --seconds, while a reader task pulls the PCM the way
+`AudioProcessor.ffmpeg_stdout_reader` does. The stream is encoded with PyAV from the
+--speech WAV files (16 kHz mono 16-bit), or from synthetic voiced bursts without
+them, so both decoders need PyAV installed here (and ffmpeg on the PATH).
+
+Each decoder runs in its own Python process. Reported: the CPU time per audio second
+and session (server process plus ffmpeg processes), and the memory added per
+session (RSS, PSS and USS of the server process over its baseline, plus those of
+the ffmpeg processes, halfway through the run; PSS shares the pages of the common
+libraries between the processes that map them, USS counts only the private pages),
+and the time from the last slice
+written to the last samples read (decoding and reading delay under load).
+
+    python scripts/benchmark_audio_decoder.py --sessions 50 --seconds 20
+"""
+
+import argparse
+import asyncio
+import io
+import resource
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def read_wav(path):
+    with wave.open(path) as f:
+        if f.getframerate() != SAMPLE_RATE or f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise ValueError(f"{path}: 16 kHz mono 16-bit WAV expected")
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+
+
+def synthetic_speech(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 8)) * (np.sin(2 * np.pi * 0.4 * t) > 0)
+    return (32767 * (0.2 * voiced + 0.005 * rng.standard_normal(len(t)))).astype(np.int16)
+
+
+def encode_webm(pcm, timeslice):
+    """WebM/Opus stream of `pcm`, cut in the byte slices of `timeslice` seconds of audio."""
+    import av
+
+    buffer = io.BytesIO()
+    cuts = []
+    with av.open(buffer, "w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=48000)
+        stream.layout = "mono"
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=48000)
+        step = int(timeslice * SAMPLE_RATE)
+        for i in range(0, len(pcm), step):
+            frame = av.AudioFrame.from_ndarray(pcm[None, i:i + step], format="s16", layout="mono")
+            frame.sample_rate = SAMPLE_RATE
+            for resampled in resampler.resample(frame):
+                for packet in stream.encode(resampled):
+                    container.mux(packet)
+            cuts.append(buffer.tell())
+        for packet in stream.encode(None):
+            container.mux(packet)
+    data = buffer.getvalue()
+    cuts[-1] = len(data)
+    return [data[a:b] for a, b in zip([0] + cuts[:-1], cuts)]
+
+
+def decoded_samples(slices):
+    """Samples of the decoded stream (a few less than encoded: Opus trims its padding)."""
+    import av
+
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    with av.open(io.BytesIO(b"".join(slices))) as container:
+        frames = [f for frame in container.decode(audio=0) for f in resampler.resample(frame)]
+    return sum(f.samples for f in frames + resampler.resample(None))
+
+
+def memory_kb(pid="self"):
+    """RSS, PSS and private memory (USS) of a process, in kB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[key] = int(rest.split()[0])
+    return np.array([values["Rss"], values["Pss"], values["Private_Clean"] + values["Private_Dirty"]])
+
+
+async def session(decoder, slices, timeslice, start, samples, expected, lags, index):
+    async def reader():
+        beg = time.time()
+        while True:
+            state = await decoder.get_state()
+            if state != FFmpegState.RUNNING:
+                break
+            now = time.time()
+            size = max(int(32000 * max(0.0, now - beg)), 4096)
+            beg = now
+            chunk = await decoder.read_data(size)
+            if not chunk:
+                await asyncio.sleep(0.05)
+                continue
+            samples[index] += len(chunk) // 2
+
+    await decoder.start()
+    task = asyncio.create_task(reader())
+    for k, data in enumerate(slices):
+        await asyncio.sleep(max(0.0, start + (k + 1) * timeslice - time.perf_counter()))
+        await decoder.write_data(data)
+    # ffmpeg only exits once its output is read: stop after the last samples (but the
+    # tail of the resampler, which only comes out at the end of the stream)
+    written = time.perf_counter()
+    while samples[index] < expected - SAMPLE_RATE // 50 and time.perf_counter() - written < 10:
+        await asyncio.sleep(0.01)
+    lags.append(time.perf_counter() - written)
+    await decoder.stop()
+    await task
+
+
+async def run(args, slices, expected):
+    decoder_class = PyAVDecoder if args.decoder == "pyav" else FFmpegManager
+    decoders = [decoder_class() for _ in range(args.sessions)]
+    samples = [0] * args.sessions
+    lags = []
+    baseline = memory_kb()
+    cpu = time.process_time()
+    start = time.perf_counter() + 0.2
+    # the sessions start staggered over one timeslice
+    sessions = [
+        asyncio.create_task(session(
+            d, slices, args.timeslice, start + i * args.timeslice / args.sessions, samples, expected, lags, i
+        ))
+        for i, d in enumerate(decoders)
+    ]
+    await asyncio.sleep(0.2 + len(slices) * args.timeslice / 2)
+    memory = memory_kb() - baseline
+    for d in decoders:
+        if getattr(d, "process", None) is not None:
+            memory += memory_kb(d.process.pid)
+    await asyncio.gather(*sessions)
+    cpu = time.process_time() - cpu
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu += children.ru_utime + children.ru_stime
+    return cpu, memory, samples, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--timeslice", type=float, default=0.25, help="MediaRecorder timeslice in seconds")
+    parser.add_argument("--speech", nargs="*", default=[], help="16 kHz mono 16-bit WAV files")
+    parser.add_argument("--decoder", choices=["all", "ffmpeg", "pyav"], default="all")
+    args = parser.parse_args()
+
+    if args.decoder == "all":
+        for decoder in ("ffmpeg", "pyav"):
+            subprocess.run([sys.executable, __file__, *sys.argv[1:], "--decoder", decoder], check=True)
+        return
+
+    pcm = np.concatenate([read_wav(path) for path in args.speech]) if args.speech else synthetic_speech(args.seconds)
+    pcm = np.resize(pcm, int(args.seconds * SAMPLE_RATE))
+    slices = encode_webm(pcm, args.timeslice)
+    cpu, memory, samples, lags = asyncio.run(run(args, slices, decoded_samples(slices)))
+    rss, pss, uss = memory / args.sessions / 1024
+    audio = args.sessions * args.seconds
+    print(f"{args.decoder:6s}: {args.sessions} sessions, {args.seconds:.0f}s of {sum(map(len, slices)) * 8 / args.seconds / 1000:.0f} kbit/s "
+          f"WebM/Opus in {args.timeslice * 1000:.0f}ms slices: CPU {cpu / audio * 1000:.2f}ms per audio second and session, "
+          f"memory per session RSS {rss:.1f}MB PSS {pss:.1f}MB USS {uss:.1f}MB, "
+          f"last samples {np.median(lags) * 1000:.0f}ms (median) / {max(lags) * 1000:.0f}ms (max) after the last slice, "
+          f"decoded {min(samples) / SAMPLE_RATE:.2f}-{max(samples) / SAMPLE_RATE:.2f}s per session")
+
+
+if __name__ == "__main__":
+    from whisperlivekit.ffmpeg_manager import FFmpegManager, FFmpegState
+    from whisperlivekit.pyav_decoder import PyAVDecoder
+
+    main()
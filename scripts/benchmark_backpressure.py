@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Queue depth, latency and load shedding of the per-session processing queues
+(`StageQueue`) when the models fall behind, for each policy and with the previous
+unbounded queues.
+
+A session streams --minutes of audio in --chunk second chunks, in real time scaled
+down by --speedup. The transcription processor takes --transcription-cost seconds per
+second of audio it gets (plus a fixed --step-cost per call), the diarization
+processor --diarization-cost. Both drain their queue as `get_all()` does. With the
+`degrade` policy, the transcription cost is multiplied by --degraded-cost while it is
+degraded. Reported, in audio time: the largest queue depth (float32 audio held), the
+transcription latency at the end (audio received but not transcribed), the audio
+dropped, and how long the reader was blocked.
+
+    python scripts/benchmark_backpressure.py --minutes 10 --transcription-cost 1.3
+"""
+
+import argparse
+import asyncio
+import logging
+
+import numpy as np
+
+from whisperlivekit.backpressure import SENTINEL, StageQueue
+from whisperlivekit.timed_objects import Silence
+
+SAMPLE_RATE = 16000
+
+
+async def processor(queue, cost, args, done, degraded=None):
+    while True:
+        item = await queue.get_all()
+        if item is SENTINEL:
+            break
+        if isinstance(item, Silence):
+            # a gap left by dropped audio: the stream time moves on, nothing to compute
+            done[0] += item.duration
+            continue
+        seconds = len(item) / SAMPLE_RATE
+        factor = args.degraded_cost if degraded and degraded[0] else 1.0
+        await asyncio.sleep((args.step_cost + seconds * cost * factor) / args.speedup)
+        done[0] += seconds
+
+
+async def run(policy, diarization_policy, args):
+    loop = asyncio.get_running_loop()
+    degraded = [False]
+    max_seconds = 0.0 if policy == "unbounded" else args.max_queue_seconds
+    transcription_queue = StageQueue(
+        "transcription", max_seconds, "block" if policy == "unbounded" else policy, SAMPLE_RATE,
+        on_pressure=lambda on: degraded.__setitem__(0, on),
+    )
+    diarization_queue = StageQueue(
+        "diarization", max_seconds, "block" if policy == "unbounded" else diarization_policy, SAMPLE_RATE,
+    )
+    transcribed, diarized = [0.0], [0.0]
+    tasks = [
+        asyncio.create_task(processor(transcription_queue, args.transcription_cost, args, transcribed, degraded)),
+        asyncio.create_task(processor(diarization_queue, args.diarization_cost, args, diarized)),
+    ]
+    chunk = np.zeros(int(args.chunk * SAMPLE_RATE), dtype=np.float32)
+    n_chunks = int(args.minutes * 60 / args.chunk)
+    beg = loop.time()
+    for i in range(n_chunks):
+        # the client sends in real time, the reader may be late because it was blocked
+        await asyncio.sleep(max(0.0, beg + i * args.chunk / args.speedup - loop.time()))
+        await transcription_queue.put(chunk)
+        await diarization_queue.put(chunk)
+    received = n_chunks * args.chunk
+    end_of_stream = loop.time()
+    transcription_latency = received - transcribed[0]
+    await transcription_queue.put(SENTINEL)
+    await diarization_queue.put(SENTINEL)
+    await asyncio.gather(*tasks)
+    stream_delay = max(0.0, (end_of_stream - beg) * args.speedup - received)
+    return transcription_queue, diarization_queue, transcription_latency, stream_delay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--chunk", type=float, default=0.5)
+    parser.add_argument("--speedup", type=float, default=200.0)
+    parser.add_argument("--transcription-cost", type=float, default=1.3, help="seconds per second of audio")
+    parser.add_argument("--diarization-cost", type=float, default=1.5, help="seconds per second of audio")
+    parser.add_argument("--step-cost", type=float, default=0.05, help="seconds per processor call")
+    parser.add_argument("--degraded-cost", type=float, default=0.7, help="transcription cost factor when degraded")
+    parser.add_argument("--max-queue-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+    logging.getLogger("whisperlivekit.backpressure").setLevel(logging.ERROR)
+
+    print(f"{args.minutes:.0f} min stream, transcription x{args.transcription_cost}, diarization x{args.diarization_cost} "
+          f"of real time, queues bounded to {args.max_queue_seconds:.0f}s of audio")
+    modes = [("unbounded", None), ("block", "block"), ("block", "drop"), ("latest", "drop"), ("degrade", "drop")]
+    for policy, diarization_policy in modes:
+        tq, dq, latency, stream_delay = asyncio.run(run(policy, diarization_policy, args))
+        name = policy if diarization_policy is None else f"{policy} / {diarization_policy}"
+        peak_mb = (tq.max_depth_seconds + dq.max_depth_seconds) * SAMPLE_RATE * 4 / 1e6
+        print(f"{name:16s}: max depth {tq.max_depth_seconds:6.1f}s + {dq.max_depth_seconds:6.1f}s ({peak_mb:5.1f} MB), "
+              f"transcription latency at end {latency:6.1f}s, reader late by {stream_delay:6.1f}s, "
+              f"dropped {tq.dropped_seconds:6.1f}s + {dq.dropped_seconds:6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Aggregate decoder tokens/second when N sessions step their decoder one after the
+other (batch of 1 each, as without --decoder-batch-size) vs. in one batched
+forward pass (BatchedDecoder). Sessions have different prompt lengths, and the
+logits and cross-attention of the batched path are checked against the
+sequential ones.
+
+    python scripts/benchmark_batched_decoder.py --model base --sessions 16 --steps 30
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import torch
+
+from whisperlivekit.simul_whisper.batched_decoder import (BatchedDecoder,
+                                                          DecoderRequest)
+from whisperlivekit.whisper.model import TextDecoder
+
+DECODER_DIMS = {
+    # n_text_state, n_text_head, n_text_layer
+    "tiny": (384, 6, 4),
+    "base": (512, 8, 6),
+    "small": (768, 12, 12),
+    "medium": (1024, 16, 24),
+    "large-v3-turbo": (1280, 20, 4),
+}
+
+
+def build_decoder(name):
+    n_state, n_head, n_layer = DECODER_DIMS[name]
+    decoder = TextDecoder(51865, 448, n_state, n_head, n_layer)
+    torch.nn.init.normal_(decoder.positional_embedding, std=0.01)
+    return decoder.eval(), n_state
+
+
+def make_sessions(n_sessions, n_state, n_audio_ctx, generator):
+    sessions = []
+    for i in range(n_sessions):
+        prompt_len = 4 + (7 * i) % 40
+        sessions.append(SimpleNamespace(
+            prompt=torch.randint(0, 50000, (1, prompt_len), generator=generator),
+            features=torch.randn(1, n_audio_ctx, n_state, generator=generator),
+        ))
+    return sessions
+
+
+def step_tokens(logits):
+    return logits[:, -1].argmax(dim=-1, keepdim=True)
+
+
+@torch.no_grad()
+def run(decoder, sessions, steps, batched):
+    batched_decoder = BatchedDecoder(decoder)
+    caches = [{} for _ in sessions]
+    tokens = [s.prompt for s in sessions]
+    outputs = [[] for _ in sessions]
+    beg = time.perf_counter()
+    for _ in range(steps):
+        requests = [DecoderRequest(t, s.features, c, True) for t, s, c in zip(tokens, sessions, caches)]
+        if batched:
+            results = batched_decoder(requests)
+        else:
+            results = [decoder(r.tokens, r.audio_features, kv_cache=r.kv_cache, return_cross_attn=True) for r in requests]
+        for i, (logits, cross_attns) in enumerate(results):
+            outputs[i].append((logits[:, -1], cross_attns[-1][:, :, -1]))
+            tokens[i] = step_tokens(logits)
+    return time.perf_counter() - beg, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", choices=sorted(DECODER_DIMS))
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--audio-ctx", type=int, default=1500)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    torch.manual_seed(0)
+    decoder, n_state = build_decoder(args.model)
+    sessions = make_sessions(args.sessions, n_state, args.audio_ctx, torch.Generator().manual_seed(0))
+
+    run(decoder, sessions, 2, batched=False)  # warmup
+    sequential_time, sequential_out = run(decoder, sessions, args.steps, batched=False)
+    batched_time, batched_out = run(decoder, sessions, args.steps, batched=True)
+
+    n_tokens = args.sessions * args.steps
+    logits_diff = max((a[0] - b[0]).abs().max().item() for s, t in zip(sequential_out, batched_out) for a, b in zip(s, t))
+    attn_diff = max((a[1] - b[1]).abs().max().item() for s, t in zip(sequential_out, batched_out) for a, b in zip(s, t))
+    same_tokens = all(
+        torch.equal(a[0].argmax(-1), b[0].argmax(-1)) for s, t in zip(sequential_out, batched_out) for a, b in zip(s, t)
+    )
+    print(f"{args.sessions} sessions x {args.steps} steps, {args.model} decoder dims, {torch.get_num_threads()} threads")
+    print(f"sequential : {n_tokens / sequential_time:8.1f} tokens/s")
+    print(f"batched    : {n_tokens / batched_time:8.1f} tokens/s ({sequential_time / batched_time:.2f}x)")
+    print(f"max abs diff: logits {logits_diff:.2e}, cross-attention {attn_diff:.2e}, same greedy tokens: {same_tokens}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Speedup and transcription drift of --dynamic-audio-ctx (encode the content rounded up
+to a bucket length) vs. the default 30s padded encoder input, for AlignAtt with the
+PyTorch encoder.
+
+Each recording is streamed chunk by chunk through two AlignAtt instances sharing the
+model. Reported: the time spent in `infer` for each, the WER of the dynamic output
+against the default one (drift), and with --reference the WER of both against the
+reference transcripts.
+
+    python scripts/benchmark_dynamic_audio_ctx.py --model large-v3 --language nl \\
+        --audio session1.wav session2.wav --reference session1.txt session2.txt
+
+With --random-weights, a model of the given dimensions with random weights is streamed
+noise: only the timings are meaningful.
+
+    python scripts/benchmark_dynamic_audio_ctx.py --random-weights base --seconds 60
+"""
+
+import argparse
+import logging
+import re
+import time
+
+import torch
+
+from whisperlivekit.simul_whisper.config import AlignAttConfig
+from whisperlivekit.simul_whisper.simul_whisper import AlignAtt
+from whisperlivekit.whisper import load_model
+from whisperlivekit.whisper.audio import SAMPLE_RATE, load_audio
+from whisperlivekit.whisper.model import ModelDimensions, Whisper
+
+MODEL_DIMS = {
+    # n_state, n_head, n_audio_layer, n_text_layer
+    "tiny": (384, 6, 4, 4),
+    "base": (512, 8, 6, 6),
+    "small": (768, 12, 12, 12),
+    "large-v3-turbo": (1280, 20, 32, 4),
+}
+
+
+def random_model(name):
+    n_state, n_head, n_audio_layer, n_text_layer = MODEL_DIMS[name]
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=n_state, n_audio_head=n_head, n_audio_layer=n_audio_layer,
+        n_vocab=51865, n_text_ctx=448, n_text_state=n_state, n_text_head=n_head, n_text_layer=n_text_layer,
+    )
+    torch.manual_seed(0)
+    model = Whisper(dims)
+    with torch.no_grad():
+        for p in model.parameters():
+            p.normal_(0, 0.02)
+    return model.eval()
+
+
+def words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def wer(reference, hypothesis):
+    ref, hyp = words(reference), words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def stream(model, audio, args, dynamic):
+    cfg = AlignAttConfig(
+        language=args.language, decoder_type="beam", beam_size=1, frame_threshold=args.frame_threshold,
+        audio_max_len=args.audio_max_len, cif_ckpt_path=None, never_fire=True,
+        dynamic_audio_ctx=dynamic, audio_ctx_buckets=args.buckets,
+    )
+    aligner = AlignAtt(cfg=cfg, loaded_model=model)
+    chunk = int(args.chunk * SAMPLE_RATE)
+    text, elapsed = [], 0.0
+    for start in range(0, len(audio), chunk):
+        aligner.insert_audio(audio[start:start + chunk])
+        beg = time.perf_counter()
+        tokens = aligner.infer(is_last=start + chunk >= len(audio))
+        elapsed += time.perf_counter() - beg
+        text += [t.text for t in tokens]
+    return "".join(text), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", help="model name or path for load_model")
+    parser.add_argument("--random-weights", choices=sorted(MODEL_DIMS), default=None)
+    parser.add_argument("--audio", nargs="*", default=[])
+    parser.add_argument("--reference", nargs="*", default=[])
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the noise stream with --random-weights")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--chunk", type=float, default=1.0)
+    parser.add_argument("--audio-max-len", type=float, default=20.0)
+    parser.add_argument("--frame-threshold", type=int, default=25)
+    parser.add_argument("--buckets", type=float, nargs="+", default=[5.0, 10.0, 15.0, 20.0, 30.0])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    if args.random_weights:
+        model = random_model(args.random_weights)
+        recordings = [("noise", torch.randn(int(args.seconds * SAMPLE_RATE), generator=torch.Generator().manual_seed(0)) * 0.1)]
+    else:
+        model = load_model(args.model, device="cpu")
+        recordings = [(path, torch.from_numpy(load_audio(path))) for path in args.audio]
+    references = [open(path).read() for path in args.reference]
+
+    print(f"buckets {args.buckets}s, chunk {args.chunk}s, audio_max_len {args.audio_max_len}s, "
+          f"{torch.get_num_threads()} threads")
+    total_full = total_dynamic = 0.0
+    for i, (name, audio) in enumerate(recordings):
+        full_text, full_time = stream(model, audio, args, dynamic=False)
+        dynamic_text, dynamic_time = stream(model, audio, args, dynamic=True)
+        total_full += full_time
+        total_dynamic += dynamic_time
+        line = (f"{name}: {len(audio) / SAMPLE_RATE:.1f}s audio, infer {full_time:.2f}s -> {dynamic_time:.2f}s "
+                f"({full_time / dynamic_time:.2f}x), drift WER {wer(full_text, dynamic_text):.3f}")
+        if i < len(references):
+            line += f", WER {wer(references[i], full_text):.3f} -> {wer(references[i], dynamic_text):.3f}"
+        print(line)
+    if len(recordings) > 1:
+        print(f"total: infer {total_full:.2f}s -> {total_dynamic:.2f}s ({total_full / total_dynamic:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Encoder FLOPs per second of streamed audio: full re-encoding (AlignAtt default)
+vs. the incremental encoder (--incremental-encoder).
+
+The stream is simulated the way AlignAtt buffers it: one segment per chunk,
+segments removed at the front once the buffer exceeds --audio-max-len.
+Weights are random unless --checkpoint is given (FLOPs do not depend on them);
+with a checkpoint the max abs difference of the content features is reported too.
+
+    python scripts/benchmark_encoder_flops.py --model base --seconds 60 --chunk 0.5
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import torch
+from torch.utils.flop_counter import FlopCounterMode
+
+from whisperlivekit.simul_whisper.incremental_encoder import IncrementalEncoder
+from whisperlivekit.whisper.audio import (N_FRAMES, N_SAMPLES, SAMPLE_RATE,
+                                          log_mel_spectrogram, pad_or_trim)
+from whisperlivekit.whisper.model import AudioEncoder, ModelDimensions
+
+ENCODER_DIMS = {
+    # n_mels, n_audio_state, n_audio_head, n_audio_layer
+    "tiny": (80, 384, 6, 4),
+    "base": (80, 512, 8, 6),
+    "small": (80, 768, 12, 12),
+    "medium": (80, 1024, 16, 24),
+    "large-v3": (128, 1280, 20, 32),
+}
+
+
+def build_model(args):
+    if args.checkpoint:
+        from whisperlivekit.whisper import load_model
+        return load_model(args.checkpoint, device="cpu").eval()
+    n_mels, n_state, n_head, n_layer = ENCODER_DIMS[args.model]
+    dims = ModelDimensions(
+        n_mels=n_mels, n_audio_ctx=1500, n_audio_state=n_state, n_audio_head=n_head,
+        n_audio_layer=n_layer, n_vocab=51865, n_text_ctx=448, n_text_state=n_state,
+        n_text_head=n_head, n_text_layer=n_layer,
+    )
+    encoder = AudioEncoder(dims.n_mels, dims.n_audio_ctx, dims.n_audio_state, dims.n_audio_head, dims.n_audio_layer)
+    return SimpleNamespace(encoder=encoder.eval(), dims=dims, device=torch.device("cpu"))
+
+
+def full_encode(model, segments):
+    audio = torch.cat(segments)
+    mel_padded = log_mel_spectrogram(audio, n_mels=model.dims.n_mels, padding=N_SAMPLES).unsqueeze(0)
+    mel = pad_or_trim(mel_padded, N_FRAMES)
+    content_mel_len = int((mel_padded.shape[2] - mel.shape[2]) / 2)
+    return model.encoder(mel), content_mel_len
+
+
+def run(model, audio, args, encode, evict_len):
+    chunk = int(args.chunk * SAMPLE_RATE)
+    segments, flops, duration, outputs = [], 0, 0.0, []
+    for i in range(0, audio.shape[0], chunk):
+        segments.append(audio[i:i + chunk])
+        length = sum(s.shape[0] for s in segments) / SAMPLE_RATE
+        max_len = args.audio_max_len if length <= args.audio_max_len else args.audio_max_len - evict_len
+        while len(segments) > 1 and length > max_len:
+            length -= segments[0].shape[0] / SAMPLE_RATE
+            segments = segments[1:]
+        counter = FlopCounterMode(display=False)
+        beg = time.perf_counter()
+        with counter, torch.no_grad():
+            outputs.append(encode(segments))
+        duration += time.perf_counter() - beg
+        flops += counter.get_total_flops()
+    return flops, duration, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", choices=sorted(ENCODER_DIMS))
+    parser.add_argument("--checkpoint", default=None, help="Load real weights (model name or path) instead of random ones.")
+    parser.add_argument("--audio", default=None, help="Audio file to stream. Defaults to white noise.")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--chunk", type=float, default=0.5, help="Seconds of audio per infer call.")
+    parser.add_argument("--audio-max-len", type=float, default=20.0)
+    parser.add_argument("--encoder-lookahead", type=float, default=2.0)
+    parser.add_argument("--encoder-evict-len", type=float, default=5.0)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = build_model(args)
+    if args.audio:
+        from whisperlivekit.whisper.audio import load_audio
+        audio = torch.from_numpy(load_audio(args.audio))[: int(args.seconds * SAMPLE_RATE)]
+    else:
+        audio = torch.randn(int(args.seconds * SAMPLE_RATE)) * 0.1
+    seconds = audio.shape[0] / SAMPLE_RATE
+
+    full_flops, full_time, full_out = run(model, audio, args, lambda segs: full_encode(model, segs), 0.0)
+    incremental = IncrementalEncoder(model, lookahead=args.encoder_lookahead, max_len=args.audio_max_len, device="cpu")
+    inc_flops, inc_time, inc_out = run(model, audio, args, incremental.encode, args.encoder_evict_len)
+
+    print(f"audio: {seconds:.1f}s in chunks of {args.chunk}s, audio_max_len={args.audio_max_len}s")
+    print(f"full        : {full_flops / seconds / 1e9:8.1f} GFLOPs per audio second, {full_time / seconds:.3f}s compute per audio second")
+    print(f"incremental : {inc_flops / seconds / 1e9:8.1f} GFLOPs per audio second, {inc_time / seconds:.3f}s compute per audio second")
+    print(f"ratio       : {full_flops / max(inc_flops, 1):.2f}x fewer FLOPs")
+    print(f"cache       : {incremental.stats()}")
+    if args.checkpoint and args.encoder_evict_len == 0:
+        drift = max((f[0][:, :c] - i[0][:, :c]).abs().max().item() for f, i in zip(full_out, inc_out) for c in [f[1]])
+        print(f"max abs feature difference on content frames: {drift:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Latency of the model calls of many concurrent sessions with `asyncio.to_thread` (the
+default thread pool, min(32, cpu + 4) threads, torch using every core in each call)
+vs. the `InferenceExecutor` (--workers threads, cores split between them, sessions
+served round-robin).
+
+Each session receives a --chunk second audio chunk in real time and then runs one
+model call: --matmuls float32 matmuls of --size × --size, standing in for an encoder
+pass and a few decoder steps. Sessions start at random offsets. A session whose call
+is still running when its next chunk arrives merges the chunks, as
+`StageQueue.get_all` does. Reported: latency of a chunk (arrival to result) at the
+median, p95 and p99, the calls per second, and the spread of the mean latency
+between sessions.
+
+    python scripts/benchmark_inference_executor.py --sessions 30 --seconds 20
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+import numpy as np
+import torch
+
+from whisperlivekit.inference_executor import InferenceExecutor
+
+
+def model_call(weights, x, matmuls):
+    for _ in range(matmuls):
+        x = torch.tanh(x @ weights)
+    return x
+
+
+async def session(index, args, run, weights, latencies, calls):
+    rng = random.Random(index)
+    loop = asyncio.get_running_loop()
+    start = loop.time() + rng.uniform(0, args.chunk)
+    end = start + args.seconds
+    x = torch.randn(args.tokens, args.size)
+    next_chunk = start
+    while next_chunk < end:
+        await asyncio.sleep(max(0.0, next_chunk - loop.time()))
+        arrived = [next_chunk]
+        now = loop.time()
+        # chunks that arrived while the previous call was running are processed together
+        while next_chunk + args.chunk <= now and next_chunk + args.chunk < end:
+            next_chunk += args.chunk
+            arrived.append(next_chunk)
+        await run(model_call, weights, x, args.matmuls)
+        done = loop.time()
+        latencies[index].extend(done - t for t in arrived)
+        calls[0] += 1
+        next_chunk += args.chunk
+
+
+async def run_mode(mode, args):
+    weights = torch.randn(args.size, args.size) / args.size ** 0.5
+    latencies = [[] for _ in range(args.sessions)]
+    calls = [0]
+    if mode == "to_thread":
+        torch.set_num_threads(os.cpu_count() or 1)
+
+        async def run(fn, *a):
+            return await asyncio.to_thread(fn, *a)
+        sessions = [run] * args.sessions
+        executor = None
+    else:
+        executor = InferenceExecutor(args.workers, args.intra_op_threads)
+        session_ids = [executor.register() for _ in range(args.sessions)]
+
+        def runner(session_id):
+            async def run(fn, *a):
+                return await executor.run(session_id, fn, *a)
+            return run
+        sessions = [runner(session_id) for session_id in session_ids]
+    beg = time.perf_counter()
+    await asyncio.gather(*(session(i, args, sessions[i], weights, latencies, calls) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - beg
+    waits = None
+    if executor is not None:
+        stats = [executor.release(session_id) for session_id in session_ids]
+        waits = max(s.mean_delay for s in stats)
+        executor.close()
+    return latencies, calls[0] / elapsed, waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--chunk", type=float, default=0.5)
+    parser.add_argument("--size", type=int, default=384)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--matmuls", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger("whisperlivekit.inference_executor").setLevel(logging.WARNING)
+
+    weights = torch.randn(args.size, args.size)
+    x = torch.randn(args.tokens, args.size)
+    model_call(weights, x, args.matmuls)
+    beg = time.perf_counter()
+    for _ in range(10):
+        model_call(weights, x, args.matmuls)
+    call_ms = (time.perf_counter() - beg) / 10 * 1000
+    print(f"{args.sessions} sessions, one call per {args.chunk}s chunk, {call_ms:.1f}ms per call alone, "
+          f"{os.cpu_count()} CPU cores, load {args.sessions * call_ms / 1000 / args.chunk * 100:.0f}% of one core")
+    for mode in ("to_thread", "executor"):
+        latencies, calls_per_second, worst_wait = asyncio.run(run_mode(mode, args))
+        all_latencies = np.concatenate([np.array(l) for l in latencies]) * 1000
+        means = np.array([np.mean(l) for l in latencies]) * 1000
+        p50, p95, p99 = np.percentile(all_latencies, [50, 95, 99])
+        name = mode if mode == "to_thread" else f"executor ({args.workers} worker{'s' if args.workers > 1 else ''})"
+        line = (f"{name:22s}: latency p50 {p50:6.0f}ms, p95 {p95:6.0f}ms, p99 {p99:6.0f}ms, "
+                f"{calls_per_second:5.1f} calls/s, session means {means.min():.0f}-{means.max():.0f}ms")
+        if worst_wait is not None:
+            line += f", worst mean wait for a worker {worst_wait * 1000:.0f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
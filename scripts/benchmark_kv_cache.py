@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Per-token decoder latency and allocations with the dict kv_cache (torch.cat on
+every token) vs. SlabKVCache (--preallocated-kv-cache).
+
+Each pass decodes a prompt then --tokens greedy tokens, with beam rows reordered
+at every step like BeamSearchDecoder does, and the cache is cleaned between passes
+as AlignAtt does after each infer call. Allocations are counted with the PyTorch
+profiler memory events.
+
+    python scripts/benchmark_kv_cache.py --model base --tokens 200 --beams 1
+"""
+
+import argparse
+import time
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+from whisperlivekit.simul_whisper.beam import BeamPyTorchInference
+from whisperlivekit.whisper.kv_cache import SlabKVCache
+from whisperlivekit.whisper.model import TextDecoder
+
+DECODER_DIMS = {
+    # n_text_state, n_text_head, n_text_layer
+    "tiny": (384, 6, 4),
+    "base": (512, 8, 6),
+    "small": (768, 12, 12),
+    "medium": (1024, 16, 24),
+    "large-v3-turbo": (1280, 20, 4),
+}
+
+
+class _Decoder:
+    def __init__(self, decoder):
+        self.decoder = decoder
+
+
+@torch.no_grad()
+def decode(decoder, kv_cache, features, prompt, n_tokens, beams):
+    inference = BeamPyTorchInference(_Decoder(decoder), prompt.shape[1])
+    inference.kv_cache = kv_cache
+    tokens = prompt
+    latencies = []
+    for _ in range(n_tokens):
+        beg = time.perf_counter()
+        logits = decoder(tokens, features, kv_cache=kv_cache)
+        if beams > 1:
+            # the best beam takes over the others, as in a beam search step
+            inference.rearrange_kv_cache([0] + list(range(beams - 1)))
+        tokens = logits[:, -1].argmax(dim=-1, keepdim=True)
+        latencies.append(time.perf_counter() - beg)
+    return latencies
+
+
+def count_allocations(fn):
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    allocations = [e for e in prof.events() if e.cpu_memory_usage > 0]
+    return len(allocations), sum(e.cpu_memory_usage for e in allocations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", choices=sorted(DECODER_DIMS))
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--prompt", type=int, default=30)
+    parser.add_argument("--beams", type=int, default=1)
+    parser.add_argument("--passes", type=int, default=3)
+    parser.add_argument("--audio-ctx", type=int, default=1500)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    n_state, n_head, n_layer = DECODER_DIMS[args.model]
+    decoder = TextDecoder(51865, 448, n_state, n_head, n_layer).eval()
+    torch.nn.init.normal_(decoder.positional_embedding, std=0.01)
+    features = torch.randn(1, args.audio_ctx, n_state)
+    prompt = torch.randint(0, 50000, (args.beams, args.prompt))
+    n_tokens = min(args.tokens, 448 - args.prompt)
+
+    caches = {"dict": lambda: {}, "slab": lambda: SlabKVCache(448, max_rows=args.beams)}
+    print(f"{args.model} decoder dims, {n_tokens} tokens, {args.beams} beams, {torch.get_num_threads()} threads")
+    for name, make_cache in caches.items():
+        kv_cache = make_cache()
+        latencies = []
+        for _ in range(args.passes):
+            latencies += decode(decoder, kv_cache, features, prompt, n_tokens, args.beams)[1:]
+            kv_cache = {} if name == "dict" else kv_cache
+            kv_cache.clear()
+
+        def one_pass():
+            decode(decoder, kv_cache, features, prompt, n_tokens, args.beams)
+            kv_cache.clear()
+        n_alloc, n_bytes = count_allocations(one_pass)
+        latencies.sort()
+        print(
+            f"{name:5s}: median {latencies[len(latencies) // 2] * 1000:.2f}ms / token, "
+            f"p90 {latencies[int(len(latencies) * 0.9)] * 1000:.2f}ms, "
+            f"{n_alloc / n_tokens:.1f} allocations and {n_bytes / n_tokens / 1e6:.2f} MB allocated / token"
+        )
+
+
+if __name__ == "__main__":
+    main()
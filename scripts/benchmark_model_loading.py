@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Startup time and memory of --processes processes each loading the same Whisper
+checkpoint with `whisper.load_model`, with and without `mmap_weights`.
+
+A checkpoint of random weights with the dimensions of --model is written to a
+temporary directory, as a .pt file (float32 or float16) and as a .safetensors file
+with a native config.json. Every process loads it on CPU, runs the encoder and one
+decoder pass (which touches every weight), then waits for the others, so that all
+the models are alive at the same time when the memory is read from
+/proc/self/smaps_rollup. Reported is the memory added by the model (after minus
+before loading; the forward pass adds a few MB of activations):
+
+- RSS: resident memory of the process, shared pages included.
+- anonymous: private memory (a model copy loaded into fresh tensors lands here).
+- PSS: RSS where each shared page is divided by the number of processes mapping it,
+  the sum over processes is the host memory actually used.
+
+The outputs of the models loaded both ways are compared first.
+
+    python scripts/benchmark_model_loading.py --model base --processes 2
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import torch
+
+from whisperlivekit.whisper import load_model
+from whisperlivekit.whisper.model import ModelDimensions, Whisper
+
+DIMS = {
+    "tiny": dict(n_audio_state=384, n_audio_head=6, n_audio_layer=4),
+    "base": dict(n_audio_state=512, n_audio_head=8, n_audio_layer=6),
+    "small": dict(n_audio_state=768, n_audio_head=12, n_audio_layer=12),
+}
+
+
+def dimensions(name):
+    d = DIMS[name]
+    return ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_vocab=51865, n_text_ctx=448,
+        n_text_state=d["n_audio_state"], n_text_head=d["n_audio_head"], n_text_layer=d["n_audio_layer"], **d,
+    )
+
+
+def write_checkpoints(directory, name):
+    from safetensors.torch import save_file
+
+    dims = dimensions(name)
+    torch.manual_seed(0)
+    state_dict = Whisper(dims).state_dict()
+    paths = {}
+    for dtype in (torch.float32, torch.float16):
+        path = os.path.join(directory, f"{name}-{str(dtype)[6:]}.pt")
+        torch.save({"dims": dims.__dict__, "model_state_dict": {k: v.to(dtype) for k, v in state_dict.items()}}, path)
+        paths[f".pt {str(dtype)[6:]}"] = path
+    safetensors_dir = os.path.join(directory, f"{name}-safetensors")
+    os.makedirs(safetensors_dir)
+    save_file({k: v.contiguous() for k, v in state_dict.items()}, os.path.join(safetensors_dir, "model.safetensors"))
+    with open(os.path.join(safetensors_dir, "config.json"), "w") as f:
+        json.dump(dims.__dict__, f)
+    paths[".safetensors float32"] = safetensors_dir
+    return paths
+
+
+def memory():
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Anonymous:"):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values
+
+
+def forward(model):
+    mel = torch.zeros(1, model.dims.n_mels, 3000)
+    tokens = torch.tensor([[50258, 50259, 50359]])
+    with torch.no_grad():
+        return model.logits(tokens, model.embed_audio(mel))
+
+
+def load_and_wait(path, mmap_weights, barrier, results):
+    torch.set_num_threads(1)
+    before = memory()
+    beg = time.perf_counter()
+    model = load_model(path, device="cpu", mmap_weights=mmap_weights)
+    loaded = time.perf_counter() - beg
+    forward(model)
+    barrier.wait()
+    after = memory()
+    results.put((loaded, {key: after[key] - before[key] for key in after}))
+    barrier.wait()
+
+
+def run(path, mmap_weights, processes):
+    context = mp.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=load_and_wait, args=(path, mmap_weights, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    measures = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return measures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=sorted(DIMS), default="base")
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_checkpoints(directory, args.model)
+        for checkpoint, path in paths.items():
+            reference = forward(load_model(path, device="cpu"))
+            mapped = forward(load_model(path, device="cpu", mmap_weights=True))
+            if not torch.equal(reference, mapped):
+                raise AssertionError(f"{checkpoint}: outputs differ with mmap_weights")
+        size = os.path.getsize(paths[".pt float32"]) / 2 ** 20
+        print(f"{args.model}: {size:.0f} MB float32 checkpoint, {args.processes} processes, "
+              f"outputs identical with and without mmap_weights")
+        for checkpoint, path in paths.items():
+            for mmap_weights in (False, True):
+                # both runs read the file from the page cache
+                measures = run(path, mmap_weights, args.processes)
+                load = max(m[0] for m in measures)
+                rss = sum(m[1]["Rss"] for m in measures) / len(measures)
+                anonymous = sum(m[1]["Anonymous"] for m in measures) / len(measures)
+                pss = sum(m[1]["Pss"] for m in measures)
+                print(f"{checkpoint:21s} {'mmap' if mmap_weights else 'read':4s}: load {load:5.2f}s, per process "
+                      f"RSS +{rss:4.0f} MB, anonymous +{anonymous:4.0f} MB, PSS of all processes +{pss:4.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
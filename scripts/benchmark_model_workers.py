@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Throughput of the transcription of many concurrent sessions in the server process
+(one `asyncio.to_thread` call per step, as without --model-workers) vs. in
+--workers model worker processes (`WorkerPool`, audio through `SharedAudioRing`).
+
+Each session streams --seconds of audio in --chunk second chunks, as fast as its
+steps complete. A step (`process_iter`) costs --matmuls float32 matmuls of
+--size × --size, standing in for the encoder and decoder of a real model, whose
+weights each worker holds. The processor also checksums every sample it receives;
+the checksums are compared with the audio sent, which checks the transport through
+shared memory (the ring wraps after 30 s of audio per session).
+
+Reported: audio seconds transcribed per wall-clock second, the step latency at the
+median and p95, and the mean transport overhead of a call (worker round trip of a
+step costing nothing).
+
+    python scripts/benchmark_model_workers.py --sessions 8 --workers 2
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import zlib
+
+import numpy as np
+import torch
+
+from whisperlivekit.model_workers import WorkerPool
+from whisperlivekit.timed_objects import Transcript
+
+SAMPLE_RATE = 16000
+
+
+class ChecksumProcessor:
+    """Online processor whose steps cost a fixed amount of compute and return the crc32 of the audio received."""
+
+    SAMPLING_RATE = SAMPLE_RATE
+
+    def __init__(self, weights, tokens, matmuls):
+        self.weights = weights
+        self.x = torch.randn(tokens, weights.shape[0])
+        self.matmuls = matmuls
+        self.crc = 0
+        self.samples = 0
+
+    def insert_audio_chunk(self, audio, audio_stream_end_time=None):
+        self.crc = zlib.crc32(np.ascontiguousarray(audio, dtype=np.float32).tobytes(), self.crc)
+        self.samples += len(audio)
+
+    def process_iter(self, is_last=False):
+        x = self.x
+        for _ in range(self.matmuls):
+            x = torch.tanh(x @ self.weights)
+        return [self.crc, self.samples], self.samples / SAMPLE_RATE
+
+    def start_silence(self):
+        return self.process_iter(is_last=True)
+
+    def end_silence(self, silence_duration, offset):
+        pass
+
+    def get_buffer(self):
+        return Transcript()
+
+    def close(self):
+        pass
+
+
+def checksum_factory(options):
+    torch.manual_seed(0)
+    weights = torch.randn(options["size"], options["size"]) / options["size"] ** 0.5
+    return (lambda: ChecksumProcessor(weights, options["tokens"], options["matmuls"])), " "
+
+
+async def session(index, args, processor, submit, latencies):
+    rng = np.random.default_rng(index)
+    n = int(args.chunk * SAMPLE_RATE)
+    crc, samples = 0, 0
+    for _ in range(int(args.seconds / args.chunk)):
+        audio = rng.standard_normal(n).astype(np.float32)
+        crc = zlib.crc32(audio.tobytes(), crc)
+        samples += n
+        processor.insert_audio_chunk(audio)
+        beg = time.perf_counter()
+        (worker_crc, worker_samples), _ = await submit(processor)
+        latencies.append(time.perf_counter() - beg)
+        if (worker_crc, worker_samples) != (crc, samples):
+            raise AssertionError(f"session {index}: audio received by the processor differs from the audio sent")
+
+
+async def run_local(args, options):
+    torch.set_num_threads(os.cpu_count() or 1)
+    make_processor, _ = checksum_factory(options)
+    processors = [make_processor() for _ in range(args.sessions)]
+    latencies = []
+
+    async def submit(processor):
+        return await asyncio.to_thread(processor.process_iter)
+    beg = time.perf_counter()
+    await asyncio.gather(*(session(i, args, processors[i], submit, latencies) for i in range(args.sessions)))
+    return time.perf_counter() - beg, latencies
+
+
+async def run_workers(pool, args):
+    processors = [pool.open_session() for _ in range(args.sessions)]
+    latencies = []
+
+    async def submit(processor):
+        return await asyncio.wrap_future(processor.submit("process_iter"))
+    beg = time.perf_counter()
+    await asyncio.gather(*(session(i, args, processors[i], submit, latencies) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - beg
+    for processor in processors:
+        processor.close()
+    return elapsed, latencies
+
+
+async def round_trip(pool, calls):
+    processor = pool.open_session()
+    audio = np.zeros(int(0.5 * SAMPLE_RATE), dtype=np.float32)
+    beg = time.perf_counter()
+    for _ in range(calls):
+        processor.insert_audio_chunk(audio)
+        await asyncio.wrap_future(processor.submit("process_iter"))
+    elapsed = time.perf_counter() - beg
+    processor.close()
+    return elapsed / calls
+
+
+def report(name, elapsed, latencies, args):
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    audio = args.sessions * int(args.seconds / args.chunk) * args.chunk
+    print(f"{name:22s}: {audio / elapsed:7.1f} audio s/s, step p50 {p50:6.1f}ms, p95 {p95:6.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=40.0)
+    parser.add_argument("--chunk", type=float, default=0.5)
+    parser.add_argument("--size", type=int, default=384)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--matmuls", type=int, default=40)
+    args = parser.parse_args()
+    logging.getLogger("whisperlivekit.model_workers").setLevel(logging.WARNING)
+
+    options = {"size": args.size, "tokens": args.tokens, "matmuls": args.matmuls}
+    print(f"{args.sessions} sessions of {args.seconds:.0f}s audio, {os.cpu_count()} CPU cores")
+    elapsed, latencies = asyncio.run(run_local(args, options))
+    report("in process", elapsed, latencies, args)
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    pool = WorkerPool(args.workers, options, threads, factory=checksum_factory)
+    elapsed, latencies = asyncio.run(run_workers(pool, args))
+    report(f"{args.workers} model workers", elapsed, latencies, args)
+    pool.close()
+
+    pool = WorkerPool(1, {**options, "matmuls": 0}, 1, factory=checksum_factory)
+    overhead = asyncio.run(round_trip(pool, 500))
+    pool.close()
+    print(f"transport overhead: {overhead * 1e6:.0f}us per 0.5s chunk and step (shared memory write, two pipe messages)")
+    print("audio checksums: identical in every session")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Allocations of the PCM path of `AudioProcessor.handle_pcm_data` with the previous
+bytearray buffer vs. `PCMRingBuffer`, and resident memory of many connected sessions.
+
+The path is replayed without models: websocket frames are appended to the buffer, a
+chunk is cut when `--min-chunk-size` seconds are buffered, written to a WAV file,
+converted to float32 and put on the transcription and diarization queues, which are
+drained as `StageQueue.get_all` does.
+
+Allocations: each step runs between `tracemalloc.reset_peak()` calls, and the memory
+allocated by a step is its peak above the memory at its start (buffers alive at the
+same time are counted separately, a buffer freed before the next one is allocated
+is counted once).
+
+RSS: `--sessions` sessions stream `--seconds` of audio each, interleaved, then stay
+connected with a partial chunk buffered. The WAV files go to /dev/null. With
+--lagging-consumers, most queues are only drained at the end, so the chunks of the
+whole stream are queued at once. Each mode runs in its own
+process; reported is the RSS growth over the process before the sessions.
+
+    python scripts/benchmark_pcm_buffer.py --sessions 100 --seconds 10 --diarization
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from whisperlivekit.pcm_buffer import PCMRingBuffer, pcm_to_float
+
+SAMPLE_RATE = 16000
+MAX_BYTES_PER_SEC = 32000 * 5
+
+
+class BytearraySession:
+    """The previous buffering of AudioProcessor."""
+
+    def __init__(self, chunk_samples, diarization):
+        self.bytes_per_chunk = chunk_samples * 2
+        self.pcm_buffer = bytearray()
+        self.queues = [[], []] if diarization else [[]]
+        self.wav = wave.open(open(os.devnull, "wb"), "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(SAMPLE_RATE)
+
+    def receive(self, message, stage):
+        with stage("append"):
+            self.pcm_buffer.extend(message)
+        if len(self.pcm_buffer) < self.bytes_per_chunk:
+            return
+        size = min(len(self.pcm_buffer), MAX_BYTES_PER_SEC) // 2 * 2
+        with stage("slice"):
+            raw_pcm = bytes(self.pcm_buffer[:size])
+        with stage("wav"):
+            self.wav.writeframes(raw_pcm)
+        with stage("convert"):
+            pcm_array = np.frombuffer(raw_pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        with stage("trim"):
+            self.pcm_buffer = self.pcm_buffer[size:]
+        with stage("enqueue"):
+            for queue in self.queues:
+                queue.append(pcm_array.copy())
+
+
+class RingSession:
+    """AudioProcessor with PCMRingBuffer."""
+
+    def __init__(self, chunk_samples, diarization):
+        self.chunk_samples = chunk_samples
+        self.pcm_buffer = PCMRingBuffer(2 * chunk_samples)
+        self.queues = [[], []] if diarization else [[]]
+        self.wav = wave.open(open(os.devnull, "wb"), "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(SAMPLE_RATE)
+
+    def receive(self, message, stage):
+        with stage("append"):
+            self.pcm_buffer.write(message)
+        if len(self.pcm_buffer) < self.chunk_samples:
+            return
+        with stage("slice"):
+            raw_pcm = self.pcm_buffer.read(min(len(self.pcm_buffer), MAX_BYTES_PER_SEC // 2))
+        with stage("wav"):
+            self.wav.writeframes(raw_pcm)
+        with stage("convert"):
+            pcm_array = pcm_to_float(raw_pcm)
+            pcm_array.flags.writeable = False
+        with stage("enqueue"):
+            for queue in self.queues:
+                queue.append(pcm_array)
+
+
+def drain(session):
+    for queue in session.queues:
+        if queue:
+            np.concatenate(queue)
+            queue.clear()
+
+
+class StageAllocations:
+    def __init__(self):
+        self.allocated = {}
+
+    def __call__(self, name):
+        return _Stage(self, name)
+
+
+class _Stage:
+    def __init__(self, stats, name):
+        self.stats, self.name = stats, name
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.start = tracemalloc.get_traced_memory()[0]
+
+    def __exit__(self, *exc):
+        peak = tracemalloc.get_traced_memory()[1]
+        self.stats.allocated[self.name] = self.stats.allocated.get(self.name, 0) + peak - self.start
+
+
+class _NoStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+def no_stage(name):
+    return _NoStage()
+
+
+def frames(seconds, frame_ms, seed):
+    audio = (np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE)) * 3000).astype(np.int16)
+    raw = audio.tobytes()
+    step = int(SAMPLE_RATE * frame_ms / 1000) * 2
+    return [raw[i:i + step] for i in range(0, len(raw), step)]
+
+
+def session_class(mode):
+    return BytearraySession if mode == "bytearray" else RingSession
+
+
+def measure_allocations(mode, args):
+    chunk_samples = int(SAMPLE_RATE * args.min_chunk_size)
+    session = session_class(mode)(chunk_samples, args.diarization)
+    messages = frames(args.seconds, args.frame_ms, 0)
+    stats = StageAllocations()
+    tracemalloc.start()
+    for message in messages:
+        session.receive(message, stats)
+        drain(session)
+    tracemalloc.stop()
+    session = session_class(mode)(chunk_samples, args.diarization)
+    beg = time.perf_counter()
+    for message in messages:
+        session.receive(message, no_stage)
+        drain(session)
+    elapsed = time.perf_counter() - beg
+    return stats.allocated, elapsed
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def measure_rss(mode, args):
+    chunk_samples = int(SAMPLE_RATE * args.min_chunk_size)
+    messages = [frames(args.seconds, args.frame_ms, i) for i in range(4)]
+    gc.collect()
+    before = rss_bytes()
+    sessions = [session_class(mode)(chunk_samples, args.diarization) for _ in range(args.sessions)]
+    for i in range(len(messages[0])):
+        for j, session in enumerate(sessions):
+            session.receive(messages[j % 4][i], no_stage)
+            # with --lagging-consumers, the consumers of 2 sessions out of 3 only catch up at the end
+            if not args.lagging_consumers or j % 3 == 0:
+                drain(session)
+    for session in sessions:
+        drain(session)
+        # connected, without audio for now: a partial chunk stays buffered
+        session.receive(messages[0][0], no_stage)
+    gc.collect()
+    return rss_bytes() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--frame-ms", type=float, default=100.0, help="audio per websocket message")
+    parser.add_argument("--min-chunk-size", type=float, default=0.5)
+    parser.add_argument("--diarization", action="store_true", help="also feed the diarization queue")
+    parser.add_argument("--lagging-consumers", action="store_true", help="keep chunks queued during the RSS run")
+    parser.add_argument("--rss-only", choices=["bytearray", "ring"], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_only:
+        print(measure_rss(args.rss_only, args))
+        return
+
+    print(f"{args.frame_ms:.0f}ms frames, {args.min_chunk_size}s chunks, "
+          f"{'transcription + diarization' if args.diarization else 'transcription'} queues")
+    for mode in ("bytearray", "ring"):
+        allocated, elapsed = measure_allocations(mode, args)
+        total = sum(allocated.values())
+        detail = ", ".join(f"{name} {size / args.seconds / 1000:.0f}" for name, size in allocated.items())
+        rss = int(subprocess.check_output([sys.executable, __file__, "--rss-only", mode] + sys.argv[1:]))
+        print(f"{mode:9s}: allocated {total / args.seconds / 1000:.0f} kB per second of audio ({detail}), "
+              f"{elapsed / args.seconds * 1e6:.0f}us per second of audio, "
+              f"RSS of {args.sessions} sessions +{rss / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
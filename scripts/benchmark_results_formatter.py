@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+CPU cost of `AudioProcessor.results_formatter` for many connected sessions: the
+previous formatter, polling every 50ms, vs. the event-driven one (`results_changed`,
+`--results-min-interval`).
+
+Sessions are AudioProcessors without models, each starting with a transcript of
+--transcript-tokens tokens. --active of them get a new token from a simulated
+transcription processor every --token-interval seconds, in bursts of --burst
+updates; the others stay connected and silent. Reported: formatting passes and
+messages pushed per second, and the CPU time of the event loop.
+
+    python scripts/benchmark_results_formatter.py --sessions 300 --active 10 --seconds 10
+"""
+
+import argparse
+import asyncio
+import time
+from argparse import Namespace
+
+from whisperlivekit.audio_processor import AudioProcessor
+from whisperlivekit.timed_objects import ASRToken, FrontData, State, Transcript
+from whisperlivekit.tokens_alignment import TokensAlignment
+
+
+def bare_session(args, n_tokens):
+    session = AudioProcessor.__new__(AudioProcessor)
+    session.args = Namespace(diarization=False, results_min_interval=args.min_interval)
+    session.state = State()
+    session.lock = asyncio.Lock()
+    session.sep = " "
+    session.last_response_content = FrontData()
+    session.results_changed = asyncio.Event()
+    session.results_min_interval = args.min_interval
+    session.model_calls_in_flight = 0
+    session.tokens_alignment = TokensAlignment(session.state, session.args, session.sep)
+    session.beg_loop = time.time()
+    session.tokens_alignment.beg_loop = session.beg_loop
+    session.translation = None
+    session.current_silence = None
+    session._ffmpeg_error = None
+    session.is_stopping = False
+    session.transcription_task = session.diarization_task = None
+    session.translation_task = session.ffmpeg_reader_task = None
+    tokens = [ASRToken(i * 0.3, i * 0.3 + 0.25, f"word{i}" + ("." if i % 12 == 11 else "")) for i in range(n_tokens)]
+    session.state.tokens.extend(tokens)
+    session.state.new_tokens.extend(tokens)
+    session.state.end_buffer = n_tokens * 0.3
+    session.results_changed.set()
+    return session
+
+
+async def polling_formatter(self):
+    """The previous results_formatter: formats every 50ms, pushes what differs."""
+    while True:
+        self.tokens_alignment.update()
+        lines, buffer_diarization_text, buffer_translation_text = self.tokens_alignment.get_lines(
+            diarization=self.args.diarization, translation=bool(self.translation), current_silence=self.current_silence
+        )
+        state = await self.get_current_state()
+        buffer_transcription_text = state.buffer_transcription.text if state.buffer_transcription else ''
+        response = FrontData(
+            status="active_transcription", lines=lines, buffer_transcription=buffer_transcription_text,
+            buffer_diarization=buffer_diarization_text, buffer_translation=buffer_translation_text,
+            remaining_time_transcription=state.remaining_time_transcription, remaining_time_diarization=0,
+        )
+        if response != self.last_response_content:
+            yield response
+            self.last_response_content = response
+        await asyncio.sleep(0.05)
+
+
+async def transcribe(session, index, args):
+    """New tokens as the transcription processor adds them."""
+    n = len(session.state.tokens)
+    while True:
+        await asyncio.sleep(args.token_interval)
+        for _ in range(args.burst):
+            token = ASRToken(n * 0.3, n * 0.3 + 0.25, f"word{n}")
+            n += 1
+            async with session.lock:
+                session.state.tokens.append(token)
+                session.state.new_tokens.append(token)
+                session.state.new_tokens_buffer = Transcript(start=token.end, end=token.end + 0.5, text="next")
+                session.state.end_buffer = token.end
+            session.results_changed.set()
+            await asyncio.sleep(0)
+
+
+async def run(mode, args):
+    sessions = [bare_session(args, args.transcript_tokens) for _ in range(args.sessions)]
+    passes = [0]
+    pushed = [0]
+
+    original_get_lines = TokensAlignment.get_lines
+
+    def counting_get_lines(self, *a, **kw):
+        passes[0] += 1
+        return original_get_lines(self, *a, **kw)
+
+    TokensAlignment.get_lines = counting_get_lines
+
+    async def consume(session):
+        formatter = polling_formatter(session) if mode == "polling" else session.results_formatter()
+        async for _ in formatter:
+            pushed[0] += 1
+
+    tasks = [asyncio.create_task(consume(s)) for s in sessions]
+    tasks += [asyncio.create_task(transcribe(s, i, args)) for i, s in enumerate(sessions[:args.active])]
+    await asyncio.sleep(0.5)  # initial pushes
+    passes[0] = pushed[0] = 0
+    cpu = time.process_time()
+    await asyncio.sleep(args.seconds)
+    cpu = time.process_time() - cpu
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    TokensAlignment.get_lines = original_get_lines
+    return passes[0] / args.seconds, pushed[0] / args.seconds, cpu / args.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--active", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--transcript-tokens", type=int, default=300)
+    parser.add_argument("--token-interval", type=float, default=0.5)
+    parser.add_argument("--burst", type=int, default=3, help="updates per transcription step")
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions ({args.active} active), {args.transcript_tokens} tokens of transcript, "
+          f"{args.burst} updates every {args.token_interval}s per active session")
+    for mode in ("polling", "event"):
+        passes, pushed, cpu = asyncio.run(run(mode, args))
+        print(f"{mode:8s}: {passes:7.1f} formatting passes/s, {pushed:5.1f} messages/s, "
+              f"event loop CPU {cpu * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Bytes sent per session by the legacy snapshot protocol vs. `transcript_update`
+(incremental segments, see docs/API.md), for a long simulated session.
+
+A transcript grows by --words-per-second words, one sentence (line) every
+--words-per-line words, with a transcription buffer, and is pushed --pushes-per-second
+times per second through `ResultsEncoder` in both protocols. The client side of
+`transcript_update` is replayed (segments replaced by id, truncated to
+`segment_count`) and checked against the legacy lines after every push.
+
+    python scripts/benchmark_results_protocol.py --minutes 90
+"""
+
+import argparse
+import json
+
+from whisperlivekit.results_protocol import (LEGACY_PROTOCOL,
+                                             TRANSCRIPT_UPDATE_PROTOCOL,
+                                             ResultsEncoder)
+from whisperlivekit.timed_objects import FrontData, Segment
+
+
+def session(args):
+    """FrontData of each push of the session."""
+    words, lines = [], []
+    n_pushes = int(args.minutes * 60 * args.pushes_per_second)
+    for push in range(n_pushes):
+        now = push / args.pushes_per_second
+        while len(words) < now * args.words_per_second:
+            words.append(f" word{len(words)}")
+        text_lines = [words[i:i + args.words_per_line] for i in range(0, len(words), args.words_per_line)]
+        lines = [
+            Segment(start=i * args.words_per_line / args.words_per_second,
+                    end=(i * args.words_per_line + len(line)) / args.words_per_second,
+                    text="".join(line) + ("." if len(line) == args.words_per_line else ""), speaker=-1)
+            for i, line in enumerate(text_lines)
+        ]
+        yield FrontData(status="active_transcription", lines=lines, buffer_transcription=f" buffer{push % 7}",
+                        remaining_time_transcription=round(push % 10 * 0.1, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=90.0)
+    parser.add_argument("--pushes-per-second", type=float, default=4.0)
+    parser.add_argument("--words-per-second", type=float, default=2.5)
+    parser.add_argument("--words-per-line", type=int, default=15)
+    args = parser.parse_args()
+
+    legacy = ResultsEncoder(LEGACY_PROTOCOL)
+    incremental = ResultsEncoder(TRANSCRIPT_UPDATE_PROTOCOL)
+    client_segments = {}
+    largest = {LEGACY_PROTOCOL: 0, TRANSCRIPT_UPDATE_PROTOCOL: 0}
+    mismatches = 0
+    for response in session(args):
+        legacy_text = legacy.encode(response)
+        update_text = incremental.encode(response)
+        largest[LEGACY_PROTOCOL] = max(largest[LEGACY_PROTOCOL], len(legacy_text))
+        largest[TRANSCRIPT_UPDATE_PROTOCOL] = max(largest[TRANSCRIPT_UPDATE_PROTOCOL], len(update_text))
+
+        update = json.loads(update_text)
+        for segment in update["segments"]:
+            client_segments[segment["id"]] = segment
+        client_segments = {i: s for i, s in client_segments.items() if i < update["segment_count"]}
+        expected = [line["text"] for line in json.loads(legacy_text)["lines"]]
+        mismatches += [client_segments[i]["text"] for i in range(update["segment_count"])] != expected
+
+    seconds = args.minutes * 60
+    print(f"{args.minutes:.0f} min session, {args.pushes_per_second} pushes/s, {args.words_per_second} words/s, "
+          f"{legacy.messages_sent} pushes, client replay mismatches: {mismatches}")
+    for name, encoder in ((LEGACY_PROTOCOL, legacy), (TRANSCRIPT_UPDATE_PROTOCOL, incremental)):
+        print(f"{name:17s}: {encoder.bytes_sent / 1e6:8.2f} MB, {encoder.bytes_sent / seconds / 1000:7.2f} kB/s on average, "
+              f"largest message {largest[name] / 1000:.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Speculative decoding of AlignAtt with a draft model (--draft-model): tokens identical
+to plain greedy decoding, acceptance rate and speedup.
+
+Each recording is streamed chunk by chunk through AlignAtt without and with the draft
+model (both with --beams 1). Reported: whether the two outputs are identical, the
+share of drafted tokens accepted by the main model and the time spent in `infer`.
+The script exits with status 1 when the output of any recording differs.
+
+    python scripts/benchmark_speculative_decoding.py --model large-v3 --draft-model tiny \\
+        --language en --audio session1.wav session2.wav
+
+With --random-weights, random models cannot agree on tokens: only the cost side is
+measured, i.e. the latency of one main decoder pass over 1 to --draft-tokens + 1
+tokens and of one draft token, and the speedup they give at a few acceptance rates.
+
+    python scripts/benchmark_speculative_decoding.py --random-weights large-v3-turbo --draft-dims tiny
+"""
+
+import argparse
+import logging
+import pathlib
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from whisperlivekit.simul_whisper.config import AlignAttConfig
+from whisperlivekit.simul_whisper.simul_whisper import AlignAtt
+from whisperlivekit.whisper import load_model
+from whisperlivekit.whisper.audio import SAMPLE_RATE, load_audio
+from whisperlivekit.whisper.model import ModelDimensions, Whisper
+
+MODEL_DIMS = {
+    # n_state, n_head, n_audio_layer, n_text_layer
+    "tiny": (384, 6, 4, 4),
+    "base": (512, 8, 6, 6),
+    "small": (768, 12, 12, 12),
+    "medium": (1024, 16, 24, 24),
+    "large-v3-turbo": (1280, 20, 32, 4),
+}
+
+
+def random_model(name):
+    n_state, n_head, n_audio_layer, n_text_layer = MODEL_DIMS[name]
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=n_state, n_audio_head=n_head, n_audio_layer=n_audio_layer,
+        n_vocab=51865, n_text_ctx=448, n_text_state=n_state, n_text_head=n_head, n_text_layer=n_text_layer,
+    )
+    torch.manual_seed(0)
+    model = Whisper(dims)
+    with torch.no_grad():
+        for p in model.parameters():
+            p.normal_(0, 0.02)
+    return model.eval()
+
+
+def stream(model, draft_model, audio, args):
+    cfg = AlignAttConfig(
+        language=args.language, decoder_type="beam", beam_size=1, frame_threshold=args.frame_threshold,
+        audio_max_len=args.audio_max_len, cif_ckpt_path=None, never_fire=True, draft_tokens=args.draft_tokens,
+    )
+    aligner = AlignAtt(cfg=cfg, loaded_model=model, draft_model=draft_model)
+    chunk = int(args.chunk * SAMPLE_RATE)
+    tokens, elapsed = [], 0.0
+    for start in range(0, len(audio), chunk):
+        aligner.insert_audio(audio[start:start + chunk])
+        beg = time.perf_counter()
+        words = aligner.infer(is_last=start + chunk >= len(audio))
+        elapsed += time.perf_counter() - beg
+        tokens += [(w.text, w.start, w.end) for w in words]
+    return tokens, elapsed, aligner.draft
+
+
+def median_time(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        beg = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - beg)
+    times.sort()
+    return times[len(times) // 2]
+
+
+@torch.no_grad()
+def decoder_costs(model, draft_model, args):
+    """Latency of a main decoder pass over n fed tokens, and of one draft token."""
+    features = model.encoder(torch.randn(1, model.dims.n_mels, 3000) * 0.1)
+    prompt = torch.randint(0, 50000, (1, args.prompt))
+
+    def main_pass(n):
+        kv_cache = {}
+        model.decoder(prompt, features, kv_cache=kv_cache)
+        tokens = torch.randint(0, 50000, (1, n))
+        return lambda: model.decoder(tokens, features, kv_cache=dict(kv_cache))
+
+    draft_features = draft_model.encoder(torch.randn(1, draft_model.dims.n_mels, 3000) * 0.1)
+    draft_cache = {}
+    draft_model.decoder(prompt, draft_features, kv_cache=draft_cache)
+    token = torch.randint(0, 50000, (1, 1))
+    draft_time = median_time(lambda: draft_model.decoder(token, draft_features, kv_cache=dict(draft_cache)))
+    return [median_time(main_pass(n)) for n in range(1, args.draft_tokens + 2)], draft_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base", help="model name or path for load_model")
+    parser.add_argument("--draft-model", default="tiny", help="draft model name or path for load_model")
+    parser.add_argument("--random-weights", choices=sorted(MODEL_DIMS), default=None)
+    parser.add_argument("--draft-dims", choices=sorted(MODEL_DIMS), default="tiny")
+    parser.add_argument("--audio", nargs="*", default=[])
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--chunk", type=float, default=1.0)
+    parser.add_argument("--audio-max-len", type=float, default=20.0)
+    parser.add_argument("--frame-threshold", type=int, default=25)
+    parser.add_argument("--draft-tokens", type=int, default=4)
+    parser.add_argument("--prompt", type=int, default=30, help="tokens already in the cache with --random-weights")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    if args.random_weights:
+        model, draft_model = random_model(args.random_weights), random_model(args.draft_dims)
+        main_times, draft_time = decoder_costs(model, draft_model, args)
+        print(f"{args.random_weights} decoder, {args.draft_dims} draft, {torch.get_num_threads()} threads")
+        for n, t in enumerate(main_times, 1):
+            print(f"main pass over {n} tokens: {t * 1000:.2f}ms")
+        print(f"draft token: {draft_time * 1000:.2f}ms")
+        k = args.draft_tokens
+        for acceptance in (0.5, 0.7, 0.8, 0.9):
+            # expected tokens produced per verification pass when each drafted token is accepted with p = acceptance
+            produced = (1 - acceptance ** (k + 1)) / (1 - acceptance)
+            speedup = produced * main_times[0] / (main_times[k] + k * draft_time)
+            print(f"acceptance {acceptance:.1f}: {produced:.2f} tokens per pass, decoder speedup {speedup:.2f}x")
+        return
+
+    model = load_model(args.model, device="cpu")
+    draft_model = load_model(args.draft_model, device="cpu")
+    print(f"{args.model} with draft {args.draft_model}, {args.draft_tokens} draft tokens, "
+          f"{torch.get_num_threads()} threads")
+    total_plain = total_draft = 0.0
+    different = []
+    for path in args.audio:
+        audio = torch.from_numpy(load_audio(path))
+        plain_tokens, plain_time, _ = stream(model, None, audio, args)
+        draft_tokens, draft_time, draft = stream(model, draft_model, audio, args)
+        total_plain += plain_time
+        total_draft += draft_time
+        if plain_tokens != draft_tokens:
+            different.append(path)
+        print(f"{path}: {len(audio) / SAMPLE_RATE:.1f}s audio, "
+              f"{'identical' if plain_tokens == draft_tokens else 'DIFFERENT'} output, "
+              f"accepted {draft.accepted}/{draft.proposed} drafted tokens "
+              f"({draft.accepted / max(draft.proposed, 1):.0%}), "
+              f"infer {plain_time:.2f}s -> {draft_time:.2f}s ({plain_time / draft_time:.2f}x)")
+    if len(args.audio) > 1:
+        print(f"total: infer {total_plain:.2f}s -> {total_draft:.2f}s ({total_plain / total_draft:.2f}x)")
+    if different:
+        print(f"MISMATCH: the draft model changed the output of {', '.join(different)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+CPU cost and latency of the Silero VAC of --sessions concurrent sessions, each with
+its own `OnnxWrapper` (one batch-1 `session.run` per 512-sample window, as without
+--vad-batch-size) vs. `VADBatchService` (the pending windows of all the sessions in
+batched calls).
+
+All the sessions run on one event loop, as in the server, and receive a --chunk
+second chunk every --chunk seconds in real time (the chunks of the sessions are
+staggered) for --seconds. The audio is a synthetic mix of voiced bursts and pauses.
+Reported: the CPU time per second of audio and session, the ONNX calls per second,
+and the time from the arrival of a chunk to its VAD result (which includes the
+batching wait). The speech probabilities of every window are compared between the
+two modes first.
+
+    python scripts/benchmark_vad_batching.py --sessions 32 --batch-size 32
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from whisperlivekit.silero_vad_iterator import (BatchedVADIterator,
+                                                FixedVADIterator, OnnxWrapper,
+                                                VADBatchService,
+                                                load_onnx_session)
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_audio(seed, seconds):
+    """Harmonic bursts of 0.3-2 s (with noise) separated by 0.2-1.5 s of low noise."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < seconds * SAMPLE_RATE:
+        n = int(rng.uniform(0.3, 2.0) * SAMPLE_RATE)
+        t = np.arange(n) / SAMPLE_RATE
+        f0 = rng.uniform(100, 250)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+        parts.append(0.2 * voiced + 0.01 * rng.standard_normal(n))
+        n = int(rng.uniform(0.2, 1.5) * SAMPLE_RATE)
+        parts.append(0.003 * rng.standard_normal(n))
+        total += sum(len(p) for p in parts[-2:])
+    return np.concatenate(parts)[: int(seconds * SAMPLE_RATE)].astype(np.float32)
+
+
+def check_probabilities(session, audio, service):
+    """Probabilities of every window of every session, per session and batched."""
+    wrappers = [OnnxWrapper(session=session) for _ in audio]
+    import torch
+    expected = [
+        [wrapper(torch.from_numpy(a[i:i + 512]), SAMPLE_RATE).item() for i in range(0, len(a) - 511, 512)]
+        for wrapper, a in zip(wrappers, audio)
+    ]
+    models = [service.register() for _ in audio]
+    futures = [model.probabilities(a[: len(a) // 512 * 512].reshape(-1, 512)) for model, a in zip(models, audio)]
+    batched = [future.result() for future in futures]
+    for model in models:
+        model.release()
+    return max(np.abs(np.array(e) - b).max() for e, b in zip(expected, batched))
+
+
+async def run(vads, audio, args, batched):
+    n = int(args.chunk * SAMPLE_RATE)
+    latencies = []
+    events = [[] for _ in vads]
+    start = time.perf_counter() + 0.1
+
+    async def session(index):
+        vad = vads[index]
+        offset = index * args.chunk / len(vads)
+        for k in range(len(audio[index]) // n):
+            arrival = start + offset + (k + 1) * args.chunk
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            chunk = audio[index][k * n:(k + 1) * n]
+            result = await vad.process(chunk) if batched else vad(chunk)
+            latencies.append(time.perf_counter() - arrival)
+            if result is not None:
+                events[index].append(result)
+
+    cpu = time.process_time()
+    await asyncio.gather(*(session(i) for i in range(len(vads))))
+    return time.process_time() - cpu, latencies, events
+
+
+def report(name, cpu, latencies, calls, args):
+    p50, p95, worst = np.percentile(np.array(latencies) * 1000, [50, 95, 100])
+    audio = args.sessions * args.seconds
+    print(f"{name:22s}: CPU {cpu / audio * 1000:6.2f}ms per audio second, {calls / args.seconds:7.0f} ONNX calls/s, "
+          f"chunk latency p50 {p50:5.1f}ms p95 {p95:5.1f}ms max {worst:5.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--chunk", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batch-wait", type=float, default=0.005)
+    args = parser.parse_args()
+    logging.getLogger("whisperlivekit.simul_whisper.batch_scheduler").setLevel(logging.WARNING)
+
+    session = load_onnx_session()
+    audio = [synthetic_audio(i, args.seconds) for i in range(args.sessions)]
+    service = VADBatchService(session, max_batch_size=args.batch_size, max_wait=args.batch_wait)
+    difference = check_probabilities(session, audio, service)
+    print(f"{args.sessions} sessions, {args.seconds:.0f}s of audio in {args.chunk * 1000:.0f}ms chunks; "
+          f"largest difference of the batched speech probabilities: {difference:.2e}")
+
+    vads = [FixedVADIterator(OnnxWrapper(session=session)) for _ in range(args.sessions)]
+    cpu, latencies, reference = asyncio.run(run(vads, audio, args, batched=False))
+    windows = args.sessions * int(args.seconds * SAMPLE_RATE) // 512
+    report("per-session calls", cpu, latencies, windows, args)
+
+    vads = [BatchedVADIterator(service.register()) for _ in range(args.sessions)]
+    steps = service.steps
+    cpu, latencies, events = asyncio.run(run(vads, audio, args, batched=True))
+    report(f"batched (<= {args.batch_size})", cpu, latencies, service.steps - steps, args)
+    mean_batch = sum(vad.metrics()["batched_with"] + vad.metrics()["calls"] for vad in vads) / max(1, sum(vad.metrics()["calls"] for vad in vads))
+    print(f"mean sessions per batch: {mean_batch:.1f}, speech events identical: {events == reference} "
+          f"({sum(len(e) for e in events)} events)")
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Silero windows skipped by the energy pre-gate of the VAC (`EnergyGate`,
+--vad-gate-db) on a mostly idle session, the CPU it saves, and how much it moves
+the speech events.
+
+The session alternates speech with --idle seconds of idle microphone: noise at
+--noise-db dBFS, or digital silence with --noise-db off. The speech is read from the
+--speech WAV files (16 kHz mono 16-bit), or synthetic voiced bursts without them.
+Each configuration is fed the same audio in --chunk second chunks with
+`FixedVADIterator` and `OnnxWrapper`. Reported: the windows skipped, the model calls
+(the skipped windows, less the window evaluated again on each resumption) and the CPU
+time per audio second (process time, best of 3), and the speech segments compared
+with those of the ungated iterator.
+
+    python scripts/benchmark_vad_gate.py --speech a.wav b.wav --noise-db -70 --idle 3
+"""
+
+import argparse
+import time
+import wave
+
+import numpy as np
+
+from whisperlivekit.silero_vad_iterator import (EnergyGate, FixedVADIterator,
+                                                OnnxWrapper,
+                                                load_onnx_session)
+
+SAMPLE_RATE = 16000
+
+
+class CountingOnnxWrapper(OnnxWrapper):
+    calls = 0
+
+    def probability(self, window):
+        self.calls += 1
+        return super().probability(window)
+
+
+def read_wav(path):
+    with wave.open(path) as f:
+        if f.getframerate() != SAMPLE_RATE or f.getnchannels() != 1 or f.getsampwidth() != 2:
+            raise ValueError(f"{path}: 16 kHz mono 16-bit WAV expected")
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).astype(np.float32) / 32768
+
+
+def synthetic_speech(rng):
+    n = int(rng.uniform(1.0, 4.0) * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    f0 = rng.uniform(100, 250)
+    voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    return (0.2 * voiced + 0.003 * rng.standard_normal(n)).astype(np.float32)
+
+
+def session_audio(speech, idle, noise_db, rng):
+    parts = []
+    for clip in speech:
+        n = int(rng.uniform(0.5, 1.5) * idle * SAMPLE_RATE)
+        noise = np.zeros(n) if noise_db is None else 10 ** (noise_db / 20) * rng.standard_normal(n)
+        parts += [noise.astype(np.float32), clip]
+    return np.concatenate(parts)
+
+
+def feed(vad, audio, chunk):
+    events = []
+    for i in range(0, len(audio), chunk):
+        result = vad(audio[i:i + chunk])
+        if result is not None:
+            events.append(result)
+    return events
+
+
+def segments(events):
+    """
+    (start, end) samples of the speech segments. An event can hold an end and the next
+    start; a start without an end before it continues the segment (`_merge_events`
+    drops an end followed by a start in the same chunk).
+    """
+    result = []
+    for event in events:
+        for kind, sample in sorted(event.items(), key=lambda item: item[1]):
+            if kind == "start" and (not result or result[-1][1] is not None):
+                result.append([sample, None])
+            elif kind == "end" and result:
+                result[-1][1] = sample
+    return result
+
+
+def labels(events, length):
+    speech = np.zeros(length, dtype=bool)
+    for start, end in segments(events):
+        speech[start:end if end is not None else length] = True
+    return speech
+
+
+def compare(reference, events, length):
+    """Segments, and the audio labelled differently (speech / not speech) than in the reference."""
+    a, b = labels(reference, length), labels(events, length)
+    differ = np.count_nonzero(a != b)
+    return (f"{len(segments(events))} segments (reference {len(segments(reference))}), "
+            f"labels differ on {differ * 1000 / SAMPLE_RATE:.0f}ms ({differ / max(1, np.count_nonzero(a)):.1%} of the speech)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--speech", nargs="*", default=[], help="16 kHz mono 16-bit WAV files")
+    parser.add_argument("--idle", type=float, default=3.0, help="mean idle time between speech, in seconds")
+    parser.add_argument("--noise-db", default="-70", help="idle noise level in dBFS, or 'off' for digital silence")
+    parser.add_argument("--chunk", type=float, default=0.1)
+    parser.add_argument("--threshold-db", type=float, nargs="*", default=[-60.0, -50.0])
+    parser.add_argument("--max-zcr", type=float, nargs="*", default=[0.25, 1.0])
+    parser.add_argument("--hangover", type=float, nargs="*", default=[0.25, 0.5, 1.0], help="seconds")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    speech = [read_wav(path) for path in args.speech] or [synthetic_speech(rng) for _ in range(15)]
+    noise_db = None if args.noise_db == "off" else float(args.noise_db)
+    audio = session_audio(speech, args.idle, noise_db, rng)
+    chunk = int(args.chunk * SAMPLE_RATE)
+    session = load_onnx_session()
+    seconds = len(audio) / SAMPLE_RATE
+    print(f"{seconds:.0f}s session, {sum(len(s) for s in speech) / len(audio):.0%} speech, "
+          f"idle noise {args.noise_db} dBFS, {chunk}-sample chunks")
+
+    def run(gate):
+        vad = FixedVADIterator(CountingOnnxWrapper(session=session), gate=gate)
+        events = feed(vad, audio, chunk)
+        best = float("inf")
+        for _ in range(3):
+            timed = FixedVADIterator(OnnxWrapper(session=session), gate=gate)
+            beg = time.process_time()
+            feed(timed, audio, chunk)
+            best = min(best, time.process_time() - beg)
+        return events, best / seconds * 1000, vad.metrics(), vad.model.calls
+
+    reference, cpu, _, calls = run(None)
+    print(f"no gate: {calls} model calls, CPU {cpu:.2f}ms per audio second, {len(segments(reference))} segments")
+    for threshold_db in args.threshold_db:
+        for max_zcr in args.max_zcr:
+            for hangover in args.hangover:
+                gate = EnergyGate(threshold_db, max_zcr, round(hangover * SAMPLE_RATE / 512))
+                events, gated_cpu, metrics, gated_calls = run(gate)
+                print(f"{threshold_db:4.0f}dB zcr<{max_zcr:.2f} hangover {hangover:.2f}s: "
+                      f"skipped {metrics['skipped_fraction']:5.1%}, {gated_calls} model calls, "
+                      f"CPU {gated_cpu:5.2f}ms per audio second ({1 - gated_cpu / cpu:.0%} saved), "
+                      f"{compare(reference, events, len(audio))}")
+
+
+if __name__ == "__main__":
+    main()
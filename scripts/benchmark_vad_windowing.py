@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Windows per second and core of the Silero VAC of one session (`FixedVADIterator`),
+fed --chunk second chunks, compared with its previous implementation and with the
+bare model calls.
+
+- previous: `np.append` of each chunk to the buffer, `buffer[512:]` copies after
+  each window, a `torch.Tensor` per window and `OnnxWrapper.__call__` (`torch.cat`
+  and `.numpy()` conversions around `session.run`).
+- current: windows read in place from the chunk and `OnnxWrapper.probability`
+  (preallocated input, states bound in place, `run_with_iobinding`).
+- model only: `session.run` and `run_with_iobinding` in a loop on fixed buffers.
+- windowing only: the current implementation with a model returning 0 at once.
+- sequence: the current implementation with `OnnxSequenceWrapper`
+  (`silero_vad_sequence.onnx`, all the windows of a chunk in one `session.run`, as
+  with --vad-multi-window), compared with the current one (events, ONNX calls).
+
+The events and speech probabilities of the two implementations are compared on the
+same audio first. The JIT model is measured the same way with --jit.
+
+    python scripts/benchmark_vad_windowing.py --chunk 0.04
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from whisperlivekit.silero_vad_iterator import (FixedVADIterator,
+                                                OnnxSequenceWrapper,
+                                                OnnxWrapper, VADIterator,
+                                                load_jit_vad,
+                                                load_onnx_session)
+
+SAMPLE_RATE = 16000
+
+
+class PreviousFixedVADIterator(VADIterator):
+    """`FixedVADIterator` before the NumPy windowing."""
+
+    def reset_states(self):
+        super().reset_states()
+        self.buffer = np.array([], dtype=np.float32)
+        self.probabilities = []
+
+    def __call__(self, x, return_seconds=False):
+        self.buffer = np.append(self.buffer, x)
+        ret = None
+        while len(self.buffer) >= 512:
+            window = torch.Tensor(self.buffer[:512])
+            speech_prob = self.model(window, self.sampling_rate).item()
+            self.probabilities.append(speech_prob)
+            self.current_sample += 512
+            r = self._on_probability(speech_prob, 512, return_seconds)
+            self.buffer = self.buffer[512:]
+            ret = FixedVADIterator._merge_events(ret, r)
+        return ret if ret != {} else None
+
+
+class RecordingFixedVADIterator(FixedVADIterator):
+    def reset_states(self):
+        super().reset_states()
+        self.probabilities = []
+
+    def _probability(self, window):
+        speech_prob = super()._probability(window)
+        self.probabilities.append(speech_prob)
+        return speech_prob
+
+
+class CountingSequenceWrapper(OnnxSequenceWrapper):
+    def reset_states(self, batch_size=1):
+        super().reset_states(batch_size)
+        self.calls = 0
+
+    def probabilities(self, windows):
+        self.calls += 1
+        return super().probabilities(windows)
+
+
+class NoModel:
+    def probability(self, window):
+        return 0.0
+
+    def reset_states(self):
+        pass
+
+
+def speech_like(seconds, seed=0):
+    """Harmonic bursts separated by pauses of low noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 8))
+    gate = (np.sin(2 * np.pi * 0.4 * t) > 0).astype(np.float64)
+    return (0.2 * voiced * gate + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def feed(vad, audio, chunk):
+    events = []
+    for i in range(0, len(audio), chunk):
+        result = vad(audio[i:i + chunk])
+        if result is not None:
+            events.append(result)
+    return events
+
+
+def windows_per_second(vad, audio, chunk, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        vad.reset_states()
+        beg = time.process_time()
+        feed(vad, audio, chunk)
+        best = min(best, time.process_time() - beg)
+    return (len(audio) // 512) / best
+
+
+def best_rate(loop, windows, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        beg = time.process_time()
+        loop(windows)
+        best = min(best, time.process_time() - beg)
+    return windows / best
+
+
+def model_only(onnx_session, windows):
+    session = onnx_session.session
+    x = np.zeros((1, 576), dtype=np.float32)
+    sr = np.array(SAMPLE_RATE, dtype=np.int64)
+
+    def run(n):
+        state = np.zeros((2, 1, 128), dtype=np.float32)
+        for _ in range(n):
+            _, state = session.run(None, {'input': x, 'state': state, 'sr': sr})
+
+    binding = OnnxWrapper(session=onnx_session)._bindings[0]
+
+    def bound(n):
+        for _ in range(n):
+            session.run_with_iobinding(binding)
+
+    return best_rate(run, windows), best_rate(bound, windows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk", type=float, default=0.04, help="chunk duration in seconds")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--jit", action="store_true", help="also measure the JIT model")
+    args = parser.parse_args()
+    torch.set_num_threads(1)
+
+    audio = speech_like(args.seconds)
+    chunk = int(args.chunk * SAMPLE_RATE)
+    onnx_session = load_onnx_session()
+    models = {"onnx": lambda: OnnxWrapper(session=onnx_session)}
+    if args.jit:
+        models["jit"] = load_jit_vad
+
+    print(f"{args.seconds:.0f}s of audio in {chunk}-sample chunks, 1 thread")
+    for name, make_model in models.items():
+        previous = PreviousFixedVADIterator(make_model())
+        current = RecordingFixedVADIterator(make_model())
+        previous_events = feed(previous, audio, chunk)
+        current_events = feed(current, audio, chunk)
+        difference = np.abs(np.array(previous.probabilities) - np.array(current.probabilities)).max()
+        print(f"{name}: events identical: {previous_events == current_events} ({len(current_events)} events), "
+              f"largest probability difference {difference:.1e}")
+        before = windows_per_second(previous, audio, chunk)
+        after = windows_per_second(FixedVADIterator(make_model()), audio, chunk)
+        print(f"{name}: previous {before:8.0f} windows/s, current {after:8.0f} windows/s ({after / before:.2f}x)")
+    run, bound = model_only(onnx_session, len(audio) // 512)
+    print(f"onnx model only: session.run {run:8.0f} windows/s, run_with_iobinding {bound:8.0f} windows/s")
+    overhead = 1e6 / windows_per_second(FixedVADIterator(NoModel()), audio, chunk)
+    print(f"windowing without model: {overhead:.1f}us per window")
+
+    sequence_session = load_onnx_session(sequence=True)
+    window = FixedVADIterator(OnnxWrapper(session=onnx_session))
+    sequence = FixedVADIterator(CountingSequenceWrapper(sequence_session))
+    window_events = feed(window, audio, chunk)
+    sequence_events = feed(sequence, audio, chunk)
+    print(f"sequence: events identical: {window_events == sequence_events}, "
+          f"ONNX calls per audio second {len(audio) // 512 / args.seconds:.1f} -> "
+          f"{sequence.model.calls / args.seconds:.1f}")
+    before = windows_per_second(window, audio, chunk)
+    after = windows_per_second(sequence, audio, chunk)
+    print(f"sequence: window model {before:8.0f} windows/s, sequence model {after:8.0f} windows/s "
+          f"({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Parity and timing of the tensorised CIF end-of-word detector (eow_detection.resize /
+fire_at_boundary / fire_at_boundary_batch) against the previous implementation with
+the Python loop over `torch.where(_alphas > threshold)`.
+
+Random CIF projections and encoder features are drawn with several scales, so that
+part of the alphas saturate and go through the smoothing rounds. Checked: resize
+output (equal up to float rounding), the fire decision of each session alone, and the
+decisions of all sessions run as one (B, T) batch with different content lengths.
+The batched decisions must be those of each session alone. The decisions must be those
+of the previous implementation, except at its ties (an integrated alpha within float
+rounding of the boundary), which the closed-form smoothing can round the other way.
+Exits with status 1 on any other mismatch.
+
+    python scripts/check_cif_parity.py --cases 300 --sessions 8
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import torch
+
+# float rounding of the smoothing: resize differences, and decisions at a tie
+TIE = 1e-6
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from whisperlivekit.simul_whisper.eow_detection import (fire_at_boundary,
+                                                        fire_at_boundary_batch,
+                                                        resize)
+
+
+def reference_resize(alphas, target_lengths, threshold=0.999):
+    _num = alphas.sum(-1)
+    num = target_lengths.float()
+    _alphas = alphas * (num / _num)[:, None].repeat(1, alphas.size(1))
+    count = 0
+    while len(torch.where(_alphas > threshold)[0]):
+        count += 1
+        if count > 10:
+            break
+        xs, ys = torch.where(_alphas > threshold)
+        for x, y in zip(xs, ys):
+            if _alphas[x][y] >= threshold:
+                mask = _alphas[x].ne(0).float()
+                mean = 0.5 * _alphas[x].sum() / mask.sum()
+                _alphas[x] = _alphas[x] * 0.5 + mean * mask
+    return _alphas, _num
+
+
+def reference_fire_at_boundary(chunked_encoder_feature, cif_linear):
+    content_mel_len = chunked_encoder_feature.shape[1]
+    alphas = cif_linear(chunked_encoder_feature).squeeze(dim=2)
+    alphas = torch.sigmoid(alphas)
+    decode_length = torch.round(alphas.sum(-1)).int()
+    alphas, _ = reference_resize(alphas, decode_length)
+    alphas = alphas.squeeze(0)
+    threshold = 0.999
+    integrate = torch.cumsum(alphas[:-1], dim=0)
+    exceed_count = integrate[-1] // threshold
+    integrate = integrate - exceed_count * 1.0
+    important_positions = (integrate >= 0).nonzero(as_tuple=True)[0]
+    if important_positions.numel() == 0:
+        return False
+    return bool(important_positions[0] >= content_mel_len - 2)
+
+
+def reference_tie_margin(chunked_encoder_feature, cif_linear, threshold=0.999):
+    """Distance of the previous implementation's decision to a tie: an integrated alpha at 0, or a whole count."""
+    alphas = torch.sigmoid(cif_linear(chunked_encoder_feature).squeeze(dim=2))
+    alphas, _ = reference_resize(alphas, torch.round(alphas.sum(-1)).int())
+    integrate = torch.cumsum(alphas.squeeze(0)[:-1], dim=0)
+    count = integrate[-1] / threshold
+    return min(((count - count.round()).abs() * threshold).item(),
+               (integrate - torch.floor(count)).abs().min().item())
+
+
+def random_case(generator, n_state, max_frames):
+    cif_linear = torch.nn.Linear(n_state, 1)
+    scale = [0.05, 0.5, 3.0][int(torch.randint(0, 3, (1,), generator=generator))]
+    with torch.no_grad():
+        cif_linear.weight.normal_(0, scale, generator=generator)
+        cif_linear.bias.normal_(0, 2.0, generator=generator)
+    n_frames = int(torch.randint(3, max_frames, (1,), generator=generator))
+    features = torch.randn(1, n_frames, n_state, generator=generator)
+    return cif_linear, features
+
+
+@torch.no_grad()
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--n-state", type=int, default=384)
+    parser.add_argument("--max-frames", type=int, default=500)
+    args = parser.parse_args()
+    generator = torch.Generator().manual_seed(0)
+
+    resize_diff, resized_cases, same_fire, ties = 0.0, 0, 0, 0
+    reference_time = tensorised_time = 0.0
+    for _ in range(args.cases):
+        cif_linear, features = random_case(generator, args.n_state, args.max_frames)
+        alphas = torch.sigmoid(cif_linear(features).squeeze(dim=2))
+        target = torch.round(alphas.sum(-1)).int()
+        expected, _ = reference_resize(alphas.clone(), target)
+        actual, _ = resize(alphas.clone(), target)
+        resize_diff = max(resize_diff, (expected - actual).abs().max().item())
+        resized_cases += bool((alphas * (target.float() / alphas.sum(-1))[:, None] > 0.999).any())
+
+        beg = time.perf_counter()
+        expected_fire = reference_fire_at_boundary(features, cif_linear)
+        reference_time += time.perf_counter() - beg
+        beg = time.perf_counter()
+        actual_fire = fire_at_boundary(features, cif_linear)
+        tensorised_time += time.perf_counter() - beg
+        same_fire += expected_fire == actual_fire
+        ties += expected_fire != actual_fire and reference_tie_margin(features, cif_linear) < TIE
+
+    # sessions of different lengths in one batch, sharing the CIF projection
+    same_batched, same_alone, batched_ties, batches = 0, 0, 0, args.cases // args.sessions
+    for _ in range(batches):
+        cif_linear, _ = random_case(generator, args.n_state, args.max_frames)
+        lengths = torch.randint(3, args.max_frames, (args.sessions,), generator=generator)
+        features = torch.randn(args.sessions, int(lengths.max()), args.n_state, generator=generator)
+        batched = fire_at_boundary_batch(features, cif_linear, lengths)
+        for i, n in enumerate(lengths.tolist()):
+            expected_fire = reference_fire_at_boundary(features[i:i + 1, :n], cif_linear)
+            same_batched += bool(batched[i]) == expected_fire
+            batched_ties += (bool(batched[i]) != expected_fire
+                             and reference_tie_margin(features[i:i + 1, :n], cif_linear) < TIE)
+            same_alone += bool(batched[i]) == fire_at_boundary(features[i:i + 1, :n], cif_linear)
+
+    n_batched = batches * args.sessions
+    print(f"resize: max abs diff {resize_diff:.2e} over {args.cases} cases ({resized_cases} with smoothing rounds)")
+    print(f"fire_at_boundary: {same_fire}/{args.cases} identical decisions ({ties} others at ties), "
+          f"{reference_time / args.cases * 1000:.3f}ms -> {tensorised_time / args.cases * 1000:.3f}ms per call")
+    print(f"fire_at_boundary_batch: {same_batched}/{n_batched} identical decisions ({batched_ties} others at ties), "
+          f"{same_alone}/{n_batched} identical to each session alone ({args.sessions} sessions per batch)")
+    if (resize_diff > TIE or same_fire + ties != args.cases or same_batched + batched_ties != n_batched
+            or same_alone != n_batched):
+        print("MISMATCH")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Parity and timing of the incremental `TokensAlignment.get_lines_diarization` against
+the previous implementation, which rebuilt the punctuation segments, merged the
+diarization slices and attributed every segment to a speaker at each call.
+
+Random sessions are streamed tick by tick: tokens (some with punctuation, some
+silences) and diarization slices arriving behind the transcription, with speaker
+turns of random lengths. With --overlap, part of the slices start before the end of
+the previous one (finalized lines are then attributed again). Checked at every
+tick: the lines (speaker, text, start, end) and the diarization buffer.
+
+Timing: one call at the end of a session of --minutes minutes, both implementations.
+
+    python scripts/check_diarized_lines_parity.py --sessions 200 --minutes 60
+"""
+
+import argparse
+import copy
+import random
+import time
+from argparse import Namespace
+
+from whisperlivekit.timed_objects import (ASRToken, PuncSegment, Silence,
+                                          SpeakerSegment, State)
+from whisperlivekit.tokens_alignment import TokensAlignment
+
+
+class ReferenceAlignment:
+    """The previous get_lines_diarization, on its own copies of the slices."""
+
+    def __init__(self):
+        self.all_tokens = []
+        self.all_diarization_segments = []
+
+    def compute_punctuations_segments(self):
+        segments = []
+        segment_start_idx = 0
+        for i, token in enumerate(self.all_tokens):
+            if token.is_silence():
+                previous_segment = PuncSegment.from_tokens(tokens=self.all_tokens[segment_start_idx: i])
+                if previous_segment:
+                    segments.append(previous_segment)
+                segments.append(PuncSegment.from_tokens(tokens=[token], is_silence=True))
+                segment_start_idx = i + 1
+            elif token.has_punctuation():
+                segments.append(PuncSegment.from_tokens(tokens=self.all_tokens[segment_start_idx: i + 1]))
+                segment_start_idx = i + 1
+        final_segment = PuncSegment.from_tokens(tokens=self.all_tokens[segment_start_idx:])
+        if final_segment:
+            segments.append(final_segment)
+        return segments
+
+    def concatenate_diar_segments(self):
+        if not self.all_diarization_segments:
+            return []
+        merged = [self.all_diarization_segments[0]]
+        for segment in self.all_diarization_segments[1:]:
+            if segment.speaker == merged[-1].speaker:
+                merged[-1].end = segment.end
+            else:
+                merged.append(segment)
+        return merged
+
+    def get_lines_diarization(self):
+        diarization_buffer = ''
+        punctuation_segments = self.compute_punctuations_segments()
+        diarization_segments = self.concatenate_diar_segments()
+        for punctuation_segment in punctuation_segments:
+            if not punctuation_segment.is_silence():
+                if diarization_segments and punctuation_segment.start >= diarization_segments[-1].end:
+                    diarization_buffer += punctuation_segment.text
+                else:
+                    max_overlap = 0.0
+                    max_overlap_speaker = 1
+                    for diarization_segment in diarization_segments:
+                        intersec = TokensAlignment.intersection_duration(punctuation_segment, diarization_segment)
+                        if intersec > max_overlap:
+                            max_overlap = intersec
+                            max_overlap_speaker = diarization_segment.speaker + 1
+                    punctuation_segment.speaker = max_overlap_speaker
+        segments = []
+        if punctuation_segments:
+            segments = [punctuation_segments[0]]
+            for segment in punctuation_segments[1:]:
+                if segment.speaker == segments[-1].speaker:
+                    if segments[-1].text:
+                        segments[-1].text += segment.text
+                    segments[-1].end = segment.end
+                else:
+                    segments.append(segment)
+        return segments, diarization_buffer
+
+
+def stream(rng, seconds, overlap):
+    """(tokens, diarization slices) of each tick of a random session."""
+    t = 0.0
+    diar_t = 0.0
+    speaker = 0
+    turn_end = rng.uniform(2, 20)
+    ticks = []
+    while t < seconds:
+        tokens = []
+        for _ in range(rng.randint(0, 6)):
+            if rng.random() < 0.03:
+                duration = rng.uniform(0.5, 3)
+                tokens.append(Silence(start=t, end=t + duration, duration=duration, has_ended=True))
+                t += duration
+                continue
+            duration = rng.uniform(0.1, 0.6)
+            text = f" w{int(t * 10)}" + (rng.choice(".?!") if rng.random() < 0.12 else "")
+            tokens.append(ASRToken(round(t, 2), round(t + duration, 2), text))
+            t += duration + rng.choice([0, 0, 0.05, 0.3])
+        slices = []
+        # diarization lags behind the transcription
+        while diar_t < t - rng.uniform(0, 4):
+            if diar_t >= turn_end:
+                speaker = rng.choice([s for s in range(4) if s != speaker])
+                turn_end = diar_t + rng.uniform(1, 25)
+            start = diar_t
+            if overlap and slices and rng.random() < 0.05:
+                start -= rng.uniform(0, 0.3)
+            slices.append(SpeakerSegment(start=round(start, 2), end=round(diar_t + 0.5, 2), speaker=speaker))
+            diar_t += 0.5
+        ticks.append((tokens, slices))
+    return ticks
+
+
+def lines_key(lines):
+    return [(line.speaker, line.text, line.start, line.end) for line in lines]
+
+
+def check_session(seed, args):
+    rng = random.Random(seed)
+    ticks = stream(rng, rng.uniform(10, 120), args.overlap)
+    state = State()
+    alignment = TokensAlignment(state, Namespace(diarization=True), " ")
+    reference = ReferenceAlignment()
+    for tokens, slices in ticks:
+        state.new_tokens.extend(tokens)
+        state.new_diarization.extend(copy.deepcopy(slices))
+        alignment.update()
+        reference.all_tokens.extend(tokens)
+        reference.all_diarization_segments.extend(copy.deepcopy(slices))
+        lines, buffer, _ = alignment.get_lines(diarization=True)
+        expected, expected_buffer = reference.get_lines_diarization()
+        if lines_key(lines) != lines_key(expected) or buffer != expected_buffer:
+            return False
+    return True
+
+
+def time_long_session(args):
+    ticks = stream(random.Random(0), args.minutes * 60, args.overlap)
+    state = State()
+    alignment = TokensAlignment(state, Namespace(diarization=True), " ")
+    reference = ReferenceAlignment()
+    for tokens, slices in ticks:
+        state.new_tokens.extend(tokens)
+        state.new_diarization.extend(copy.deepcopy(slices))
+        alignment.update()
+        alignment.get_lines(diarization=True)
+        reference.all_tokens.extend(tokens)
+        reference.all_diarization_segments.extend(copy.deepcopy(slices))
+    reference.get_lines_diarization()
+
+    def best_of(call, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            beg = time.perf_counter()
+            call()
+            best = min(best, time.perf_counter() - beg)
+        return best
+
+    previous = best_of(reference.get_lines_diarization, 5)
+    incremental = best_of(lambda: alignment.get_lines(diarization=True), 50)
+    return len(alignment.all_tokens), len(alignment.diarization_segments), previous, incremental
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--minutes", type=float, default=60.0, help="length of the timed session")
+    parser.add_argument("--overlap", action="store_true", help="some slices start before the previous one ends")
+    args = parser.parse_args()
+
+    mismatches = [seed for seed in range(args.sessions) if not check_session(seed, args)]
+    print(f"parity: {args.sessions - len(mismatches)}/{args.sessions} sessions identical at every tick"
+          + (f", mismatching seeds: {mismatches[:10]}" if mismatches else ""))
+
+    n_tokens, n_turns, previous, incremental = time_long_session(args)
+    print(f"{args.minutes:.0f} min session ({n_tokens} tokens, {n_turns} speaker turns), one call: "
+          f"previous {previous * 1e3:.2f} ms, incremental {incremental * 1e3:.3f} ms ({previous / incremental:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Build `silero_vad_sequence.onnx`, the Silero VAD ONNX model wrapped in an ONNX
+`Loop` over a sequence of windows, from `silero_vad.onnx`. Requires `pip install onnx`
+(only to build the file; loading it needs onnxruntime only).
+
+Inputs:  windows (K, batch, 512) float32, state (2, batch, 128), context (batch, 64),
+         sr int64 scalar
+Outputs: probabilities (K, batch, 1), final_state (2, batch, 128),
+         final_context (batch, 64)
+
+Each iteration of the loop runs the unchanged Silero graph on the context followed by
+window k, and carries its state and the last 64 samples to the next iteration, as
+`OnnxWrapper` does between calls. One `session.run` thus evaluates K windows in order.
+
+    python scripts/export_silero_vad_sequence.py
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+MODELS = Path(__file__).resolve().parent.parent / "whisperlivekit" / "silero_vad_models"
+CONTEXT = 64
+WINDOW = 512
+# names of the loop body, prefixed so that they cannot clash with the names of the Silero graph
+P = "seq_"
+
+
+def rename_inputs(nodes, renames):
+    """Rename the inputs of `nodes` and of the nodes of their subgraphs (the `If` branches)."""
+    import onnx
+
+    for node in nodes:
+        for i, name in enumerate(node.input):
+            if name in renames:
+                node.input[i] = renames[name]
+        for attribute in node.attribute:
+            if attribute.type == onnx.AttributeProto.GRAPH:
+                rename_inputs(attribute.g.node, renames)
+            for graph in attribute.graphs:
+                rename_inputs(graph.node, renames)
+
+
+def build(source):
+    import onnx
+    from onnx import TensorProto, helper
+
+    silero = onnx.load(source)
+    float32, int64 = TensorProto.FLOAT, TensorProto.INT64
+
+    def constant(name, values):
+        return helper.make_node("Constant", [], [name], value=helper.make_tensor(name, int64, [len(values)], values))
+
+    nodes = [
+        helper.make_node("Gather", ["windows", P + "iteration"], [P + "window"], axis=0),
+        helper.make_node("Concat", [P + "context", P + "window"], [P + "input"], axis=1),
+    ]
+    for node in silero.graph.node:
+        copy = onnx.NodeProto()
+        copy.CopyFrom(node)
+        nodes.append(copy)
+    # "sr" is read from the outer graph
+    rename_inputs(nodes[2:], {"input": P + "input", "state": P + "state"})
+    nodes += [
+        constant(P + "context_start", [-CONTEXT]),
+        constant(P + "context_end", [CONTEXT + WINDOW]),
+        constant(P + "context_axis", [1]),
+        helper.make_node(
+            "Slice", [P + "input", P + "context_start", P + "context_end", P + "context_axis"], [P + "next_context"]
+        ),
+        helper.make_node("Identity", [P + "condition"], [P + "next_condition"]),
+    ]
+    body = helper.make_graph(
+        nodes,
+        "silero_vad_window",
+        [
+            helper.make_tensor_value_info(P + "iteration", int64, []),
+            helper.make_tensor_value_info(P + "condition", TensorProto.BOOL, []),
+            # no shapes: the inference of the Silero branches fails on symbolic ones
+            helper.make_tensor_value_info(P + "state", float32, None),
+            helper.make_tensor_value_info(P + "context", float32, None),
+        ],
+        [
+            helper.make_tensor_value_info(P + "next_condition", TensorProto.BOOL, []),
+            helper.make_tensor_value_info("stateN", float32, None),
+            helper.make_tensor_value_info(P + "next_context", float32, None),
+            helper.make_tensor_value_info("output", float32, None),
+        ],
+        initializer=list(silero.graph.initializer),
+    )
+    graph = helper.make_graph(
+        [
+            helper.make_node("Shape", ["windows"], ["windows_shape"]),
+            helper.make_node("Constant", [], ["zero"], value=helper.make_tensor("zero", int64, [], [0])),
+            helper.make_node("Gather", ["windows_shape", "zero"], ["trip_count"], axis=0),
+            helper.make_node("Constant", [], ["true"], value=helper.make_tensor("true", TensorProto.BOOL, [], [True])),
+            helper.make_node(
+                "Loop", ["trip_count", "true", "state", "context"], ["final_state", "final_context", "probabilities"],
+                body=body,
+            ),
+        ],
+        "silero_vad_sequence",
+        [
+            helper.make_tensor_value_info("windows", float32, ["windows", "batch", WINDOW]),
+            helper.make_tensor_value_info("state", float32, [2, "batch", 128]),
+            helper.make_tensor_value_info("context", float32, ["batch", CONTEXT]),
+            helper.make_tensor_value_info("sr", int64, []),
+        ],
+        [
+            helper.make_tensor_value_info("probabilities", float32, ["windows", "batch", 1]),
+            helper.make_tensor_value_info("final_state", float32, [2, "batch", 128]),
+            helper.make_tensor_value_info("final_context", float32, ["batch", CONTEXT]),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=silero.opset_import, ir_version=silero.ir_version)
+    model.doc_string = "Silero VAD v6 (silero_vad.onnx) looped over a sequence of 512-sample windows"
+    onnx.checker.check_model(model)
+    return model
+
+
+def check(source, target, windows=40):
+    """The probabilities and final state match those of one `session.run` per window."""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.inter_op_num_threads = options.intra_op_num_threads = 1
+    single = onnxruntime.InferenceSession(str(source), sess_options=options, providers=["CPUExecutionProvider"])
+    sequence = onnxruntime.InferenceSession(str(target), sess_options=options, providers=["CPUExecutionProvider"])
+    t = np.arange(windows * WINDOW) / 16000
+    audio = (0.2 * np.sin(2 * np.pi * 140 * t) * (np.sin(2 * np.pi * t) > 0)).astype(np.float32)
+    sr = np.array(16000, dtype=np.int64)
+    state = np.zeros((2, 1, 128), dtype=np.float32)
+    context = np.zeros((1, CONTEXT), dtype=np.float32)
+    expected = []
+    for k in range(windows):
+        x = np.concatenate([context, audio[None, k * WINDOW:(k + 1) * WINDOW]], axis=1)
+        out, state = single.run(None, {"input": x, "state": state, "sr": sr})
+        context = x[:, -CONTEXT:]
+        expected.append(out[0, 0])
+    probabilities, final_state, final_context = sequence.run(None, {
+        "windows": audio.reshape(windows, 1, WINDOW),
+        "state": np.zeros((2, 1, 128), dtype=np.float32),
+        "context": np.zeros((1, CONTEXT), dtype=np.float32),
+        "sr": sr,
+    })
+    if not (np.array_equal(probabilities[:, 0, 0], np.array(expected, dtype=np.float32))
+            and np.array_equal(final_state, state) and np.array_equal(final_context, context)):
+        raise AssertionError("the sequence model differs from the window model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", type=Path, default=MODELS / "silero_vad.onnx")
+    parser.add_argument("--target", type=Path, default=MODELS / "silero_vad_sequence.onnx")
+    args = parser.parse_args()
+
+    import onnx
+
+    onnx.save(build(args.source), args.target)
+    check(args.source, args.target)
+    print(f"{args.target}: identical to {args.source.name} evaluated window by window")
+
+
+if __name__ == "__main__":
+    main()
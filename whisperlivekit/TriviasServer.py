@@ -10,6 +10,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
 
 from whisperlivekit import AudioProcessor, TranscriptionEngine, parse_args
+from whisperlivekit.results_protocol import PROTOCOLS, ResultsEncoder, parse_client_config
 
 from whisperlivekit.web_trivias.web_interface import get_inline_ui_html
 
@@ -76,6 +77,9 @@ class SessionManager:
 
 session_manager = SessionManager()
 
+# AudioProcessors van de open websockets, voor /metrics en load shedding
+active_processors: Dict[str, AudioProcessor] = {}
+
 # ====== Shared transcription engine ======
 transcription_engine: Optional[TranscriptionEngine] = None
 
@@ -114,16 +118,30 @@ app.add_middleware(
 
 @app.get("/health")
 async def health():
-    """Eenvoudige healthcheck voor monitoring en debugging."""
+    """Healthcheck voor monitoring: status en laadtijd van elk model (zie --background-loading)."""
+    readiness = (
+        transcription_engine.readiness() if transcription_engine is not None
+        else {"status": "starting", "ready": False, "components": {}}
+    )
     return JSONResponse(
         {
-            "status": "ok",
+            "status": readiness["status"],
             "model": getattr(args, "model", None),
             "language": getattr(args, "language", None),
             "pcm_input": bool(getattr(args, "pcm_input", False)),
+            "components": readiness["components"],
         }
     )
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 zodra sessies kunnen starten (VAC en transcriptie geladen), anders 503."""
+    if transcription_engine is None:
+        return JSONResponse({"status": "starting", "ready": False, "components": {}}, status_code=503)
+    readiness = transcription_engine.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve de inline Trivias STT webinterface."""
@@ -135,6 +153,22 @@ async def list_sessions():
     return JSONResponse({"sessions": session_manager.all()})
 
 
+@app.get("/metrics")
+async def metrics():
+    """Verwerkingsqueues (diepte, lag, gedropte audio) per open sessie."""
+    return JSONResponse({
+        "sessions": len(active_processors),
+        "queues": {sid: audio_processor.queue_metrics() for sid, audio_processor in active_processors.items()},
+    })
+
+
+def overloaded() -> bool:
+    """True zodra een sessie langer dan --shed-load-lag seconden op transcriptie wacht."""
+    return args.shed_load_lag > 0 and any(
+        audio_processor.processing_lag() > args.shed_load_lag for audio_processor in active_processors.values()
+    )
+
+
 @app.get("/sessions/{session_id}")
 async def get_session(session_id: str):
     meta = session_manager.get(session_id)
@@ -144,14 +178,14 @@ async def get_session(session_id: str):
 
 
 # ====== WebSocket result handler ======
-async def handle_websocket_results(websocket: WebSocket, results_generator):
+async def handle_websocket_results(websocket: WebSocket, results_generator, encoder: ResultsEncoder):
     """Consumes results from the audio processor and sends them via WebSocket."""
     try:
         async for response in results_generator:
-            # WhisperLiveKit geeft een object met .to_dict()
-            await websocket.send_json(response.to_dict())
+            # WhisperLiveKit geeft een FrontData, geserialiseerd in het protocol van de client
+            await websocket.send_text(encoder.encode(response))
         logger.info("Results generator finished. Sending 'ready_to_stop' to client.")
-        await websocket.send_json({"type": "ready_to_stop"})
+        await websocket.send_text(encoder.encode_message({"type": "ready_to_stop"}))
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected while handling results (client closed connection?).")
     except Exception as e:
@@ -178,6 +212,20 @@ async def websocket_endpoint(
         await websocket.close(code=1011)
         return
 
+    if overloaded():
+        # load shedding: de lopende sessies lopen al achter
+        await websocket.accept()
+        logger.warning(f"Transcription lags more than {args.shed_load_lag}s: refusing the session.")
+        await websocket.close(code=1013, reason="Server overloaded, try again later")
+        return
+
+    if not transcription_engine.streaming_ready.is_set():
+        # --background-loading: de modellen worden nog geladen
+        await websocket.accept()
+        logger.warning("Models are still loading: refusing the session.")
+        await websocket.close(code=1013, reason="Server starting, try again later")
+        return
+
     # Sessiesleutel bepalen
     sid = session_id or str(uuid.uuid4())
     session_meta = session_manager.create_or_update(
@@ -188,24 +236,41 @@ async def websocket_endpoint(
     )
 
     audio_processor = AudioProcessor(transcription_engine=transcription_engine)
+    active_processors[sid] = audio_processor
 
     await websocket.accept()
     logger.info(f"WebSocket connection opened for session {sid}.")
 
     # Config naar client sturen (zelfde semantics als basic_server)
+    encoder = ResultsEncoder()
     try:
-        await websocket.send_json({"type": "config", "useAudioWorklet": bool(args.pcm_input)})
+        await websocket.send_text(encoder.encode_message(
+            {"type": "config", "useAudioWorklet": bool(args.pcm_input), "protocols": list(PROTOCOLS)}
+        ))
     except Exception as e:
         logger.warning(f"Failed to send config to client: {e}")
 
     results_generator = await audio_processor.create_tasks()
-    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator))
+    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator, encoder))
 
     try:
         while True:
-            message = await websocket.receive_bytes()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("text") is not None:
+                # de client kiest het resultaatprotocol met een config-bericht
+                try:
+                    protocol = parse_client_config(message["text"])
+                except ValueError as e:
+                    logger.warning(str(e))
+                    continue
+                if protocol is not None:
+                    encoder.set_protocol(protocol)
+                    await websocket.send_text(encoder.encode_message({"type": "config", "protocol": protocol}))
+                continue
             # Hier kun je later per kanaal/session extra metadata koppelen
-            await audio_processor.process_audio(message)
+            await audio_processor.process_audio(message.get("bytes"))
     except KeyError as e:
         if "bytes" in str(e):
             logger.warning("Client has closed the connection (KeyError on 'bytes').")
@@ -225,6 +290,10 @@ async def websocket_endpoint(
             logger.info("WebSocket results handler task was cancelled.")
         except Exception as e:
             logger.warning(f"Exception while awaiting websocket_task completion: {e}")
+        logger.info(f"Results sent for session {sid}: {encoder.summary()}")
+        logger.info(f"Processing queues for session {sid}: {audio_processor.queue_metrics()}")
+        if active_processors.get(sid) is audio_processor:
+            del active_processors[sid]
         await audio_processor.cleanup()
         logger.info(f"WebSocket endpoint cleaned up successfully for session {sid}.")
 
@@ -7,19 +7,28 @@ import uuid
 import os
 import wave
 from pathlib import Path
+from argparse import Namespace
 from datetime import datetime
 
 from time import time
-from typing import Any, AsyncGenerator, List, Optional, Union
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
 
 import numpy as np
 from types import SimpleNamespace   
 
+from whisperlivekit.backpressure import SENTINEL, StageQueue
 from whisperlivekit.core import (TranscriptionEngine,
                                  online_diarization_factory, online_factory,
                                  online_translation_factory)
 from whisperlivekit.ffmpeg_manager import FFmpegManager, FFmpegState
-from whisperlivekit.silero_vad_iterator import FixedVADIterator, OnnxWrapper, load_jit_vad
+from whisperlivekit.inference_executor import InferenceExecutor
+from whisperlivekit.model_workers import RemoteTranscription
+from whisperlivekit.pcm_buffer import PCMRingBuffer, pcm_to_float
+from whisperlivekit.pyav_decoder import PyAVDecoder
+from whisperlivekit.silero_vad_iterator import (BatchedVADIterator,
+                                                FixedVADIterator,
+                                                OnnxSequenceWrapper,
+                                                OnnxWrapper, load_jit_vad)
 from whisperlivekit.timed_objects import (ASRToken, ChangeSpeaker, FrontData,
                                           Segment, Silence, State, Transcript)
 from whisperlivekit.tokens_alignment import TokensAlignment
@@ -28,37 +37,13 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-SENTINEL = object() # unique sentinel object for end of stream marker
 MIN_DURATION_REAL_SILENCE = 5
 
 # Vanaf hoeveel seconden stilte we de decoder (AlignAtt) resetten
 SILENCE_RESET_THRESHOLD = 3.0  # kun je later tweaken (2–5s)
 
-async def get_all_from_queue(queue: asyncio.Queue) -> Union[object, Silence, np.ndarray, List[Any]]:
-    items: List[Any] = []
-
-    first_item = await queue.get()
-    queue.task_done()
-    if first_item is SENTINEL:
-        return first_item
-    if isinstance(first_item, Silence):
-        return first_item
-    items.append(first_item)
-    
-    while True:
-        if not queue._queue:
-            break
-        next_item = queue._queue[0]
-        if next_item is SENTINEL:
-            break
-        if isinstance(next_item, Silence):
-            break
-        items.append(await queue.get())
-        queue.task_done()
-    if isinstance(items[0], np.ndarray):
-        return np.concatenate(items)
-    else: #translation
-        return items
+# refresh of the results without event while they follow the clock (open silence, lagging transcription)
+RESULTS_REFRESH_INTERVAL = 1.0
 
 class AudioProcessor:
     """
@@ -80,13 +65,23 @@ class AudioProcessor:
 
         # Audio processing settings
         self.args = models.args
-        self.batch_asr = getattr(models, "batch_asr", None)
+        self.engine = models
+        # --background-loading: a model still loading is left out of this session
+        missing = {}
+        if self.args.diarization and models.diarization_model is None:
+            missing["diarization"] = False
+        if self.args.target_language and models.translation_model is None:
+            missing["target_language"] = ""
+        if missing:
+            logger.warning(f"Model not loaded (still loading or failed), the session runs without: {', '.join(missing)}")
+            self.args = Namespace(**{**vars(self.args), **missing})
         self.sample_rate = 16000
         self.channels = 1
         self.samples_per_sec = int(self.sample_rate * self.args.min_chunk_size)
         self.bytes_per_sample = 2
         self.bytes_per_sec = self.samples_per_sec * self.bytes_per_sample
         self.max_bytes_per_sec = 32000 * 5  # 5 seconds of audio at 32 kHz
+        self.max_samples_per_chunk = self.max_bytes_per_sec // self.bytes_per_sample
         self.is_pcm_input = self.args.pcm_input
 
         # State management
@@ -96,38 +91,52 @@ class AudioProcessor:
         self.lock: asyncio.Lock = asyncio.Lock()
         self.sep: str = " "  # Default separator
         self.last_response_content: FrontData = FrontData()
+        # set whenever something shown to the client changed, awaited by results_formatter
+        self.results_changed: asyncio.Event = asyncio.Event()
+        self.results_min_interval: float = self.args.results_min_interval
+        # model calls running for this session (see run_inference)
+        self.model_calls_in_flight: int = 0
 
         self.tokens_alignment: TokensAlignment = TokensAlignment(self.state, self.args, self.sep)
         self.beg_loop: Optional[float] = None
 
         # Models and processing
         self.asr: Any = models.asr
+        self.inference_executor: Optional[InferenceExecutor] = models.inference_executor
+        self.inference_session: Optional[int] = (
+            self.inference_executor.register() if self.inference_executor else None
+        )
         self.vac: Optional[FixedVADIterator] = None
         
         if self.args.vac:
-            if models.vac_session is not None:
-                vac_model = OnnxWrapper(session=models.vac_session)
-                self.vac = FixedVADIterator(vac_model)
+            if models.vad_service is not None:
+                self.vac = BatchedVADIterator(models.vad_service.register(), gate=models.vad_gate)
+            elif models.vac_session is not None:
+                if models.vac_session.sequence:
+                    vac_model = OnnxSequenceWrapper(models.vac_session)
+                else:
+                    vac_model = OnnxWrapper(session=models.vac_session)
+                self.vac = FixedVADIterator(vac_model, gate=models.vad_gate)
             else:
-                self.vac = FixedVADIterator(load_jit_vad())    
-        self.ffmpeg_manager: Optional[FFmpegManager] = None
+                self.vac = FixedVADIterator(load_jit_vad(), gate=models.vad_gate)
+        # FFmpegManager, or PyAVDecoder with --audio-decoder pyav (same interface)
+        self.ffmpeg_manager: Optional[Union[FFmpegManager, PyAVDecoder]] = None
         self.ffmpeg_reader_task: Optional[asyncio.Task] = None
         self._ffmpeg_error: Optional[str] = None
 
         if not self.is_pcm_input:
-            self.ffmpeg_manager = FFmpegManager(
+            decoder_class = PyAVDecoder if self.args.audio_decoder == "pyav" else FFmpegManager
+            self.ffmpeg_manager = decoder_class(
                 sample_rate=self.sample_rate,
                 channels=self.channels
             )
             async def handle_ffmpeg_error(error_type: str):
                 logger.error(f"FFmpeg error: {error_type}")
                 self._ffmpeg_error = error_type
+                self.results_changed.set()
             self.ffmpeg_manager.on_error_callback = handle_ffmpeg_error
              
-        self.transcription_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.transcription else None
-        self.diarization_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.diarization else None
-        self.translation_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.target_language else None
-        self.pcm_buffer: bytearray = bytearray()
+        self.pcm_buffer: PCMRingBuffer = PCMRingBuffer(2 * self.samples_per_sec)
         self.total_pcm_samples: int = 0
         self.transcription_task: Optional[asyncio.Task] = None
         self.diarization_task: Optional[asyncio.Task] = None
@@ -139,7 +148,10 @@ class AudioProcessor:
         self.translation: Optional[Any] = None
         self.diarization: Optional[Any] = None
 
-        if self.args.transcription:
+        if self.args.transcription and models.worker_pool is not None:
+            self.transcription = models.worker_pool.open_session()
+            self.sep = self.transcription.asr.sep
+        elif self.args.transcription:
             self.transcription = online_factory(self.args, models.asr)        
             self.sep = self.transcription.asr.sep   
         if self.args.diarization:
@@ -147,6 +159,19 @@ class AudioProcessor:
         if models.translation_model:
             self.translation = online_translation_factory(self.args, models.translation_model)
 
+        # bounded in seconds of audio, see StageQueue for the policies
+        max_queue_seconds = self.args.max_queue_seconds
+        self.transcription_queue: Optional[StageQueue] = StageQueue(
+            "transcription", max_queue_seconds, self.args.transcription_queue_policy, self.sample_rate,
+            on_pressure=getattr(self.transcription, "set_degraded", None),
+        ) if self.args.transcription else None
+        self.diarization_queue: Optional[StageQueue] = StageQueue(
+            "diarization", max_queue_seconds, self.args.diarization_queue_policy, self.sample_rate,
+        ) if self.args.diarization else None
+        self.translation_queue: Optional[StageQueue] = StageQueue(
+            "translation", max_queue_seconds, self.args.translation_queue_policy, self.sample_rate,
+        ) if self.args.target_language else None
+
         # ====== Session WAV recording (1 file per session) ======
         self.session_id: str = str(kwargs.get("session_id") or uuid.uuid4())
         self.recordings_dir: Path = Path(kwargs.get("recordings_dir") or "recordings")
@@ -157,6 +182,7 @@ class AudioProcessor:
 
 
     async def _push_silence_event(self) -> None:
+        self.results_changed.set()
         if self.transcription_queue:
             await self.transcription_queue.put(self.current_silence)
         if self.args.diarization and self.diarization_queue:
@@ -187,12 +213,13 @@ class AudioProcessor:
         self.current_silence = None
 
     async def _enqueue_active_audio(self, pcm_chunk: np.ndarray) -> None:
+        # the chunk is read-only: transcription and diarization share it
         if pcm_chunk is None or pcm_chunk.size == 0:
             return
         if self.transcription_queue:
-            await self.transcription_queue.put(pcm_chunk.copy())
+            await self.transcription_queue.put(pcm_chunk)
         if self.args.diarization and self.diarization_queue:
-            await self.diarization_queue.put(pcm_chunk.copy())
+            await self.diarization_queue.put(pcm_chunk)
 
     def _slice_before_silence(self, pcm_array: np.ndarray, chunk_sample_start: int, silence_sample: Optional[int]) -> Optional[np.ndarray]:
         if silence_sample is None:
@@ -205,9 +232,25 @@ class AudioProcessor:
             return None
         return pcm_array[:split_index]
 
-    def convert_pcm_to_float(self, pcm_buffer: Union[bytes, bytearray]) -> np.ndarray:
-        """Convert PCM buffer in s16le format to normalized NumPy array."""
-        return np.frombuffer(pcm_buffer, dtype=np.int16).astype(np.float32) / 32768.0
+    async def run_inference(self, fn: Any, *args: Any) -> Any:
+        """Run a blocking model call on the engine's inference executor, or the default thread pool."""
+        self.model_calls_in_flight += 1
+        try:
+            remote = getattr(fn, "__self__", None)
+            if isinstance(remote, RemoteTranscription):
+                # runs in a model worker process, no thread to hold while waiting
+                return await asyncio.wrap_future(remote.submit(fn.__name__, *args))
+            if self.inference_executor is not None:
+                return await self.inference_executor.run(self.inference_session, fn, *args)
+            return await asyncio.to_thread(fn, *args)
+        finally:
+            self.model_calls_in_flight -= 1
+
+    def convert_pcm_to_float(self, pcm_buffer: Union[bytes, bytearray, np.ndarray]) -> np.ndarray:
+        """Convert PCM buffer in s16le format (or int16 samples) to normalized NumPy array."""
+        if not isinstance(pcm_buffer, np.ndarray):
+            pcm_buffer = np.frombuffer(pcm_buffer, dtype=np.int16)
+        return pcm_to_float(pcm_buffer)
             
     async def get_current_state(self) -> State:
         """Get current state."""
@@ -264,7 +307,7 @@ class AudioProcessor:
                     await asyncio.sleep(0.05)
                     continue
 
-                self.pcm_buffer.extend(chunk)
+                self.pcm_buffer.write(chunk)
                 await self.handle_pcm_data()
 
             except asyncio.CancelledError:
@@ -289,8 +332,7 @@ class AudioProcessor:
         
         while True:
             try:
-                # item = await self.transcription_queue.get()
-                item = await get_all_from_queue(self.transcription_queue)
+                item = await self.transcription_queue.get_all()
                 if item is SENTINEL:
                     logger.debug("Transcription processor received sentinel. Finishing.")
                     break
@@ -305,7 +347,7 @@ class AudioProcessor:
                 if isinstance(item, Silence):
                     if item.is_starting:
                         # Begin van stilte → ASR informeren
-                        new_tokens, current_audio_processed_upto = await asyncio.to_thread(
+                        new_tokens, current_audio_processed_upto = await self.run_inference(
                             self.transcription.start_silence
                         )
                         asr_processing_logs += f" + Silence starting"
@@ -373,7 +415,7 @@ class AudioProcessor:
                     cumulative_pcm_duration_stream_time += len(pcm_array) / self.sample_rate
                     stream_time_end_of_current_pcm = cumulative_pcm_duration_stream_time
                     self.transcription.insert_audio_chunk(pcm_array, stream_time_end_of_current_pcm)
-                    new_tokens, current_audio_processed_upto = await asyncio.to_thread(self.transcription.process_iter)
+                    new_tokens, current_audio_processed_upto = await self.run_inference(self.transcription.process_iter)
                     new_tokens = new_tokens or []
 
                 _buffer_transcript = self.transcription.get_buffer()
@@ -400,6 +442,7 @@ class AudioProcessor:
                     self.state.end_buffer = max(candidate_end_times)
                     self.state.new_tokens.extend(new_tokens)
                     self.state.new_tokens_buffer = _buffer_transcript
+                self.results_changed.set()
 
                 if self.translation_queue:
                     for token in new_tokens:
@@ -407,8 +450,6 @@ class AudioProcessor:
             except Exception as e:
                 logger.warning(f"Exception in transcription_processor: {e}")
                 logger.warning(f"Traceback: {traceback.format_exc()}")
-                if 'pcm_array' in locals() and pcm_array is not SENTINEL : # Check if pcm_array was assigned from queue
-                    self.transcription_queue.task_done()
         
         if self.is_stopping:
             logger.info("Transcription processor finishing due to stopping flag.")
@@ -423,7 +464,7 @@ class AudioProcessor:
     async def diarization_processor(self) -> None:
         while True:
             try:
-                item = await get_all_from_queue(self.diarization_queue)
+                item = await self.diarization_queue.get_all()
                 if item is SENTINEL:
                     break
                 elif type(item) is Silence:
@@ -434,6 +475,7 @@ class AudioProcessor:
                 self.diarization.insert_audio_chunk(item)
                 diarization_segments = await self.diarization.diarize()
                 self.state.new_diarization = diarization_segments
+                self.results_changed.set()
                 
             except Exception as e:
                 logger.warning(f"Exception in diarization_processor: {e}")
@@ -446,7 +488,7 @@ class AudioProcessor:
         # in the future we want to have different languages for each speaker etc, so it will be more complex.
         while True:
             try:
-                item = await get_all_from_queue(self.translation_queue)
+                item = await self.translation_queue.get_all()
                 if item is SENTINEL:
                     logger.debug("Translation processor received sentinel. Finishing.")
                     break
@@ -461,23 +503,69 @@ class AudioProcessor:
                     pass
                 else:
                     self.translation.insert_tokens(item)
-                    new_translation, new_translation_buffer = await asyncio.to_thread(self.translation.process)
+                    new_translation, new_translation_buffer = await self.run_inference(self.translation.process)
                 async with self.lock:
                     self.state.new_translation.append(new_translation)
                     self.state.new_translation_buffer = new_translation_buffer
+                self.results_changed.set()
             except Exception as e:
                 logger.warning(f"Exception in translation_processor: {e}")
                 logger.warning(f"Traceback: {traceback.format_exc()}")
         logger.info("Translation processor task finished.")
 
+    def _results_follow_clock(self) -> bool:
+        """
+        Whether the results change without any event: the end of an open silence and the
+        remaining time of a transcription lagging behind the audio follow the clock.
+        """
+        if self.current_silence is not None:
+            return True
+        return (
+            bool(self.beg_loop) and self.state.end_buffer > 0
+            and time() - self.beg_loop - self.state.end_buffer > RESULTS_REFRESH_INTERVAL
+        )
+
+    async def _wait_results_changed(self) -> None:
+        """
+        Wait for `results_changed`, or for the results to follow the clock. Once audio
+        has arrived or a model call runs, the wait is cut every `RESULTS_REFRESH_INTERVAL`
+        seconds to check that again: a lag can start during the wait, without any event.
+        """
+        while not self.results_changed.is_set():
+            if not self.beg_loop and not self.model_calls_in_flight:
+                # nothing received yet: only an event can change the results
+                await self.results_changed.wait()
+                return
+            try:
+                await asyncio.wait_for(self.results_changed.wait(), timeout=RESULTS_REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                if self._results_follow_clock():
+                    return
+
     async def results_formatter(self) -> AsyncGenerator[FrontData, None]:
-        """Format processing results for output."""
+        """
+        Format processing results for output, when the processors signal a change
+        (`results_changed`). The changes of a burst are coalesced: the results are
+        formatted at most once every `results_min_interval` seconds. While a silence is
+        open or the transcription lags behind, they are also refreshed every
+        `RESULTS_REFRESH_INTERVAL` seconds without event (`_wait_results_changed`).
+        """
+        loop = asyncio.get_running_loop()
+        last_formatted = 0.0
         while True:
             try:
+                await self._wait_results_changed()
+                delay = last_formatted + self.results_min_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.results_changed.clear()
+                last_formatted = loop.time()
+
                 if self._ffmpeg_error:
                     yield FrontData(status="error", error=f"FFmpeg error: {self._ffmpeg_error}")
                     self._ffmpeg_error = None
                     await asyncio.sleep(1)
+                    self.results_changed.set()
                     continue
 
                 self.tokens_alignment.update()
@@ -513,11 +601,10 @@ class AudioProcessor:
                     logger.info("Results formatter: All upstream processors are done and in stopping state. Terminating.")
                     return
                 
-                await asyncio.sleep(0.05)
-                
             except Exception as e:
                 logger.warning(f"Exception in results_formatter. Traceback: {traceback.format_exc()}")
                 await asyncio.sleep(0.5)
+                self.results_changed.set()
         
     async def create_tasks(self) -> AsyncGenerator[FrontData, None]:
         """Create and start processing tasks."""
@@ -529,10 +616,11 @@ class AudioProcessor:
             success = await self.ffmpeg_manager.start()
             if not success:
                 logger.error("Failed to start FFmpeg manager")
+                decoder = "PyAV" if isinstance(self.ffmpeg_manager, PyAVDecoder) else "FFmpeg"
                 async def error_generator() -> AsyncGenerator[FrontData, None]:
                     yield FrontData(
                         status="error",
-                        error="FFmpeg failed to start. Please check that FFmpeg is installed."
+                        error=f"{decoder} failed to start. Please check that {decoder} is installed."
                     )
                 return error_generator()
             self.ffmpeg_reader_task = asyncio.create_task(self.ffmpeg_stdout_reader())
@@ -554,6 +642,12 @@ class AudioProcessor:
             self.all_tasks_for_cleanup.append(self.translation_task)
             processing_tasks_for_watchdog.append(self.translation_task)
         
+        # the results formatter checks whether it can terminate when a processor finishes
+        for task in processing_tasks_for_watchdog:
+            task.add_done_callback(lambda _: self.results_changed.set())
+        # first status sent as soon as the session starts
+        self.results_changed.set()
+
         # Monitor overall system health
         self.watchdog_task = asyncio.create_task(self.watchdog(processing_tasks_for_watchdog))
         self.all_tasks_for_cleanup.append(self.watchdog_task)
@@ -655,6 +749,11 @@ class AudioProcessor:
             logger.warning(f"[BATCH] WAV slice read failed: {e}")
             return None
 
+    @property
+    def batch_asr(self) -> Any:
+        # looked up at use, so that a batch model loaded after the session started is used
+        return self.engine.batch_asr
+
     def _batch_transcribe_text(self, audio_f32: np.ndarray) -> Optional[str]:
         try:
             if not self.batch_asr:
@@ -686,6 +785,13 @@ class AudioProcessor:
                 logger.warning(f"Error stopping FFmpeg manager: {e}")
         if self.diarization:
             self.diarization.close()
+        if self.transcription and hasattr(self.transcription, "close"):
+            self.transcription.close()
+        if self.inference_executor is not None and self.inference_session is not None:
+            self.inference_executor.release(self.inference_session)
+            self.inference_session = None
+        if isinstance(self.vac, BatchedVADIterator):
+            self.vac.close()
             
         # Stop batch worker netjes
         try:
@@ -697,6 +803,30 @@ class AudioProcessor:
         self._close_wav()    
         logger.info("AudioProcessor cleanup complete.")
 
+    def queue_metrics(self) -> Dict[str, Any]:
+        """Depth, lag and load-shedding counters of the processing queues, the inference and VAD batch waits, the windows skipped by the VAC gate and the model worker."""
+        metrics: Dict[str, Any] = {
+            name: queue.metrics()
+            for name, queue in (
+                ("transcription", self.transcription_queue),
+                ("diarization", self.diarization_queue),
+                ("translation", self.translation_queue),
+            )
+            if queue is not None
+        }
+        if self.inference_executor is not None and self.inference_session is not None:
+            metrics["inference"] = self.inference_executor.metrics(self.inference_session)
+        vad_metrics = self.vac.metrics() if self.vac is not None else {}
+        if vad_metrics:
+            metrics["vad"] = vad_metrics
+        if isinstance(self.transcription, RemoteTranscription):
+            metrics["model_worker"] = self.transcription.worker.index
+        return metrics
+
+    def processing_lag(self) -> float:
+        """Seconds the oldest audio waiting for transcription has been queued."""
+        return self.transcription_queue.lag_seconds() if self.transcription_queue else 0.0
+
     def _processing_tasks_done(self) -> bool:
         """Return True when all active processing tasks have completed."""
         tasks_to_check = [
@@ -719,6 +849,7 @@ class AudioProcessor:
         if not message:
             logger.info("Empty audio message received, initiating stop sequence.")
             self.is_stopping = True
+            self.results_changed.set()
            
             # NEW: close session WAV immediately on stop
             self._close_wav()
@@ -736,7 +867,7 @@ class AudioProcessor:
             return
 
         if self.is_pcm_input:
-            self.pcm_buffer.extend(message)
+            self.pcm_buffer.write(message)
             await self.handle_pcm_data()
         else:
             if not self.ffmpeg_manager:
@@ -752,29 +883,28 @@ class AudioProcessor:
 
     async def handle_pcm_data(self) -> None:
         # Process when enough data
-        if len(self.pcm_buffer) < self.bytes_per_sec:
+        if len(self.pcm_buffer) < self.samples_per_sec:
             return
 
-        if len(self.pcm_buffer) > self.max_bytes_per_sec:
+        if len(self.pcm_buffer) > self.max_samples_per_chunk:
             logger.warning(
-                f"Audio buffer too large: {len(self.pcm_buffer) / self.bytes_per_sec:.2f}s. "
+                f"Audio buffer too large: {len(self.pcm_buffer) / self.samples_per_sec:.2f}s. "
                 f"Consider using a smaller model."
             )
 
-        chunk_size = min(len(self.pcm_buffer), self.max_bytes_per_sec)
-        aligned_chunk_size = (chunk_size // self.bytes_per_sample) * self.bytes_per_sample
-        
-        if aligned_chunk_size == 0:
+        # int16 view of the ring buffer, valid until the next write
+        raw_pcm = self.pcm_buffer.read(min(len(self.pcm_buffer), self.max_samples_per_chunk))
+        if raw_pcm.size == 0:
             return
-        raw_pcm = bytes(self.pcm_buffer[:aligned_chunk_size])
 
         # Session WAV opnemen (bronbestand)
         self._ensure_wav_open()
         if self._wav_writer is not None:
             self._wav_writer.writeframes(raw_pcm)
 
+        # the only copy of the chunk: shared read-only by the VAC and the downstream queues
         pcm_array = self.convert_pcm_to_float(raw_pcm)
-        self.pcm_buffer = self.pcm_buffer[aligned_chunk_size:]
+        pcm_array.flags.writeable = False
 
 
         num_samples = len(pcm_array)
@@ -782,7 +912,9 @@ class AudioProcessor:
         chunk_sample_end = chunk_sample_start + num_samples
 
         res = None
-        if self.args.vac:
+        if isinstance(self.vac, BatchedVADIterator):
+            res = await self.vac.process(pcm_array)
+        elif self.args.vac:
             res = self.vac(pcm_array)
 
         if res is not None:
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from collections import deque
+from time import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from whisperlivekit.timed_objects import Silence, TimedText
+
+logger = logging.getLogger(__name__)
+
+SENTINEL = object() # unique sentinel object for end of stream marker
+
+BLOCK = "block"
+DROP = "drop"
+LATEST = "latest"
+DEGRADE = "degrade"
+QUEUE_POLICIES = (BLOCK, DROP, LATEST, DEGRADE)
+
+
+def item_seconds(item: Any, sample_rate: int) -> float:
+    """Seconds of audio held by a queued item: audio chunks and transcribed tokens count, markers do not."""
+    if isinstance(item, np.ndarray):
+        return len(item) / sample_rate
+    if isinstance(item, TimedText) and item.start is not None and item.end is not None:
+        return max(0.0, item.end - item.start)
+    return 0.0
+
+
+class StageQueue:
+    """
+    Queue between `AudioProcessor` and one of its processors (transcription,
+    diarization, translation), bounded in seconds of audio (`max_seconds`, 0 for no
+    bound). What happens when an item would exceed the bound depends on `policy`:
+
+    - `block`: `put()` waits until the processor has consumed enough. For the audio
+      queues, this suspends `handle_pcm_data` and so the websocket reader.
+    - `drop`: the new item is dropped.
+    - `latest`: the oldest items are dropped, the queue keeps the most recent audio.
+    - `degrade`: `on_pressure(True)` is called, and `on_pressure(False)` once the
+      processor finds less than half the bound queued when it asks for more audio.
+      The queue blocks at twice the bound.
+
+    Dropped audio chunks are replaced by an ended `Silence` of the same duration, so
+    that the processors keep their stream time aligned with the audio. Markers
+    (silences, speaker changes, the sentinel) are never dropped and never wait.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_seconds: float = 0.0,
+        policy: str = BLOCK,
+        sample_rate: int = 16000,
+        on_pressure: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {', '.join(QUEUE_POLICIES)}")
+        if policy == DEGRADE and on_pressure is None:
+            logger.warning(f"{name} queue: nothing to degrade, using the '{BLOCK}' policy.")
+            policy = BLOCK
+        self.name = name
+        self.max_seconds = max_seconds
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.on_pressure = on_pressure
+
+        # (item, seconds of audio, time it was queued)
+        self._items: Deque[Tuple[Any, float, float]] = deque()
+        self._seconds = 0.0
+        # ids of the silences standing for dropped audio
+        self._gaps: Set[int] = set()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+        self.degraded = False
+        self.max_depth_seconds = 0.0
+        self.dropped_seconds = 0.0
+        self.dropped_items = 0
+        self.blocked_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        # an empty queue is still a queue (`if self.transcription_queue:`)
+        return True
+
+    @property
+    def depth_seconds(self) -> float:
+        return self._seconds
+
+    def lag_seconds(self) -> float:
+        """Time the oldest queued item has been waiting."""
+        return time() - self._items[0][2] if self._items else 0.0
+
+    def _limit(self) -> float:
+        return 2 * self.max_seconds if self.policy == DEGRADE else self.max_seconds
+
+    def _exceeds(self, seconds: float, limit: float) -> bool:
+        # a single item larger than the bound is accepted in an empty queue
+        return self._seconds > 0 and self._seconds + seconds > limit
+
+    def _drop(self, item: Any, seconds: float, queued_at: float, index: int) -> None:
+        """Count a dropped item; an audio chunk leaves a gap at `index`, merged with a gap just before."""
+        self.dropped_seconds += seconds
+        self.dropped_items += 1
+        if not isinstance(item, np.ndarray):
+            return
+        if index > 0 and id(self._items[index - 1][0]) in self._gaps:
+            self._items[index - 1][0].duration += seconds
+            return
+        gap = Silence(duration=seconds, has_ended=True)
+        self._gaps.add(id(gap))
+        self._items.insert(index, (gap, 0.0, queued_at))
+        self._not_empty.set()
+
+    def _update_pressure(self) -> None:
+        if self.policy != DEGRADE:
+            return
+        if not self.degraded and self._seconds > self.max_seconds:
+            self.degraded = True
+            logger.warning(f"{self.name} queue holds {self._seconds:.1f}s of audio: degrading.")
+            self.on_pressure(True)
+        elif self.degraded and self._seconds < self.max_seconds / 2:
+            self.degraded = False
+            logger.info(f"{self.name} queue caught up ({self._seconds:.1f}s of audio): back to normal.")
+            self.on_pressure(False)
+
+    async def put(self, item: Any) -> None:
+        seconds = item_seconds(item, self.sample_rate)
+        if seconds and self.max_seconds > 0:
+            if self.policy in (BLOCK, DEGRADE):
+                beg = None
+                while self._exceeds(seconds, self._limit()):
+                    if beg is None:
+                        beg = time()
+                    self._not_full.clear()
+                    await self._not_full.wait()
+                if beg is not None:
+                    self.blocked_seconds += time() - beg
+            elif self.policy == DROP:
+                if self._exceeds(seconds, self.max_seconds):
+                    self._drop(item, seconds, time(), len(self._items))
+                    return
+            elif self.policy == LATEST:
+                while self._exceeds(seconds, self.max_seconds):
+                    self._drop_oldest()
+        self._items.append((item, seconds, time()))
+        self._seconds += seconds
+        self.max_depth_seconds = max(self.max_depth_seconds, self._seconds)
+        self._update_pressure()
+        self._not_empty.set()
+
+    def _drop_oldest(self) -> None:
+        """Drop the oldest item holding audio, the markers before it stay in order."""
+        for index, (item, seconds, queued_at) in enumerate(self._items):
+            if seconds:
+                del self._items[index]
+                self._seconds -= seconds
+                self._drop(item, seconds, queued_at, index)
+                return
+        self._seconds = 0.0
+
+    def _pop(self) -> Any:
+        item, seconds, _ = self._items.popleft()
+        self._seconds = max(0.0, self._seconds - seconds) if self._items else 0.0
+        self._gaps.discard(id(item))
+        if not self._items:
+            self._not_empty.clear()
+        return item
+
+    async def get(self) -> Any:
+        while not self._items:
+            await self._not_empty.wait()
+        self._update_pressure()
+        item = self._pop()
+        self._consumed()
+        return item
+
+    async def get_all(self) -> Union[object, Silence, np.ndarray, List[Any]]:
+        """
+        Everything queued up to the next marker: the audio chunks concatenated, the
+        other items (translation tokens) as a list. A silence or the sentinel at the
+        head of the queue is returned alone.
+        """
+        while not self._items:
+            await self._not_empty.wait()
+        # the backlog that built up while the processor was busy
+        self._update_pressure()
+        first_item = self._pop()
+        if first_item is SENTINEL or isinstance(first_item, Silence):
+            self._consumed()
+            return first_item
+        items = [first_item]
+        while self._items:
+            next_item = self._items[0][0]
+            if next_item is SENTINEL or isinstance(next_item, Silence):
+                break
+            items.append(self._pop())
+        self._consumed()
+        if isinstance(items[0], np.ndarray):
+            return np.concatenate(items)
+        else: #translation
+            return items
+
+    def _consumed(self) -> None:
+        self._not_full.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "max_seconds": self.max_seconds,
+            "depth_seconds": round(self._seconds, 3),
+            "depth_items": len(self._items),
+            "lag_seconds": round(self.lag_seconds(), 3),
+            "max_depth_seconds": round(self.max_depth_seconds, 3),
+            "dropped_seconds": round(self.dropped_seconds, 3),
+            "dropped_items": self.dropped_items,
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "degraded": self.degraded,
+        }
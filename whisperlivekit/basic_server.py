@@ -4,10 +4,12 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
 from whisperlivekit import (AudioProcessor, TranscriptionEngine,
                             get_inline_ui_html, parse_args)
+from whisperlivekit.results_protocol import (PROTOCOLS, ResultsEncoder,
+                                             parse_client_config)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logging.getLogger().setLevel(logging.WARNING)
@@ -25,6 +27,8 @@ logger.info("=== END RAW ARGS ===")
 # === END GT DEBUG ===
 
 transcription_engine = None
+# AudioProcessors of the open websockets, for /metrics and load shedding
+active_processors = set()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):    
@@ -48,14 +52,47 @@ async def get():
     return HTMLResponse(get_inline_ui_html())
 
 
-async def handle_websocket_results(websocket, results_generator):
+@app.get("/health")
+async def health():
+    """Status and load time of each component; "starting" while --background-loading loads them."""
+    if transcription_engine is None:
+        return JSONResponse({"status": "starting", "ready": False, "components": {}})
+    return JSONResponse(transcription_engine.readiness())
+
+
+@app.get("/ready")
+async def ready():
+    """200 once sessions can start (VAC and transcription loaded), 503 before."""
+    if transcription_engine is None:
+        return JSONResponse({"status": "starting", "ready": False, "components": {}}, status_code=503)
+    readiness = transcription_engine.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Processing queues of each open session."""
+    return JSONResponse({
+        "sessions": len(active_processors),
+        "queues": [audio_processor.queue_metrics() for audio_processor in active_processors],
+    })
+
+
+def overloaded() -> bool:
+    """True when a session waits more than --shed-load-lag seconds for its transcription."""
+    return args.shed_load_lag > 0 and any(
+        audio_processor.processing_lag() > args.shed_load_lag for audio_processor in active_processors
+    )
+
+
+async def handle_websocket_results(websocket, results_generator, encoder):
     """Consumes results from the audio processor and sends them via WebSocket."""
     try:
         async for response in results_generator:
-            await websocket.send_json(response.to_dict())
+            await websocket.send_text(encoder.encode(response))
         # when the results_generator finishes it means all audio has been processed
         logger.info("Results generator finished. Sending 'ready_to_stop' to client.")
-        await websocket.send_json({"type": "ready_to_stop"})
+        await websocket.send_text(encoder.encode_message({"type": "ready_to_stop"}))
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected while handling results (client likely closed connection).")
     except Exception as e:
@@ -65,24 +102,51 @@ async def handle_websocket_results(websocket, results_generator):
 @app.websocket("/asr")
 async def websocket_endpoint(websocket: WebSocket):
     global transcription_engine
+    if overloaded():
+        await websocket.accept()
+        logger.warning(f"Transcription lags more than {args.shed_load_lag}s: refusing the session.")
+        await websocket.close(code=1013, reason="Server overloaded, try again later")
+        return
+    if not transcription_engine.streaming_ready.is_set():
+        await websocket.accept()
+        logger.warning("Models are still loading: refusing the session.")
+        await websocket.close(code=1013, reason="Server starting, try again later")
+        return
     audio_processor = AudioProcessor(
         transcription_engine=transcription_engine,
     )
+    active_processors.add(audio_processor)
     await websocket.accept()
     logger.info("WebSocket connection opened.")
 
+    encoder = ResultsEncoder()
     try:
-        await websocket.send_json({"type": "config", "useAudioWorklet": bool(args.pcm_input)})
+        await websocket.send_text(encoder.encode_message(
+            {"type": "config", "useAudioWorklet": bool(args.pcm_input), "protocols": list(PROTOCOLS)}
+        ))
     except Exception as e:
         logger.warning(f"Failed to send config to client: {e}")
             
     results_generator = await audio_processor.create_tasks()
-    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator))
+    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator, encoder))
 
     try:
         while True:
-            message = await websocket.receive_bytes()
-            await audio_processor.process_audio(message)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("text") is not None:
+                # the client picks the results protocol with a config message
+                try:
+                    protocol = parse_client_config(message["text"])
+                except ValueError as e:
+                    logger.warning(str(e))
+                    continue
+                if protocol is not None:
+                    encoder.set_protocol(protocol)
+                    await websocket.send_text(encoder.encode_message({"type": "config", "protocol": protocol}))
+                continue
+            await audio_processor.process_audio(message.get("bytes"))
     except KeyError as e:
         if 'bytes' in str(e):
             logger.warning(f"Client has closed the connection.")
@@ -103,6 +167,9 @@ async def websocket_endpoint(websocket: WebSocket):
         except Exception as e:
             logger.warning(f"Exception while awaiting websocket_task completion: {e}")
             
+        logger.info(f"Results sent: {encoder.summary()}")
+        logger.info(f"Processing queues: {audio_processor.queue_metrics()}")
+        active_processors.discard(audio_processor)
         await audio_processor.cleanup()
         logger.info("WebSocket endpoint cleaned up successfully.")
 
@@ -1,11 +1,21 @@
 import logging
+import os
 import sys
+import threading
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Optional
 
+from whisperlivekit.inference_executor import (InferenceExecutor,
+                                                default_intra_op_threads)
 from whisperlivekit.local_agreement.online_asr import OnlineASRProcessor
 from whisperlivekit.local_agreement.whisper_online import backend_factory
 from whisperlivekit.simul_whisper import SimulStreamingASR
 from whisperlivekit.simul_whisper.backend import BatchFasterWhisperASR
+from whisperlivekit.simul_whisper.batch_scheduler import BatchScheduler
+from whisperlivekit.simul_whisper.batched_decoder import BatchedDecoder
 
 
 
@@ -18,6 +28,16 @@ def update_with_kwargs(_dict, kwargs):
 
 logger = logging.getLogger(__name__)
 
+
+def resident_memory_mb() -> Optional[float]:
+    """Resident memory of this process in MB, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
 class TranscriptionEngine:
     _instance = None
     _initialized = False
@@ -39,6 +59,12 @@ class TranscriptionEngine:
             "target_language": "",
             "vac": True,
             "vac_chunk_size": 0.04,
+            "vad_batch_size": 1,
+            "vad_batch_wait": 0.005,
+            "vad_multi_window": False,
+            "vad_gate_db": None,
+            "vad_gate_zcr": 0.25,
+            "vad_gate_hangover": 0.5,
             "log_level": "DEBUG",
             "ssl_certfile": None,
             "ssl_keyfile": None,
@@ -46,6 +72,18 @@ class TranscriptionEngine:
             "transcription": True,
             "vad": True,
             "pcm_input": False,
+            "audio_decoder": "ffmpeg",
+            "results_min_interval": 0.05,
+            "max_queue_seconds": 0.0,
+            "transcription_queue_policy": "block",
+            "diarization_queue_policy": "drop",
+            "translation_queue_policy": "block",
+            "shed_load_lag": 0.0,
+            "inference_workers": 0,
+            "intra_op_threads": 0,
+            "model_workers": 0,
+            "lazy_batch_asr": False,
+            "background_loading": False,
             "disable_punctuation_split" : False,
             "diarization_backend": "sortformer",
             "backend_policy": "simulstreaming",
@@ -81,120 +119,454 @@ class TranscriptionEngine:
         self.tokenizer = None
         self.diarization = None
         self.vac_session = None
-        
-        if self.args.vac:
-            from whisperlivekit.silero_vad_iterator import is_onnx_available
-            
-            if is_onnx_available():
-                from whisperlivekit.silero_vad_iterator import load_onnx_session
-                self.vac_session = load_onnx_session()
+        self.vad_service = None
+        self.vad_gate = None
+        self.encoder_scheduler = None
+        self.decoder_scheduler = None
+        self.inference_executor = None
+        self.worker_pool = None
+        self.batch_asr = None
+        self.diarization_model = None
+        self.translation_model = None
+        # component -> status, load time and memory, see _timed_load
+        self.startup_report = {}
+        # set once VAC and transcription are loaded: sessions can start
+        self.streaming_ready = threading.Event()
+        # set once every component is loaded or failed to
+        self.loading_done = threading.Event()
+        self._startup_beg = perf_counter()
+
+        if self.args.target_language and self.args.lan == 'auto' and self.args.backend_policy != "simulstreaming":
+            raise Exception('Translation cannot be set with language auto when transcription backend is not simulstreaming')
+
+        if not self.args.pcm_input and self.args.audio_decoder == "pyav":
+            from whisperlivekit.pyav_decoder import is_pyav_available
+            if not is_pyav_available():
+                raise ImportError('--audio-decoder pyav requires PyAV: pip install av')
+
+        if self.args.background_loading:
+            self._load_in_background(kwargs, transcription_common_params)
+        else:
+            self._load_vac()
+            self._load_transcription(kwargs, transcription_common_params)
+            self._start_inference_executor()
+            self.streaming_ready.set()
+            self._load_batch_refinement()
+            self._load_diarization(kwargs)
+            self._load_translation(kwargs)
+            self._loading_finished()
+        TranscriptionEngine._initialized = True
+
+    def _load_in_background(self, kwargs, transcription_common_params):
+        """
+        Load the independent components concurrently in threads and return at once.
+        `streaming_ready` is set when VAC and transcription are loaded; batch refinement,
+        diarization and translation join the sessions as their models come in.
+        The loaders run at the same time, so they must not change process-wide state:
+        with --mmap-weights, the Whisper model skips its initialization in the loading
+        thread only (`whisper._uninitialized_model`).
+        """
+        loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="engine-load")
+        vac = loader.submit(self._load_vac)
+        transcription = loader.submit(self._load_transcription, kwargs, transcription_common_params)
+        optional = {
+            "diarization": loader.submit(self._load_diarization, kwargs),
+            "translation": loader.submit(self._load_translation, kwargs),
+        }
+        loader.shutdown(wait=False)
+
+        def finish():
+            try:
+                vac.result()
+                transcription.result()
+                self._start_inference_executor()
+            except Exception:
+                logger.exception("Streaming path failed to load, no session can start")
             else:
-                logger.warning(
-                    "onnxruntime not installed. VAC will use JIT model which is loaded per-session. "
-                    "For multi-user scenarios, install onnxruntime: pip install onnxruntime"
+                self.streaming_ready.set()
+                logger.info("Streaming path ready after %.1fs, accepting sessions", perf_counter() - self._startup_beg)
+                try:
+                    self._load_batch_refinement()
+                except Exception:
+                    logger.exception("Batch refinement failed to load, sessions run without it")
+            for component, future in optional.items():
+                if future.exception() is not None:
+                    logger.error("%s failed to load, sessions run without it: %r", component.capitalize(), future.exception())
+            self._loading_finished()
+
+        threading.Thread(target=finish, name="engine-load-finish", daemon=True).start()
+
+    def _loading_finished(self):
+        self._log_startup(perf_counter() - self._startup_beg)
+        self.loading_done.set()
+
+    def _load_vac(self):
+        if not self.args.vac:
+            return
+        from whisperlivekit.silero_vad_iterator import (EnergyGate,
+                                                        is_onnx_available)
+
+        if self.args.vad_gate_db is not None:
+            self.vad_gate = EnergyGate(
+                threshold_db=self.args.vad_gate_db,
+                max_zcr=self.args.vad_gate_zcr,
+                hangover=round(self.args.vad_gate_hangover * 16000 / 512),
+            )
+            logger.info(
+                "VAC energy gate: Silero skipped below %.0f dBFS (zero-crossing rate < %.2f) after %.2fs",
+                self.args.vad_gate_db,
+                self.args.vad_gate_zcr,
+                self.args.vad_gate_hangover,
+            )
+
+        if is_onnx_available():
+            from whisperlivekit.silero_vad_iterator import (VADBatchService,
+                                                            load_onnx_session)
+            sequence = self.args.vad_multi_window
+            if sequence and self.args.vad_batch_size > 1:
+                # the batch service steps the window graph across sessions
+                logger.warning("--vad-multi-window is ignored with --vad-batch-size > 1")
+                sequence = False
+            with self._timed_load("vac"):
+                self.vac_session = load_onnx_session(sequence=sequence)
+            if self.args.vad_batch_size > 1:
+                self.vad_service = VADBatchService(
+                    self.vac_session,
+                    max_batch_size=self.args.vad_batch_size,
+                    max_wait=self.args.vad_batch_wait,
                 )
-        backend_policy = self.args.backend_policy
-        if self.args.transcription:
+                logger.info(
+                    "Batching VAD windows of up to %d sessions (max wait %.0fms)",
+                    self.args.vad_batch_size,
+                    self.args.vad_batch_wait * 1000,
+                )
+        else:
+            logger.warning(
+                "onnxruntime not installed. VAC will use JIT model which is loaded per-session. "
+                "For multi-user scenarios, install onnxruntime: pip install onnxruntime"
+            )
 
-            self.batch_asr = None      
-            if backend_policy == "simulstreaming":                 
-                simulstreaming_params = {
-                    "disable_fast_encoder": False,
-                    "custom_alignment_heads": None,
-                    "frame_threshold": 25,
-                    "beams": 1,
-                    "decoder_type": None,
-                    "audio_max_len": 20.0,
-                    "audio_min_len": 0.0,
-                    "cif_ckpt_path": None,
-                    "never_fire": False,
-                    "init_prompt": None,
-                    "static_init_prompt": None,
-                    "max_context_tokens": None,
-                }
-                simulstreaming_params = update_with_kwargs(simulstreaming_params, kwargs)
-                
-                self.tokenizer = None        
-                self.asr = SimulStreamingASR(
+    def _load_transcription(self, kwargs, transcription_common_params):
+        if not self.args.transcription:
+            return
+        if self.args.model_workers > 0:
+            with self._timed_load("transcription"):
+                self.worker_pool = self._start_model_workers(kwargs)
+            return
+
+        if self.args.backend_policy == "simulstreaming":
+            simulstreaming_params = {
+                "disable_fast_encoder": False,
+                "custom_alignment_heads": None,
+                "frame_threshold": 25,
+                "beams": 1,
+                "decoder_type": None,
+                "audio_max_len": 20.0,
+                "audio_min_len": 0.0,
+                "cif_ckpt_path": None,
+                "never_fire": False,
+                "init_prompt": None,
+                "static_init_prompt": None,
+                "max_context_tokens": None,
+                "incremental_encoder": False,
+                "encoder_lookahead": 2.0,
+                "encoder_evict_len": 5.0,
+                "dynamic_audio_ctx": False,
+                "audio_ctx_buckets": [5.0, 10.0, 15.0, 20.0, 30.0],
+                "preallocated_kv_cache": False,
+                "persist_prefix_cache": False,
+                "draft_model": None,
+                "draft_tokens": 4,
+                "encoder_batch_size": 1,
+                "encoder_batch_wait": 0.03,
+                "decoder_batch_size": 1,
+                "decoder_batch_wait": 0.005,
+                "mmap_weights": False,
+            }
+            simulstreaming_params = update_with_kwargs(simulstreaming_params, kwargs)
+
+            self.tokenizer = None
+            with self._timed_load("transcription"):
+                asr = SimulStreamingASR(
                     **transcription_common_params,
                     **simulstreaming_params,
                     backend=self.args.backend,
                 )
-                logger.info(
-                    "Using SimulStreaming policy with %s backend",
-                    getattr(self.asr, "encoder_backend", "whisper"),
-                )
+            logger.info(
+                "Using SimulStreaming policy with %s backend",
+                getattr(asr, "encoder_backend", "whisper"),
+            )
 
-                # batch gebruikt dezelfde weights als je encoder/model keuze
-                model_for_batch = self.args.model_path or self.args.model_size
-                self.batch_asr = BatchFasterWhisperASR(
-                    model=model_for_batch,
-                    language=self.args.lan,
-                    beam_size=7,  # hoger dan streaming 
-                    condition_on_previous_text=False,
-                    temperature=[0.0, 0.2],
-                    initial_prompt="Dit is een Nederlands interview. Namen: Eus, Özcan Akyol, Rhodia Maas. Organisatie: IND.",
-                    #best_of=5,
-                    #patience=1.2,
-                    #length_penalty=0.6,
-                    #no_speech_threshold=0.6,
-                    #log_prob_threshold=-1.0,
-                    #compression_ratio_threshold=2.4,
+            if simulstreaming_params["encoder_batch_size"] > 1:
+                if asr.use_full_mlx or asr.mlx_encoder is not None:
+                    logger.warning("Cross-session encoder batching is not available with the MLX encoder, ignoring it.")
+                elif simulstreaming_params["incremental_encoder"]:
+                    logger.warning("Cross-session encoder batching cannot be combined with --incremental-encoder, ignoring it.")
+                else:
+                    self.encoder_scheduler = BatchScheduler(
+                        asr.encode_batch,
+                        max_batch_size=simulstreaming_params["encoder_batch_size"],
+                        max_wait=simulstreaming_params["encoder_batch_wait"],
+                        name="encoder",
+                    )
+                    asr.encoder_scheduler = self.encoder_scheduler
+                    logger.info(
+                        "Batching encoder passes of up to %d sessions (max wait %.0fms)",
+                        self.encoder_scheduler.max_batch_size,
+                        self.encoder_scheduler.max_wait * 1000,
+                    )
 
-                )
-            else:
-                
-                whisperstreaming_params = {
-                    "buffer_trimming": "segment",
-                    "confidence_validation": False,
-                    "buffer_trimming_sec": 15,
-                }
-                whisperstreaming_params = update_with_kwargs(whisperstreaming_params, kwargs)
-                
+            if simulstreaming_params["decoder_batch_size"] > 1:
+                if asr.use_full_mlx:
+                    logger.warning("Cross-session decoder batching is not available with the MLX backend, ignoring it.")
+                else:
+                    self.decoder_scheduler = BatchScheduler(
+                        BatchedDecoder(asr.shared_model.decoder),
+                        max_batch_size=simulstreaming_params["decoder_batch_size"],
+                        max_wait=simulstreaming_params["decoder_batch_wait"],
+                        name="decoder",
+                    )
+                    asr.decoder_scheduler = self.decoder_scheduler
+                    logger.info(
+                        "Batching decoder steps of up to %d sessions (max wait %.0fms)",
+                        self.decoder_scheduler.max_batch_size,
+                        self.decoder_scheduler.max_wait * 1000,
+                    )
+            # published last: sessions only see a fully set up model
+            self.asr = asr
+        else:
+            whisperstreaming_params = {
+                "buffer_trimming": "segment",
+                "confidence_validation": False,
+                "buffer_trimming_sec": 15,
+            }
+            whisperstreaming_params = update_with_kwargs(whisperstreaming_params, kwargs)
+
+            with self._timed_load("transcription"):
                 self.asr = backend_factory(
                     backend=self.args.backend,
                     **transcription_common_params,
                     **whisperstreaming_params,
                 )
-                logger.info(
-                    "Using LocalAgreement policy with %s backend",
-                    getattr(self.asr, "backend_choice", self.asr.__class__.__name__),
-                )
+            logger.info(
+                "Using LocalAgreement policy with %s backend",
+                getattr(self.asr, "backend_choice", self.asr.__class__.__name__),
+            )
 
-        if self.args.diarization:
-            if self.args.diarization_backend == "diart":
-                from whisperlivekit.diarization.diart_backend import \
-                    DiartDiarization
-                diart_params = {
-                    "segmentation_model": "pyannote/segmentation-3.0",
-                    "embedding_model": "pyannote/embedding",
-                }
-                diart_params = update_with_kwargs(diart_params, kwargs)
+    def _load_batch_refinement(self):
+        if not self.args.transcription or self.args.backend_policy != "simulstreaming":
+            return
+        # with model workers there is no fast encoder in this process to share: loaded by the first refinement
+        try:
+            self.batch_asr = self._load_batch_asr(lazy=self.args.lazy_batch_asr or self.worker_pool is not None)
+        except Exception as e:
+            if self.startup_report.get("batch_asr", {}).get("status") != "failed":
+                self.startup_report["batch_asr"] = {"status": "failed", "error": repr(e)}
+            raise
+
+    def _load_diarization(self, kwargs):
+        if not self.args.diarization:
+            return
+        if self.args.diarization_backend == "diart":
+            from whisperlivekit.diarization.diart_backend import \
+                DiartDiarization
+            diart_params = {
+                "segmentation_model": "pyannote/segmentation-3.0",
+                "embedding_model": "pyannote/embedding",
+            }
+            diart_params = update_with_kwargs(diart_params, kwargs)
+            with self._timed_load("diarization"):
                 self.diarization_model = DiartDiarization(
                     block_duration=self.args.min_chunk_size,
                     **diart_params
                 )
-            elif self.args.diarization_backend == "sortformer":
-                from whisperlivekit.diarization.sortformer_backend import \
-                    SortformerDiarization
+        elif self.args.diarization_backend == "sortformer":
+            from whisperlivekit.diarization.sortformer_backend import \
+                SortformerDiarization
+            with self._timed_load("diarization"):
                 self.diarization_model = SortformerDiarization()
-        
-        self.translation_model = None
+
+    def _load_translation(self, kwargs):
+        if not self.args.target_language:
+            return
+        try:
+            from nllw import load_model
+        except:
+            raise Exception('To use translation, you must install nllw: `pip install nllw`')
+        translation_params = { 
+            "nllb_backend": "transformers",
+            "nllb_size": "600M"
+        }
+        translation_params = update_with_kwargs(translation_params, kwargs)
+        with self._timed_load("translation"):
+            self.translation_model = load_model([self.args.lan], **translation_params) #in the future we want to handle different languages for different speakers
+
+    def _start_inference_executor(self):
+        if self.args.inference_workers <= 0:
+            return
+        workers = self.args.inference_workers
+        # the sessions of a batch wait for each other in their worker
+        schedulers = [s for s in (self.encoder_scheduler, self.decoder_scheduler) if s is not None]
+        batch_size = max((scheduler.max_batch_size for scheduler in schedulers), default=1)
+        if batch_size > workers:
+            logger.info("Raising --inference-workers to the batch size (%d)", batch_size)
+            workers = batch_size
+        self.inference_executor = InferenceExecutor(workers, self.args.intra_op_threads)
+        logger.info(
+            "Running model calls on %d inference workers, %d torch threads each",
+            self.inference_executor.workers,
+            self.inference_executor.intra_op_threads,
+        )
+
+    def component_status(self):
+        """
+        Status of each component the configuration asks for: "loading", "ready",
+        "failed" or "lazy" (loaded by its first use), with its load time once loaded.
+        """
+        expected = []
+        if self.args.vac:
+            expected.append("vac")
+        if self.args.transcription:
+            expected.append("transcription")
+            if self.args.backend_policy == "simulstreaming":
+                expected.append("batch_asr")
+        if self.args.diarization:
+            expected.append("diarization")
         if self.args.target_language:
-            if self.args.lan == 'auto' and backend_policy != "simulstreaming":
-                raise Exception('Translation cannot be set with language auto when transcription backend is not simulstreaming')
+            expected.append("translation")
+        components = {}
+        for component in expected:
+            report = dict(self.startup_report.get(component, {"status": "loading"}))
+            if report["status"] == "lazy" and self.batch_asr is not None and self.batch_asr.loaded:
+                report["status"] = "ready"
+            components[component] = report
+        if self.args.vac and "vac" not in self.startup_report and self.streaming_ready.is_set():
+            # no onnxruntime: the JIT model is loaded per session
+            components["vac"] = {"status": "ready"}
+        return components
+
+    def readiness(self):
+        """Whether sessions can start, and the status of every component."""
+        components = self.component_status()
+        if not self.streaming_ready.is_set():
+            status = "failed" if self.loading_done.is_set() else "starting"
+        elif any(report["status"] == "failed" for report in components.values()):
+            status = "degraded"
+        else:
+            status = "ok" if self.loading_done.is_set() else "starting"
+        return {
+            "status": status,
+            "ready": self.streaming_ready.is_set(),
+            "uptime": round(perf_counter() - self._startup_beg, 2),
+            "components": components,
+        }
+
+    @contextmanager
+    def _timed_load(self, component):
+        """
+        Record the status, load time and resident memory added by the loading of
+        `component`. Loads running in parallel share the memory delta of each other.
+        """
+        self.startup_report[component] = {"status": "loading"}
+        rss_before = resident_memory_mb()
+        beg = perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.startup_report[component] = {
+                "status": "failed", "seconds": round(perf_counter() - beg, 2), "error": repr(e),
+            }
+            raise
+        report = {"status": "ready", "seconds": round(perf_counter() - beg, 2)}
+        rss_after = resident_memory_mb()
+        if rss_before is not None and rss_after is not None:
+            report["rss_mb"] = round(rss_after - rss_before)
+        self.startup_report[component] = report
+        logger.info(
+            "Loaded %s in %.1fs%s", component, report["seconds"],
+            f" (+{report['rss_mb']} MB resident)" if "rss_mb" in report else "",
+        )
+
+    def _log_startup(self, seconds):
+        rss = resident_memory_mb()
+        parts = []
+        for component, report in self.startup_report.items():
+            if report.get("shared"):
+                parts.append(f"{component} shared with the fast encoder")
+            elif report["status"] != "ready":
+                parts.append(f"{component} {report['status']}")
+            elif "rss_mb" in report:
+                parts.append(f"{component} {report['seconds']:.1f}s +{report['rss_mb']} MB")
             else:
-                try:
-                    from nllw import load_model
-                except:
-                    raise Exception('To use translation, you must install nllw: `pip install nllw`')
-                translation_params = { 
-                    "nllb_backend": "transformers",
-                    "nllb_size": "600M"
-                }
-                translation_params = update_with_kwargs(translation_params, kwargs)
-                self.translation_model = load_model([self.args.lan], **translation_params) #in the future we want to handle different languages for different speakers
-        TranscriptionEngine._initialized = True
+                parts.append(f"{component} {report['seconds']:.1f}s")
+        components = ", ".join(parts)
+        logger.info(
+            "Engine ready in %.1fs%s: %s", seconds,
+            f", {rss:.0f} MB resident" if rss is not None else "", components or "no models",
+        )
+
+    def _load_batch_asr(self, lazy):
+        """
+        Batch refinement model. It reuses the fast encoder's WhisperModel when that one
+        was loaded from the same weights, and with `lazy` loads its own on first use.
+        """
+        # batch gebruikt dezelfde weights als je encoder/model keuze
+        model_for_batch = self.args.model_path or self.args.model_size
+        fw_encoder_ref = getattr(self.asr, "fw_encoder_ref", None)
+        resolved_path = getattr(self.asr, "_resolved_model_path", None)
+        if fw_encoder_ref is not None and resolved_path is not None:
+            # the fast encoder loads the resolved weights: name them the same way
+            model_for_batch = str(resolved_path)
+        batch_asr = BatchFasterWhisperASR(
+            model=model_for_batch,
+            language=self.args.lan,
+            beam_size=7,  # hoger dan streaming 
+            condition_on_previous_text=False,
+            temperature=[0.0, 0.2],
+            initial_prompt="Dit is een Nederlands interview. Namen: Eus, Özcan Akyol, Rhodia Maas. Organisatie: IND.",
+            lazy=True,
+            #best_of=5,
+            #patience=1.2,
+            #length_penalty=0.6,
+            #no_speech_threshold=0.6,
+            #log_prob_threshold=-1.0,
+            #compression_ratio_threshold=2.4,
+
+        )
+        if fw_encoder_ref is not None and batch_asr.weights_ref == fw_encoder_ref:
+            batch_asr.share_model(self.asr.fw_encoder)
+        if batch_asr.shared:
+            self.startup_report["batch_asr"] = {"status": "ready", "shared": True}
+            logger.info("Batch ASR shares the fast encoder's model (%s)", model_for_batch)
+        elif lazy:
+            # reported "ready" by component_status once loaded
+            self.startup_report["batch_asr"] = {"status": "lazy"}
+        else:
+            with self._timed_load("batch_asr"):
+                batch_asr.model
+        return batch_asr
+
+    def _start_model_workers(self, kwargs):
+        """Load the transcription models in `model_workers` processes instead of this one."""
+        from whisperlivekit.model_workers import WorkerPool
+
+        workers = self.args.model_workers
+        # the workers only transcribe: VAC, diarization and translation stay in this process
+        engine_kwargs = {
+            **kwargs,
+            "model_workers": 0,
+            "inference_workers": 0,
+            "diarization": False,
+            "target_language": "",
+            "vac": False,
+            "no_vac": True,
+            "background_loading": False,
+            # the batch refinement runs in this process: never load its model in the workers
+            "lazy_batch_asr": True,
+        }
+        intra_op_threads = self.args.intra_op_threads or default_intra_op_threads(workers)
+        logger.info("Starting %d model workers, %d torch threads each", workers, intra_op_threads)
+        return WorkerPool(workers, engine_kwargs, intra_op_threads)
 
 
 def online_factory(args, asr):
@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from whisperlivekit.simul_whisper.batch_scheduler import QueueDelayStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InferenceJob:
+    session_id: int
+    fn: Callable[..., Any]
+    args: tuple
+    enqueued_at: float = field(default_factory=perf_counter)
+    future: Future = field(default_factory=Future)
+
+
+def default_intra_op_threads(workers: int) -> int:
+    """Cores per worker, so that the workers together use each core once."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+class InferenceExecutor:
+    """
+    Fixed pool of worker threads running the blocking model calls
+    (`process_iter`, `start_silence`, translation) of every session, instead of the
+    default thread pool of `asyncio.to_thread`.
+
+    Each session registers once and submits its calls with `run(session_id, fn, *args)`.
+    Pending calls are queued per session, and the workers serve the sessions
+    round-robin: a session with several pending calls (transcription and
+    translation) cannot delay the others by more than one call. Torch uses
+    `intra_op_threads` threads per call (`torch.set_num_threads`), so that `workers`
+    concurrent calls do not oversubscribe the cores. The time each call waited for a
+    worker is recorded per session (`session_stats`).
+    """
+
+    def __init__(self, workers: int = 1, intra_op_threads: int = 0, name: str = "inference") -> None:
+        self.workers = max(1, workers)
+        self.intra_op_threads = intra_op_threads or default_intra_op_threads(self.workers)
+        self.name = name
+        self._pending: Dict[int, Deque[InferenceJob]] = {}
+        # sessions with pending calls, in the order they are served
+        self._ready: Deque[int] = deque()
+        self._sessions: Dict[int, QueueDelayStats] = {}
+        self._session_ids = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.calls = 0
+        self._set_torch_threads()
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _set_torch_threads(self) -> None:
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self.intra_op_threads)
+
+    def register(self) -> int:
+        """Declare a new session. Returns its id, to be passed to `run`."""
+        with self._condition:
+            session_id = next(self._session_ids)
+            self._sessions[session_id] = QueueDelayStats()
+            self._pending[session_id] = deque()
+        return session_id
+
+    def release(self, session_id: int) -> Optional[QueueDelayStats]:
+        """Forget a session, returning its wait statistics. Its pending calls are cancelled."""
+        with self._condition:
+            stats = self._sessions.pop(session_id, None)
+            pending = self._pending.pop(session_id, deque())
+        for job in pending:
+            job.future.cancel()
+        if stats is not None and stats.requests:
+            logger.info(
+                f"{self.name.capitalize()} wait for session {session_id}: mean {stats.mean_delay * 1000:.1f}ms, "
+                f"max {stats.max_delay * 1000:.1f}ms over {stats.requests} calls"
+            )
+        return stats
+
+    def session_stats(self, session_id: int) -> Optional[QueueDelayStats]:
+        with self._condition:
+            return self._sessions.get(session_id)
+
+    def submit(self, session_id: int, fn: Callable[..., Any], *args: Any) -> Future:
+        job = InferenceJob(session_id=session_id, fn=fn, args=args)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{self.name} executor is closed")
+            pending = self._pending.get(session_id)
+            if pending is None:
+                raise KeyError(f"Session {session_id} is not registered with the {self.name} executor")
+            if not pending:
+                self._ready.append(session_id)
+            pending.append(job)
+            self._condition.notify()
+        return job.future
+
+    async def run(self, session_id: int, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` on a worker when it is this session's turn, and return its result."""
+        return await asyncio.wrap_future(self.submit(session_id, fn, *args))
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _next_job(self) -> Optional[InferenceJob]:
+        with self._condition:
+            while True:
+                while self._ready:
+                    session_id = self._ready.popleft()
+                    pending = self._pending.get(session_id)
+                    if not pending:
+                        # released while it was waiting
+                        continue
+                    job = pending.popleft()
+                    self.calls += 1
+                    if pending:
+                        self._ready.append(session_id)
+                    stats = self._sessions.get(session_id)
+                    if stats is not None:
+                        stats.add(perf_counter() - job.enqueued_at, 1)
+                    return job
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+    def _run(self) -> None:
+        self._set_torch_threads()
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+
+    def metrics(self, session_id: int) -> Dict[str, Any]:
+        stats = self.session_stats(session_id)
+        if stats is None:
+            return {}
+        return {
+            "calls": stats.requests,
+            "mean_wait_seconds": round(stats.mean_delay, 4),
+            "max_wait_seconds": round(stats.max_delay, 4),
+            "last_wait_seconds": round(stats.last_delay, 4),
+        }
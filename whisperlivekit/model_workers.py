@@ -0,0 +1,351 @@
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+from concurrent.futures import Future
+from copy import copy
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from whisperlivekit.timed_objects import Transcript
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+RING_SECONDS = 30.0
+
+
+class SharedAudioRing:
+    """
+    float32 audio of one session in shared memory, written by the front process and
+    read by the model worker. Positions are absolute sample counts; the writer sends
+    the (start, end) of each chunk to the worker over its pipe, which orders the
+    accesses, so the ring itself holds no synchronization.
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None) -> None:
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=capacity * 4)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.samples = np.ndarray((capacity,), dtype=np.float32, buffer=self.shm.buf)
+        self.write_position = 0
+        # position up to which the worker has read (known once it answered a later call)
+        self.read_position = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, audio: np.ndarray) -> Optional[Tuple[int, int]]:
+        """Copy `audio` into the ring. Returns its (start, end) positions, None when there is no room."""
+        n = len(audio)
+        if n > self.capacity - (self.write_position - self.read_position):
+            return None
+        start = self.write_position
+        index = start % self.capacity
+        first = min(n, self.capacity - index)
+        self.samples[index:index + first] = audio[:first]
+        self.samples[:n - first] = audio[first:]
+        self.write_position += n
+        return start, self.write_position
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Copy of the samples between two positions."""
+        n = end - start
+        index = start % self.capacity
+        first = min(n, self.capacity - index)
+        out = np.empty(n, dtype=np.float32)
+        out[:first] = self.samples[index:index + first]
+        out[first:] = self.samples[:n - first]
+        return out
+
+    def close(self, unlink: bool = False) -> None:
+        self.samples = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def engine_processor_factory(engine_kwargs: Dict[str, Any]) -> Tuple[Callable[[], Any], str]:
+    """Load the models in the worker process; returns the per-session processor constructor and the token separator."""
+    from whisperlivekit.core import TranscriptionEngine, online_factory
+
+    engine = TranscriptionEngine(**engine_kwargs)
+    return (lambda: online_factory(engine.args, engine.asr)), engine.asr.sep
+
+
+def _resolve(processor: Any, method: str) -> Callable[..., Any]:
+    target = processor
+    for attribute in method.split("."):
+        target = getattr(target, attribute)
+    return target
+
+
+def _worker_main(conn, engine_kwargs, intra_op_threads, factory) -> None:
+    """Command loop of a model worker process."""
+    if intra_op_threads:
+        import torch
+        torch.set_num_threads(intra_op_threads)
+    try:
+        make_processor, sep = factory(engine_kwargs)
+    except Exception as e:
+        conn.send(("failed", repr(e)))
+        return
+    conn.send(("ready", sep))
+
+    # drain the pipe in a thread, so that the front never blocks on a full pipe while a call runs
+    commands: "queue.Queue[Any]" = queue.Queue()
+
+    def receive():
+        while True:
+            try:
+                commands.put(conn.recv())
+            except EOFError:
+                commands.put(None)
+                return
+
+    threading.Thread(target=receive, name="model-worker-receiver", daemon=True).start()
+
+    processors: Dict[int, Any] = {}
+    rings: Dict[int, SharedAudioRing] = {}
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        kind, session_id = command[0], command[1]
+        try:
+            if kind == "open":
+                processors[session_id] = make_processor()
+                rings[session_id] = SharedAudioRing(command[3], name=command[2])
+            elif kind == "audio":
+                _, _, start, end, stream_end, inline = command
+                audio = inline if inline is not None else rings[session_id].read(start, end)
+                processors[session_id].insert_audio_chunk(audio, stream_end)
+            elif kind == "call":
+                _, _, request_id, method, args = command
+                processor = processors[session_id]
+                result = _resolve(processor, method)(*args)
+                if request_id is not None:
+                    conn.send(("result", request_id, result, processor.get_buffer()))
+            elif kind == "close":
+                processor = processors.pop(session_id, None)
+                if processor is not None and hasattr(processor, "close"):
+                    processor.close()
+                ring = rings.pop(session_id, None)
+                if ring is not None:
+                    ring.close()
+        except Exception as e:
+            logger.exception(f"Model worker: {kind} failed for session {session_id}")
+            if kind == "call" and command[2] is not None:
+                conn.send(("error", command[2], repr(e)))
+    for ring in rings.values():
+        ring.close()
+
+
+class ModelWorker:
+    """Front-process handle of one model worker process."""
+
+    def __init__(self, index: int, engine_kwargs: Dict[str, Any], intra_op_threads: int, factory: Callable) -> None:
+        context = mp.get_context("spawn")
+        self.index = index
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, engine_kwargs, intra_op_threads, factory),
+            name=f"model-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.sessions = 0
+        self.sep = " "
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        # request id -> (future, session, ring position sent before the call)
+        self._pending: Dict[int, Tuple[Future, "RemoteTranscription", int]] = {}
+        self._pending_lock = threading.Lock()
+        self._receiver: Optional[threading.Thread] = None
+
+    def wait_ready(self) -> None:
+        message = self.conn.recv()
+        if message[0] != "ready":
+            raise RuntimeError(f"Model worker {self.index} failed to start: {message[1]}")
+        self.sep = message[1]
+        self._receiver = threading.Thread(target=self._receive, name=f"model-worker-{self.index}-results", daemon=True)
+        self._receiver.start()
+
+    def send(self, command: Tuple) -> None:
+        with self._send_lock:
+            self.conn.send(command)
+
+    def call(self, session: "RemoteTranscription", method: str, *args: Any) -> Future:
+        future: Future = Future()
+        request_id = next(self._request_ids)
+        with self._pending_lock:
+            self._pending[request_id] = (future, session, session.sent_position)
+        self.send(("call", session.session_id, request_id, method, args))
+        return future
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            kind, request_id = message[0], message[1]
+            with self._pending_lock:
+                future, session, sent_position = self._pending.pop(request_id, (None, None, 0))
+            if future is None:
+                continue
+            if kind == "result":
+                session._on_result(message[3], sent_position)
+                future.set_result(message[2])
+            else:
+                future.set_exception(RuntimeError(f"Model worker {self.index}: {message[2]}"))
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future, _, _ in pending.values():
+            future.set_exception(RuntimeError(f"Model worker {self.index} exited"))
+
+    def stop(self) -> None:
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class _RemoteDecoder:
+    """What `AudioProcessor` looks up on `transcription.asr`: the separator and the decoder reset."""
+
+    def __init__(self, session: "RemoteTranscription", sep: str) -> None:
+        self.sep = sep
+        self._session = session
+
+    def refresh_segment(self, complete: bool = False) -> None:
+        self._session._post("model.refresh_segment", complete)
+
+
+class RemoteTranscription:
+    """
+    Stand-in for the online processor of a session (`SimulStreamingOnlineProcessor`
+    or `OnlineASRProcessor`) whose model runs in a `ModelWorker` process. Audio goes
+    through the session's `SharedAudioRing`; `process_iter` and `start_silence` wait
+    for the worker's answer, the other calls are only sent. `submit` returns the
+    future of a call, so that `AudioProcessor.run_inference` can await it without
+    holding a thread.
+    """
+
+    SAMPLING_RATE = SAMPLE_RATE
+
+    def __init__(
+        self,
+        worker: ModelWorker,
+        session_id: int,
+        sessions_lock: threading.Lock,
+        ring_seconds: float = RING_SECONDS,
+    ) -> None:
+        self.worker = worker
+        self.session_id = session_id
+        # the pool's lock, under which the sessions of each worker are counted
+        self._sessions_lock = sessions_lock
+        self.ring = SharedAudioRing(int(ring_seconds * SAMPLE_RATE))
+        self.asr = _RemoteDecoder(self, worker.sep)
+        self._buffer = Transcript()
+        self.sent_position = 0
+        self._closed = False
+        worker.send(("open", session_id, self.ring.name, self.ring.capacity))
+
+    def _post(self, method: str, *args: Any) -> None:
+        self.worker.send(("call", self.session_id, None, method, args))
+
+    def _on_result(self, buffer: Transcript, sent_position: int) -> None:
+        self._buffer = buffer
+        # the worker handles its commands in order: it has read every chunk sent before the call
+        self.ring.read_position = max(self.ring.read_position, sent_position)
+
+    def insert_audio_chunk(self, audio: np.ndarray, audio_stream_end_time: Optional[float] = None) -> None:
+        positions = self.ring.write(audio)
+        if positions is None:
+            # more unread audio than the ring holds: send this chunk through the pipe
+            self.worker.send(("audio", self.session_id, 0, 0, audio_stream_end_time, np.asarray(audio)))
+            return
+        self.sent_position = positions[1]
+        self.worker.send(("audio", self.session_id, positions[0], positions[1], audio_stream_end_time, None))
+
+    def submit(self, method: str, *args: Any) -> Future:
+        return self.worker.call(self, method, *args)
+
+    def process_iter(self, *args: Any) -> Tuple[List[Any], float]:
+        return self.submit("process_iter", *args).result()
+
+    def start_silence(self) -> Tuple[List[Any], float]:
+        return self.submit("start_silence").result()
+
+    def end_silence(self, silence_duration: Optional[float], offset: float) -> None:
+        self._post("end_silence", silence_duration, offset)
+
+    def new_speaker(self, change_speaker: Any) -> None:
+        self._post("new_speaker", change_speaker)
+
+    def set_degraded(self, degraded: bool) -> None:
+        self._post("set_degraded", degraded)
+
+    def get_buffer(self) -> Transcript:
+        # the caller edits the returned transcript
+        return copy(self._buffer)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.worker.send(("close", self.session_id))
+        with self._sessions_lock:
+            self.worker.sessions -= 1
+        self.ring.close(unlink=True)
+
+
+class WorkerPool:
+    """
+    `num_workers` model worker processes, each loading its own models (`factory`,
+    by default a `TranscriptionEngine` built from `engine_kwargs`). The front process
+    keeps the websockets, FFmpeg, VAD and the result formatting; the transcription of
+    each session runs in one worker for its whole life (the least loaded one when it
+    opens).
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        engine_kwargs: Dict[str, Any],
+        intra_op_threads: int = 0,
+        factory: Callable[[Dict[str, Any]], Tuple[Callable[[], Any], str]] = engine_processor_factory,
+    ) -> None:
+        self.workers = [ModelWorker(i, engine_kwargs, intra_op_threads, factory) for i in range(num_workers)]
+        # loading in parallel, the workers start together
+        for worker in self.workers:
+            worker.wait_ready()
+        self._session_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def open_session(self) -> RemoteTranscription:
+        with self._lock:
+            worker = min(self.workers, key=lambda w: w.sessions)
+            worker.sessions += 1
+            session_id = next(self._session_ids)
+        logger.info(f"Session {session_id} assigned to model worker {worker.index} ({worker.sessions} sessions)")
+        return RemoteTranscription(worker, session_id, self._lock)
+
+    def sessions_per_worker(self) -> List[int]:
+        return [worker.sessions for worker in self.workers]
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.stop()
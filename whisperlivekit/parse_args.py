@@ -159,6 +159,48 @@ def parse_args():
     parser.add_argument(
         "--vac-chunk-size", type=float, default=0.04, help="VAC sample size in seconds."
     )
+    parser.add_argument(
+        "--vad-batch-size",
+        type=int,
+        default=1,
+        dest="vad_batch_size",
+        help="Maximum number of sessions whose VAC windows are evaluated together in one batched call of the shared Silero ONNX model (1 = no batching). Requires onnxruntime.",
+    )
+    parser.add_argument(
+        "--vad-batch-wait",
+        type=float,
+        default=0.005,
+        dest="vad_batch_wait",
+        help="With --vad-batch-size > 1: maximum time in seconds the windows of a session wait for other sessions to join their batch.",
+    )
+    parser.add_argument(
+        "--vad-multi-window",
+        action="store_true",
+        default=False,
+        dest="vad_multi_window",
+        help="Evaluate all the VAC windows of an audio chunk in one call of a Silero ONNX model looping over them (silero_vad_sequence.onnx). Requires onnxruntime, ignored with --vad-batch-size > 1.",
+    )
+    parser.add_argument(
+        "--vad-gate-db",
+        type=float,
+        default=None,
+        dest="vad_gate_db",
+        help="Energy pre-gate of the VAC: skip the Silero model on long runs of windows whose RMS is below this level in dBFS (e.g. -60) and whose zero-crossing rate is below --vad-gate-zcr, or that are 10 dB quieter whatever their zero-crossing rate. Disabled by default.",
+    )
+    parser.add_argument(
+        "--vad-gate-zcr",
+        type=float,
+        default=0.25,
+        dest="vad_gate_zcr",
+        help="With --vad-gate-db: zero-crossing rate (0-1) from which a window near the threshold is still evaluated, as possible unvoiced speech.",
+    )
+    parser.add_argument(
+        "--vad-gate-hangover",
+        type=float,
+        default=0.5,
+        dest="vad_gate_hangover",
+        help="With --vad-gate-db: seconds of a quiet run still evaluated by the Silero model before its windows are skipped.",
+    )
 
     parser.add_argument(
         "--no-vad",
@@ -196,6 +238,94 @@ def parse_args():
         default=False,
         help="If set, raw PCM (s16le) data is expected as input and FFmpeg will be bypassed. Frontend will use AudioWorklet instead of MediaRecorder."
     )
+    parser.add_argument(
+        "--audio-decoder",
+        type=str,
+        default="ffmpeg",
+        choices=["ffmpeg", "pyav"],
+        dest="audio_decoder",
+        help="Decoder of the compressed audio sent by MediaRecorder (without --pcm-input): an ffmpeg process per session, or PyAV in the server process (pip install av).",
+    )
+    parser.add_argument(
+        "--results-min-interval",
+        type=float,
+        default=0.05,
+        dest="results_min_interval",
+        help="Minimum time in seconds between two result updates sent to a client. Results are only formatted when the transcription, diarization or translation changed; the changes made within this interval are sent together.",
+    )
+    parser.add_argument(
+        "--max-queue-seconds",
+        type=float,
+        default=0.0,
+        dest="max_queue_seconds",
+        help="Bound of each processing queue of a session (transcription, diarization, translation), in seconds of audio. 0 (default) for unbounded queues; the queue policies only apply to bounded queues.",
+    )
+    parser.add_argument(
+        "--transcription-queue-policy",
+        type=str,
+        default="block",
+        choices=["block", "drop", "latest", "degrade"],
+        dest="transcription_queue_policy",
+        help="What to do when the transcription queue is full: 'block' stops reading the websocket until the transcription catches up, 'drop' drops the new audio, 'latest' drops the oldest audio, 'degrade' decodes with a larger --frame-threshold until the queue is half empty (blocks at twice the bound).",
+    )
+    parser.add_argument(
+        "--diarization-queue-policy",
+        type=str,
+        default="drop",
+        choices=["block", "drop", "latest"],
+        dest="diarization_queue_policy",
+        help="What to do when the diarization queue is full. With 'drop' (default), the diarization falls behind first instead of the transcription.",
+    )
+    parser.add_argument(
+        "--translation-queue-policy",
+        type=str,
+        default="block",
+        choices=["block", "drop", "latest"],
+        dest="translation_queue_policy",
+        help="What to do when the translation queue (transcribed tokens) is full.",
+    )
+    parser.add_argument(
+        "--shed-load-lag",
+        type=float,
+        default=0.0,
+        dest="shed_load_lag",
+        help="Refuse new websocket sessions (close code 1013, try again later) while a session's transcription lags more than this many seconds behind its audio. 0 to always accept.",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=int,
+        default=0,
+        dest="inference_workers",
+        help="Number of threads running the model calls of all sessions, served round-robin. 0 uses the default asyncio thread pool (one thread per concurrent call).",
+    )
+    parser.add_argument(
+        "--intra-op-threads",
+        type=int,
+        default=0,
+        dest="intra_op_threads",
+        help="With --inference-workers: torch threads per model call. 0 splits the CPU cores between the workers.",
+    )
+    parser.add_argument(
+        "--model-workers",
+        type=int,
+        default=0,
+        dest="model_workers",
+        help="Number of processes loading the transcription model and running the transcription of the sessions, each session staying on one worker. Audio is passed through shared memory. 0 transcribes in the server process.",
+    )
+    parser.add_argument(
+        "--lazy-batch-asr",
+        action="store_true",
+        default=False,
+        dest="lazy_batch_asr",
+        help="Load the batch refinement model on its first use instead of at startup. Without effect when it shares the faster-whisper encoder's model (same weights).",
+    )
+    parser.add_argument(
+        "--background-loading",
+        action="store_true",
+        default=False,
+        dest="background_loading",
+        help="Load the models concurrently in background threads and accept sessions as soon as VAC and transcription are loaded. Diarization and translation apply to the sessions opened after their models are loaded. Progress is reported on /ready and /health.",
+    )
     # SimulStreaming-specific arguments
     simulstreaming_group = parser.add_argument_group('SimulStreaming arguments (only used with --backend simulstreaming)')
 
@@ -295,6 +425,119 @@ def parse_args():
         help="Max context tokens for the model. Default is 0.",
     )
     
+    simulstreaming_group.add_argument(
+        "--incremental-encoder",
+        action="store_true",
+        default=False,
+        dest="incremental_encoder",
+        help="Cache mel frames and freeze the encoder output of audio that has enough right context, so that each chunk only re-encodes the tail of the buffer. Approximate, and only used with the PyTorch encoder (--backend whisper or --disable-fast-encoder). Each session keeps the keys and values of every encoder layer for the frozen frames: up to about 38 MB for base and 476 MB for large-v3 in float32 with a 30s buffer (less with a smaller --audio-max-len).",
+    )
+
+    simulstreaming_group.add_argument(
+        "--encoder-lookahead",
+        type=float,
+        default=2.0,
+        dest="encoder_lookahead",
+        help="With --incremental-encoder: seconds of audio a frame must have on its right before its encoder output is frozen.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--encoder-evict-len",
+        type=float,
+        default=5.0,
+        dest="encoder_evict_len",
+        help="With --incremental-encoder: seconds of audio removed at once when the buffer exceeds --audio-max-len. Each removal forces a full re-encode.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--dynamic-audio-ctx",
+        action="store_true",
+        default=False,
+        dest="dynamic_audio_ctx",
+        help="Encode only the audio content, rounded up to the next --audio-ctx-buckets length, instead of padding every chunk to 30s. The decoder cross-attention runs over the shorter features. PyTorch encoder only; may change the transcription slightly.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--audio-ctx-buckets",
+        type=float,
+        nargs="+",
+        default=[5.0, 10.0, 15.0, 20.0, 30.0],
+        dest="audio_ctx_buckets",
+        help="With --dynamic-audio-ctx: encoded lengths in seconds the content is rounded up to. Longer content is encoded over 30s.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--preallocated-kv-cache",
+        action="store_true",
+        default=False,
+        dest="preallocated_kv_cache",
+        help="Write the decoder self-attention keys/values in place into buffers preallocated to the text context, reused across chunks, instead of growing them token by token.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--persist-prefix-cache",
+        action="store_true",
+        default=False,
+        dest="persist_prefix_cache",
+        help="Keep the decoder self-attention keys/values of the context prompt between chunks, so only the tokens after it are fed again. Approximate: the kept entries were computed with the previous audio features.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--draft-model",
+        type=str,
+        default=None,
+        dest="draft_model",
+        help="Smaller Whisper model (name or path) proposing the next tokens, verified in a single decoder pass of the main model (speculative decoding). Same vocabulary as the main model, --beams 1 only. The output is the greedy output of the main model, except where its two best tokens are closer than the float rounding of a multi-token pass, which can pick the other one; token parity was not checked on real checkpoints.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--draft-tokens",
+        type=int,
+        default=4,
+        dest="draft_tokens",
+        help="With --draft-model: maximum number of tokens proposed by the draft model per verification pass.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--encoder-batch-size",
+        type=int,
+        default=1,
+        dest="encoder_batch_size",
+        help="Maximum number of sessions whose encoder passes are batched together on the shared model. 1 disables cross-session batching.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--encoder-batch-wait",
+        type=float,
+        default=0.03,
+        dest="encoder_batch_wait",
+        help="With --encoder-batch-size > 1: maximum time in seconds a session waits for other sessions to join its encoder batch.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--decoder-batch-size",
+        type=int,
+        default=1,
+        dest="decoder_batch_size",
+        help="Maximum number of sessions whose decoder steps are run together in one forward pass on the shared model. 1 disables cross-session batching.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--decoder-batch-wait",
+        type=float,
+        default=0.005,
+        dest="decoder_batch_wait",
+        help="With --decoder-batch-size > 1: maximum time in seconds a decoding step waits for the other decoding sessions.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--mmap-weights",
+        action="store_true",
+        default=False,
+        dest="mmap_weights",
+        help="Memory-map the PyTorch Whisper checkpoint (CPU only) and use its tensors as the model weights, instead of reading it into a private copy. Faster startup, and processes loading the same file (--model-workers) share its memory. float16 checkpoints are still converted to float32 copies.",
+    )
+
     simulstreaming_group.add_argument(
         "--model-path",
         type=str,
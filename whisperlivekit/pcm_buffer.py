@@ -0,0 +1,99 @@
+from typing import Optional
+
+import numpy as np
+
+INT16_SCALE = np.float32(1.0 / 32768.0)
+
+
+class PCMRingBuffer:
+    """
+    Ring buffer of s16le mono samples between the incoming PCM bytes (websocket frames
+    or FFmpeg stdout) and the processing chunks of `AudioProcessor.handle_pcm_data`.
+
+    `write()` copies the bytes once into a preallocated int16 array (an odd trailing
+    byte is kept until the next write). `read(n)` returns the next `n` samples as a
+    read-only int16 view, valid until the next `write()`: a view of the ring itself,
+    or of a preallocated scratch array when the samples wrap around its end. The
+    storage is allocated at the first write, so connected sessions that never send
+    audio hold none, and only grows when the unread audio exceeds the capacity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._ring: Optional[np.ndarray] = None
+        self._scratch: Optional[np.ndarray] = None
+        self._start = 0
+        self._size = 0
+        self._odd_byte = b""
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _allocate(self, capacity: int):
+        ring = np.empty(capacity, dtype=np.int16)
+        if self._ring is not None and self._size:
+            # linearize the unread samples at the start of the new storage
+            first = min(self._size, len(self._ring) - self._start)
+            ring[:first] = self._ring[self._start:self._start + first]
+            ring[first:self._size] = self._ring[:self._size - first]
+        self._ring = ring
+        self._scratch = None
+        self._start = 0
+        self.capacity = capacity
+
+    def write(self, data: bytes):
+        """Append s16le bytes."""
+        if self._odd_byte:
+            data = self._odd_byte + bytes(data)
+            self._odd_byte = b""
+        if len(data) % 2:
+            self._odd_byte = bytes(data[-1:])
+            data = memoryview(data)[:-1]
+        samples = np.frombuffer(data, dtype=np.int16)
+        if not len(samples):
+            return
+        n = len(samples)
+        if self._ring is None or self._size + n > self.capacity:
+            capacity = self.capacity
+            while capacity < self._size + n:
+                capacity *= 2
+            self._allocate(capacity)
+        ring = self._ring
+        end = (self._start + self._size) % self.capacity
+        if end + n <= self.capacity:
+            ring[end:end + n] = samples
+        else:
+            first = self.capacity - end
+            ring[end:] = samples[:first]
+            ring[:n - first] = samples[first:]
+        self._size += n
+
+    def read(self, n: int) -> np.ndarray:
+        """Consume the next `n` samples (at most the buffered ones), as a read-only int16 view."""
+        n = min(n, self._size)
+        ring = self._ring
+        if n == 0:
+            return np.empty(0, dtype=np.int16)
+        if self._start + n <= len(ring):
+            samples = ring[self._start:self._start + n]
+        else:
+            if self._scratch is None:
+                self._scratch = np.empty(len(ring), dtype=np.int16)
+            first = len(ring) - self._start
+            samples = self._scratch[:n]
+            samples[:first] = ring[self._start:]
+            samples[first:] = ring[:n - first]
+        self._start = (self._start + n) % len(ring)
+        self._size -= n
+        samples = samples.view()
+        samples.flags.writeable = False
+        return samples
+
+
+def pcm_to_float(samples: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """int16 samples to normalized float32 (same values as `/ 32768.0`), into `out` if given."""
+    if out is None:
+        out = np.empty(len(samples), dtype=np.float32)
+    np.copyto(out, samples)
+    out *= INT16_SCALE
+    return out
@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import logging
+import threading
+from typing import Callable, Optional
+
+from whisperlivekit.ffmpeg_manager import FFmpegState
+
+logger = logging.getLogger(__name__)
+
+ERROR_INSTALL_INSTRUCTIONS = f"""
+{'='*50}
+PyAV is not installed (--audio-decoder pyav).
+Install it with: pip install av
+(the wheels include the FFmpeg libraries, no FFmpeg installation is needed),
+or use the default --audio-decoder ffmpeg.
+{'='*50}
+"""
+
+
+def is_pyav_available() -> bool:
+    try:
+        import av  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _StreamInput:
+    """
+    Blocking file-like input of the demuxer: `read` waits for the bytes written by
+    `write`, and returns b"" (end of stream) once `close` is called and they are read.
+    `on_starved` is called with it before `read` waits: everything written is decoded.
+    """
+
+    def __init__(self, on_starved: Callable[["_StreamInput"], None]):
+        self._buffer = bytearray()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._on_starved = on_starved
+        # PCM decoded from the bytes read, not handed to the event loop yet
+        self.decoded = bytearray()
+
+    def write(self, data: bytes):
+        with self._condition:
+            self._buffer += data
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._condition:
+            if not self._buffer and not self._closed:
+                self._on_starved(self)
+            while not self._buffer and not self._closed:
+                self._condition.wait()
+            if size < 0 or size >= len(self._buffer):
+                data = bytes(self._buffer)
+                self._buffer.clear()
+            else:
+                data = bytes(self._buffer[:size])
+                del self._buffer[:size]
+            return data
+
+
+class PyAVDecoder:
+    """
+    In-process alternative to `FFmpegManager` (--audio-decoder pyav), with the same
+    interface: the compressed stream of the browser (WebM/Opus from MediaRecorder, or
+    any container FFmpeg reads) is demuxed and decoded with PyAV into s16le PCM at
+    `sample_rate`, by a thread of the session instead of an ffmpeg process.
+
+    The thread blocks on the written bytes, and hands the PCM decoded from them to the
+    event loop once it has consumed them (one wake-up of the loop per written slice
+    rather than per Opus frame), so `read_data` waits for it instead of polling.
+    """
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+        self._input: Optional[_StreamInput] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pcm = bytearray()
+        self._pcm_ready = asyncio.Event()
+        self._ended = False
+
+        self.on_error_callback: Optional[Callable[[str], None]] = None
+
+        self.state = FFmpegState.STOPPED
+        self._state_lock = asyncio.Lock()
+
+    async def start(self) -> bool:
+        async with self._state_lock:
+            if self.state != FFmpegState.STOPPED:
+                logger.warning(f"PyAV decoder already running in state: {self.state}")
+                return False
+            self.state = FFmpegState.STARTING
+
+        try:
+            import av  # noqa: F401
+        except ImportError:
+            logger.error(ERROR_INSTALL_INSTRUCTIONS)
+            async with self._state_lock:
+                self.state = FFmpegState.FAILED
+            if self.on_error_callback:
+                await self.on_error_callback("pyav_not_found")
+            return False
+
+        self._loop = asyncio.get_running_loop()
+        self._input = _StreamInput(self._flush)
+        self._pcm.clear()
+        self._pcm_ready.clear()
+        self._ended = False
+        self._thread = threading.Thread(target=self._decode, args=(self._input,), name="pyav-decoder", daemon=True)
+        self._thread.start()
+
+        async with self._state_lock:
+            self.state = FFmpegState.RUNNING
+
+        logger.info("PyAV decoder started.")
+        return True
+
+    async def stop(self):
+        async with self._state_lock:
+            if self.state == FFmpegState.STOPPED:
+                return
+            self.state = FFmpegState.STOPPED
+
+        if self._input:
+            self._input.close()
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        self._input = None
+
+        logger.info("PyAV decoder stopped.")
+
+    async def write_data(self, data: bytes) -> bool:
+        async with self._state_lock:
+            if self.state != FFmpegState.RUNNING:
+                logger.warning(f"Cannot write, PyAV decoder state: {self.state}")
+                return False
+
+        self._input.write(data)
+        return True
+
+    async def read_data(self, size: int) -> Optional[bytes]:
+        async with self._state_lock:
+            if self.state != FFmpegState.RUNNING:
+                logger.warning(f"Cannot read, PyAV decoder state: {self.state}")
+                return None
+
+        try:
+            await asyncio.wait_for(self._pcm_ready.wait(), timeout=20.0)
+        except asyncio.TimeoutError:
+            logger.warning("PyAV decoder read timeout.")
+            return None
+        data = bytes(self._pcm[:size])
+        del self._pcm[:size]
+        if not self._pcm and not self._ended:
+            self._pcm_ready.clear()
+        return data
+
+    async def get_state(self) -> FFmpegState:
+        async with self._state_lock:
+            return self.state
+
+    async def restart(self) -> bool:
+        async with self._state_lock:
+            if self.state == FFmpegState.RESTARTING:
+                logger.warning("Restart already in progress.")
+                return False
+            self.state = FFmpegState.RESTARTING
+
+        logger.info("Restarting PyAV decoder...")
+
+        try:
+            await self.stop()
+            return await self.start()
+        except Exception as e:
+            logger.error(f"Error during PyAV decoder restart: {e}")
+            async with self._state_lock:
+                self.state = FFmpegState.FAILED
+            if self.on_error_callback:
+                await self.on_error_callback("restart_failed")
+            return False
+
+    def _decode(self, stream_input: _StreamInput):
+        """Decoding thread: demuxes `stream_input` until its end and delivers the PCM."""
+        import av
+
+        layout = "mono" if self.channels == 1 else "stereo"
+        try:
+            with av.open(stream_input, mode="r") as container:
+                audio = next(s for s in container.streams if s.type == "audio")
+                resampler = av.AudioResampler(format="s16", layout=layout, rate=self.sample_rate)
+                for frame in container.decode(audio):
+                    for pcm in resampler.resample(frame):
+                        stream_input.decoded += pcm.to_ndarray().tobytes()
+                for pcm in resampler.resample(None):
+                    stream_input.decoded += pcm.to_ndarray().tobytes()
+                self._flush(stream_input)
+        except Exception as e:
+            if stream_input is self._input and self.state == FFmpegState.RUNNING:
+                logger.error(f"Error decoding audio with PyAV: {e}")
+                self._loop.call_soon_threadsafe(self._fail, stream_input)
+        finally:
+            self._loop.call_soon_threadsafe(self._end, stream_input)
+
+    def _flush(self, stream_input: _StreamInput):
+        """Decoding thread: hands the PCM decoded so far to the event loop."""
+        if stream_input.decoded:
+            self._loop.call_soon_threadsafe(self._append, stream_input, bytes(stream_input.decoded))
+            stream_input.decoded.clear()
+
+    # the callbacks below run on the event loop, and ignore the thread of a stopped stream
+
+    def _append(self, stream_input: _StreamInput, data: bytes):
+        if stream_input is self._input:
+            self._pcm += data
+            self._pcm_ready.set()
+
+    def _end(self, stream_input: _StreamInput):
+        if stream_input is self._input:
+            # readers get b"" once the decoded PCM is consumed, like at the end of ffmpeg's stdout
+            self._ended = True
+            self._pcm_ready.set()
+
+    def _fail(self, stream_input: _StreamInput):
+        if stream_input is not self._input:
+            return
+        self.state = FFmpegState.FAILED
+        if self.on_error_callback:
+            with contextlib.suppress(RuntimeError):
+                asyncio.ensure_future(self.on_error_callback("decode_error"))
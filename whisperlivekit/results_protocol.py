@@ -0,0 +1,109 @@
+import json
+from time import time
+from typing import Any, Dict, List, Optional
+
+from whisperlivekit.timed_objects import FrontData, Segment
+
+LEGACY_PROTOCOL = "legacy"
+TRANSCRIPT_UPDATE_PROTOCOL = "transcript_update"
+PROTOCOLS = (LEGACY_PROTOCOL, TRANSCRIPT_UPDATE_PROTOCOL)
+
+
+def parse_client_config(text: str) -> Optional[str]:
+    """Protocol requested by a client `config` text message, None if it is not one."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("type") != "config":
+        return None
+    protocol = message.get("protocol", LEGACY_PROTOCOL)
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"Unsupported protocol {protocol!r}, expected one of {', '.join(PROTOCOLS)}")
+    return protocol
+
+
+class ResultsEncoder:
+    """
+    Serializes the `FrontData` pushed by `AudioProcessor.results_formatter` for one
+    websocket, in the protocol negotiated with the client (see docs/API.md), and
+    counts the bytes sent.
+
+    `legacy`: the whole transcript at every push (`FrontData.to_dict()`).
+    `transcript_update`: only the segments that are new or changed since the last
+    message, keyed by their position in the transcript (`id`), plus the ephemeral
+    buffers and the total number of segments.
+    """
+
+    def __init__(self, protocol: str = LEGACY_PROTOCOL) -> None:
+        self.protocol = protocol
+        self._sent_segments: List[Dict[str, Any]] = []
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.started = time()
+
+    def set_protocol(self, protocol: str) -> None:
+        """Switch protocol; the next transcript_update message holds every segment."""
+        self.protocol = protocol
+        self._sent_segments = []
+
+    @staticmethod
+    def _segment_dict(segment_id: int, line: Segment) -> Dict[str, Any]:
+        return {
+            "id": segment_id,
+            "speaker": int(line.speaker) if line.speaker != -1 else 1,
+            "text": line.text or "",
+            "start": round(line.start, 2),
+            "end": round(line.end, 2),
+            "language": line.detected_language,
+            "translation": line.translation or "",
+        }
+
+    def transcript_update(self, response: FrontData) -> Dict[str, Any]:
+        lines = [line for line in response.lines if (line.text or line.speaker == -2)]
+        segments = [self._segment_dict(i, line) for i, line in enumerate(lines)]
+        changed = [
+            segment for i, segment in enumerate(segments)
+            if i >= len(self._sent_segments) or self._sent_segments[i] != segment
+        ]
+        self._sent_segments = segments
+        message: Dict[str, Any] = {
+            "type": TRANSCRIPT_UPDATE_PROTOCOL,
+            "status": response.status,
+            "segments": changed,
+            "segment_count": len(segments),
+            "buffer": {
+                "transcription": response.buffer_transcription,
+                "diarization": response.buffer_diarization,
+                "translation": response.buffer_translation,
+            },
+            "metadata": {
+                "remaining_time_transcription": response.remaining_time_transcription,
+                "remaining_time_diarization": response.remaining_time_diarization,
+            },
+        }
+        if response.error:
+            message["error"] = response.error
+        return message
+
+    def encode(self, response: FrontData) -> str:
+        """JSON text of the message for this push."""
+        if self.protocol == TRANSCRIPT_UPDATE_PROTOCOL:
+            message = self.transcript_update(response)
+        else:
+            message = response.to_dict()
+        return self.encode_message(message)
+
+    def encode_message(self, message: Dict[str, Any]) -> str:
+        """JSON text of any message sent to the client, counted in the session bytes."""
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        self.bytes_sent += len(text.encode("utf-8"))
+        self.messages_sent += 1
+        return text
+
+    def summary(self) -> str:
+        elapsed = max(time() - self.started, 1e-6)
+        return (
+            f"protocol={self.protocol} | {self.messages_sent} messages | {self.bytes_sent} bytes | "
+            f"{self.bytes_sent / elapsed:.0f} B/s over {elapsed:.1f}s"
+        )
@@ -1,9 +1,15 @@
+import asyncio
 import warnings
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
 
+from whisperlivekit.simul_whisper.batch_scheduler import (BatchScheduler,
+                                                         QueueDelayStats)
+
 """
 Code is adapted from silero-vad v6: https://github.com/snakers4/silero-vad
 """
@@ -42,6 +48,8 @@ class OnnxSession():
             self.session = onnxruntime.InferenceSession(path, sess_options=opts)
 
         self.path = path
+        # silero_vad_sequence.onnx: windows looped over in the graph, see OnnxSequenceWrapper
+        self.sequence = any(i.name == 'windows' for i in self.session.get_inputs())
         if '16k' in path:
             warnings.warn('This model support only 16000 sampling rate!')
             self.sample_rates = [16000]
@@ -57,6 +65,7 @@ class OnnxWrapper():
     def __init__(self, session: OnnxSession, force_onnx_cpu=False):
         self._shared_session = session
         self.sample_rates = session.sample_rates
+        self._bind_buffers()
         self.reset_states()
 
     @property
@@ -86,6 +95,43 @@ class OnnxWrapper():
         self._context = torch.zeros(0)
         self._last_sr = 0
         self._last_batch_size = 0
+        self._input[:] = 0
+        self._states[0][:] = 0
+        self._turn = 0
+
+    def _bind_buffers(self):
+        """
+        Preallocated buffers of `probability`: the (context + window) input, the output,
+        and two states bound as input and output in turn, so that the ONNX session reads
+        and writes them in place.
+        """
+        from onnxruntime import OrtValue
+
+        self._input = np.zeros((1, 64 + 512), dtype=np.float32)
+        self._output = np.zeros((1, 1), dtype=np.float32)
+        self._states = [np.zeros((2, 1, 128), dtype=np.float32) for _ in range(2)]
+        self._sr = np.array(16000, dtype=np.int64)
+        self._bindings = []
+        for turn in range(2):
+            binding = self.session.io_binding()
+            binding.bind_cpu_input('input', self._input)
+            binding.bind_cpu_input('state', self._states[turn])
+            binding.bind_cpu_input('sr', self._sr)
+            binding.bind_ortvalue_output('output', OrtValue.ortvalue_from_numpy(self._output))
+            binding.bind_ortvalue_output('stateN', OrtValue.ortvalue_from_numpy(self._states[1 - turn]))
+            self._bindings.append(binding)
+
+    def probability(self, window: np.ndarray) -> float:
+        """
+        Speech probability of a 512-sample window at 16 kHz. The NumPy path of
+        `FixedVADIterator`: the window is copied into the preallocated input and
+        nothing else is allocated. Its state is separate from the one of `__call__`.
+        """
+        self._input[0, 64:] = window
+        self.session.run_with_iobinding(self._bindings[self._turn])
+        self._turn ^= 1
+        self._input[0, :64] = self._input[0, 512:]
+        return float(self._output[0, 0])
 
     def __call__(self, x, sr: int):
 
@@ -125,17 +171,135 @@ class OnnxWrapper():
         return out
 
 
-def _get_onnx_model_path(model_path: str = None, opset_version: int = 16) -> Path:
+class OnnxSequenceWrapper():
+    """
+    Per-session state of the sequence model (`silero_vad_sequence.onnx`, built by
+    scripts/export_silero_vad_sequence.py), which loops the Silero graph over the
+    windows it is given: one `session.run` evaluates all the windows of a chunk, in
+    order, with the same results as one `OnnxWrapper` call per window.
+    """
+
+    def __init__(self, session: OnnxSession):
+        if not session.sequence:
+            raise ValueError("OnnxSequenceWrapper requires the sequence model (load_onnx_session(sequence=True))")
+        self._shared_session = session
+        self.sample_rates = session.sample_rates
+        self._sr = np.array(16000, dtype=np.int64)
+        self._windows = np.zeros((8, 1, 512), dtype=np.float32)
+        self.reset_states()
+
+    @property
+    def session(self):
+        return self._shared_session.session
+
+    def reset_states(self, batch_size=1):
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._context = np.zeros((1, 64), dtype=np.float32)
+
+    def probabilities(self, windows: List[np.ndarray]) -> np.ndarray:
+        """Speech probabilities of consecutive 512-sample windows at 16 kHz, in one call."""
+        if len(windows) > len(self._windows):
+            self._windows = np.zeros((len(windows), 1, 512), dtype=np.float32)
+        batch = self._windows[:len(windows)]
+        for i, window in enumerate(windows):
+            batch[i, 0] = window
+        probabilities, self._state, self._context = self.session.run(None, {
+            'windows': batch, 'state': self._state, 'context': self._context, 'sr': self._sr,
+        })
+        return probabilities[:, 0, 0]
+
+
+class BatchedOnnxVAD:
+    """
+    Per-session state of the Silero model when its windows are evaluated by a
+    `VADBatchService`. `VADIterator` only calls `reset_states` on it: the windows are
+    passed to `probabilities` by `BatchedVADIterator`.
+    """
+
+    def __init__(self, service: "VADBatchService", session_id: int):
+        self.service = service
+        self.session_id = session_id
+        self.reset_states()
+
+    def reset_states(self, batch_size=1):
+        self.state = np.zeros((2, 128), dtype=np.float32)
+        self.context = np.zeros(64, dtype=np.float32)
+
+    def probabilities(self, windows: List[np.ndarray]) -> Future:
+        """Queue the 512-sample windows of this session, resolves to their speech probabilities."""
+        return self.service.scheduler.submit_future(self.session_id, (self, windows))
+
+    def stats(self) -> Optional[QueueDelayStats]:
+        return self.service.scheduler.session_stats(self.session_id)
+
+    def release(self):
+        self.service.scheduler.release(self.session_id)
+
+
+class VADBatchService:
+    """
+    Evaluates the pending 512-sample windows of all the sessions sharing one
+    `OnnxSession` as batched `session.run` calls, with the per-session states stacked
+    along the batch dimension.
+
+    Each session queues all the complete windows of a chunk at once and waits for their
+    probabilities (one request in flight per session). The windows of a session depend
+    on each other through the recurrent state, so a batch of requests is run step by
+    step: step t stacks the t-th window of every request that has one.
+    """
+
+    def __init__(self, session: OnnxSession, max_batch_size: int = 32, max_wait: float = 0.005):
+        if 16000 not in session.sample_rates:
+            raise ValueError("VADBatchService requires a 16 kHz Silero model")
+        self.session = session
+        self.scheduler = BatchScheduler(self._run_batch, max_batch_size=max_batch_size, max_wait=max_wait, name="vad")
+        self.sr = np.array(16000, dtype=np.int64)
+        self.steps = 0
+        self.windows = 0
+
+    def register(self) -> BatchedOnnxVAD:
+        return BatchedOnnxVAD(self, self.scheduler.register())
+
+    def _run_batch(self, items: List[Any]) -> List[np.ndarray]:
+        probabilities = [np.empty(len(windows), dtype=np.float32) for _, windows in items]
+        for step in range(max(len(windows) for _, windows in items)):
+            rows = [i for i, (_, windows) in enumerate(items) if len(windows) > step]
+            x = np.empty((len(rows), 64 + 512), dtype=np.float32)
+            state = np.empty((2, len(rows), 128), dtype=np.float32)
+            for row, i in enumerate(rows):
+                vad, windows = items[i]
+                x[row, :64] = vad.context
+                x[row, 64:] = windows[step]
+                state[:, row] = vad.state
+            out, state = self.session.session.run(None, {'input': x, 'state': state, 'sr': self.sr})
+            for row, i in enumerate(rows):
+                vad = items[i][0]
+                vad.state = state[:, row]
+                vad.context = x[row, -64:]
+                probabilities[i][step] = out[row, 0]
+            self.steps += 1
+            self.windows += len(rows)
+        return probabilities
+
+    def close(self):
+        self.scheduler.close()
+
+
+def _get_onnx_model_path(model_path: str = None, opset_version: int = 16, sequence: bool = False) -> Path:
     """Get the path to the ONNX model file."""
     available_ops = [15, 16]
     if opset_version not in available_ops:
         raise Exception(f'Available ONNX opset_version: {available_ops}')
+    if sequence and opset_version != 16:
+        raise Exception('The sequence model is only available with ONNX opset_version 16')
     
     if model_path is None:
         current_dir = Path(__file__).parent
         data_dir = current_dir / 'silero_vad_models'
         
-        if opset_version == 16:
+        if sequence:
+            model_name = 'silero_vad_sequence.onnx'
+        elif opset_version == 16:
             model_name = 'silero_vad.onnx'
         else:
             model_name = f'silero_vad_16k_op{opset_version}.onnx'
@@ -153,11 +317,12 @@ def _get_onnx_model_path(model_path: str = None, opset_version: int = 16) -> Pat
     return model_path
 
 
-def load_onnx_session(model_path: str = None, opset_version: int = 16, force_onnx_cpu: bool = True) -> OnnxSession:
+def load_onnx_session(model_path: str = None, opset_version: int = 16, force_onnx_cpu: bool = True, sequence: bool = False) -> OnnxSession:
     """
-    Load a shared ONNX session for Silero VAD.
+    Load a shared ONNX session for Silero VAD. With `sequence`, the model evaluating
+    several windows per call (see `OnnxSequenceWrapper`).
     """
-    path = _get_onnx_model_path(model_path, opset_version)
+    path = _get_onnx_model_path(model_path, opset_version, sequence)
     return OnnxSession(str(path), force_onnx_cpu=force_onnx_cpu)
 
 
@@ -185,6 +350,40 @@ def load_jit_vad(model_path: str = None):
     return model
 
 
+class EnergyGate:
+    """
+    Energy pre-gate of the VAC: which 512-sample windows are quiet enough for the
+    Silero model to be skipped (their speech probability is taken as 0).
+
+    A window is quiet when its RMS is below `threshold_db` (dBFS) and its zero-crossing
+    rate below `max_zcr`, or when its RMS is `far_below_db` under the threshold whatever
+    its zero-crossing rate: a weak window crossing zero often can be unvoiced speech,
+    while the idle noise of a microphone is either low-frequency (few crossings) or
+    much quieter. Digital silence is always quiet.
+
+    `FixedVADIterator` only skips the windows of a quiet run after its first `hangover`
+    windows, which the model still evaluates: the pauses between words are not skipped,
+    and the model has settled on silence when skipping starts.
+    """
+
+    far_below_db = 10.0
+
+    def __init__(self, threshold_db: float = -60.0, max_zcr: float = 0.25, hangover: int = 16):
+        self.threshold_db = threshold_db
+        self.max_zcr = max_zcr
+        self.hangover = hangover
+        self._max_mean_square = 10 ** (threshold_db / 10)
+        self._far_below_mean_square = 10 ** ((threshold_db - self.far_below_db) / 10)
+
+    def quiet(self, windows: List[np.ndarray]) -> np.ndarray:
+        """Boolean mask of the quiet windows among `windows`, computed on all of them at once."""
+        x = np.stack(windows)
+        mean_square = np.einsum('ij,ij->i', x, x) / x.shape[1]
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (x.shape[1] - 1)
+        return (mean_square < self._far_below_mean_square) | ((mean_square < self._max_mean_square) & (zcr < self.max_zcr))
+
+
 class VADIterator:
     """
     Voice Activity Detection iterator for streaming audio.
@@ -262,7 +461,10 @@ class VADIterator:
         self.current_sample += window_size_samples
 
         speech_prob = self.model(x, self.sampling_rate).item()
+        return self._on_probability(speech_prob, window_size_samples, return_seconds, time_resolution)
 
+    def _on_probability(self, speech_prob: float, window_size_samples: int, return_seconds=False, time_resolution: int = 1):
+        """Speech start/end event, if any, for the window that ends at `current_sample`."""
         if (speech_prob >= self.threshold) and self.temp_end:
             self.temp_end = 0
 
@@ -288,29 +490,165 @@ class VADIterator:
 class FixedVADIterator(VADIterator):
     """
     Fixed VAD Iterator that handles variable-length audio chunks, not only exactly 512 frames at once.
+
+    The windows are read in place from the chunk, only the samples of a window split
+    between two chunks are copied (into `buffer`). With `OnnxWrapper` the windows go
+    to its preallocated input (`probability`); a JIT model gets them in a tensor that
+    shares the memory of a preallocated array.
+
+    With a `gate`, the model is not run on the windows of long quiet runs. When the
+    audio gets louder again, the last skipped window is evaluated first (its
+    probability discarded), so that the model continues from the audio just before the
+    window, as its context and state expect.
     """
 
+    def __init__(self, model, *args, gate: Optional[EnergyGate] = None, **kwargs):
+        self.gate = gate
+        super().__init__(model, *args, **kwargs)
+
     def reset_states(self):
         super().reset_states()
-        self.buffer = np.array([], dtype=np.float32)
+        # samples of the next window, received in the previous chunks
+        self.buffer = np.zeros(512, dtype=np.float32)
+        self.buffered = 0
+        self._window = np.zeros(512, dtype=np.float32)
+        self._window_tensor = None if hasattr(self.model, "probability") else torch.from_numpy(self._window)
+        self.window_count = 0
+        self.skipped_windows = 0
+        self._quiet_run = 0
+        # last skipped window, evaluated before the next window that is not skipped
+        self._skipped = np.zeros(512, dtype=np.float32)
+        self._skipping = False
 
     def __call__(self, x, return_seconds=False):
-        self.buffer = np.append(self.buffer, x)
+        windows, rest = self._windows(x)
+        evaluated, slots = self._gate_windows(windows)
+        if evaluated and isinstance(self.model, OnnxSequenceWrapper):
+            probabilities = self.model.probabilities(evaluated)
+        else:
+            probabilities = [self._probability(window) for window in evaluated]
+        ret = self._on_probabilities(slots, probabilities, return_seconds)
+        self._keep(rest)
+        return ret if ret != {} else None
+
+    def _windows(self, x) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Complete windows of the buffered samples followed by `x`, and the samples left
+        over, to be passed to `_keep` once the windows are evaluated (the first window
+        can be `buffer`).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        windows = []
+        start = 0
+        if self.buffered:
+            start = min(len(x), 512 - self.buffered)
+            self.buffer[self.buffered:self.buffered + start] = x[:start]
+            self.buffered += start
+            if self.buffered < 512:
+                return windows, x[:0]
+            windows.append(self.buffer)
+            self.buffered = 0
+        end = start + (len(x) - start) // 512 * 512
+        windows.extend(x[i:i + 512] for i in range(start, end, 512))
+        return windows, x[end:]
+
+    def _gate_windows(self, windows: List[np.ndarray]) -> Tuple[List[np.ndarray], List[Optional[int]]]:
+        """
+        The windows to evaluate with the model, and for each of `windows` the index of
+        its probability among theirs (None: skipped by the gate).
+        """
+        self.window_count += len(windows)
+        if self.gate is None or not windows:
+            return windows, list(range(len(windows)))
+        evaluated, slots = [], []
+        for window, quiet in zip(windows, self.gate.quiet(windows)):
+            self._quiet_run = self._quiet_run + 1 if quiet else 0
+            if self._quiet_run > self.gate.hangover:
+                self._skipped[:] = window
+                self._skipping = True
+                self.skipped_windows += 1
+                slots.append(None)
+                continue
+            if self._skipping:
+                evaluated.append(self._skipped.copy())
+                self._skipping = False
+            slots.append(len(evaluated))
+            evaluated.append(window)
+        return evaluated, slots
+
+    def _on_probabilities(self, slots: List[Optional[int]], probabilities, return_seconds=False) -> Optional[Dict[str, Any]]:
         ret = None
-        while len(self.buffer) >= 512:
-            r = super().__call__(self.buffer[:512], return_seconds=return_seconds)
-            self.buffer = self.buffer[512:]
-            if ret is None:
-                ret = r
-            elif r is not None:
-                if "end" in r:
-                    ret["end"] = r["end"]
-                if "start" in r:
-                    ret["start"] = r["start"]
-                    if "end" in ret:
-                        del ret["end"]
+        for slot in slots:
+            speech_prob = 0.0 if slot is None else float(probabilities[slot])
+            self.current_sample += 512
+            ret = self._merge_events(ret, self._on_probability(speech_prob, 512, return_seconds))
+        return ret
+
+    def metrics(self) -> Dict[str, Any]:
+        if self.gate is None:
+            return {}
+        return {
+            "windows": self.window_count,
+            "skipped_windows": self.skipped_windows,
+            "skipped_fraction": round(self.skipped_windows / max(1, self.window_count), 3),
+        }
+
+    def _keep(self, rest: np.ndarray):
+        self.buffer[self.buffered:self.buffered + len(rest)] = rest
+        self.buffered += len(rest)
+
+    @torch.no_grad()
+    def _probability(self, window: np.ndarray) -> float:
+        if self._window_tensor is None:
+            return self.model.probability(window)
+        self._window[:] = window
+        return self.model(self._window_tensor, self.sampling_rate).item()
+
+    @staticmethod
+    def _merge_events(ret: Optional[Dict[str, Any]], r: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if ret is None:
+            return r
+        if r is not None:
+            if "end" in r:
+                ret["end"] = r["end"]
+            if "start" in r:
+                ret["start"] = r["start"]
+                if "end" in ret:
+                    del ret["end"]
+        return ret
+
+
+class BatchedVADIterator(FixedVADIterator):
+    """
+    `FixedVADIterator` whose windows are evaluated by a `VADBatchService`, together
+    with the windows of the other sessions. `process` is the awaitable `__call__`.
+    """
+
+    async def process(self, x, return_seconds=False):
+        windows, rest = self._windows(x)
+        evaluated, slots = self._gate_windows(windows)
+        probabilities = []
+        if evaluated:
+            probabilities = await asyncio.wrap_future(self.model.probabilities(evaluated))
+        ret = self._on_probabilities(slots, probabilities, return_seconds)
+        self._keep(rest)
         return ret if ret != {} else None
 
+    def metrics(self) -> Dict[str, Any]:
+        stats = self.model.stats()
+        if stats is None:
+            return super().metrics()
+        return {
+            **super().metrics(),
+            "calls": stats.requests,
+            "mean_wait_seconds": round(stats.mean_delay, 4),
+            "max_wait_seconds": round(stats.max_delay, 4),
+            "batched_with": stats.batched_with,
+        }
+
+    def close(self):
+        self.model.release()
+
 
 if __name__ == "__main__":
     # vad = FixedVADIterator(load_jit_vad())
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+from whisperlivekit.whisper.timing import median_filter
+
+
+class AlignmentAccumulator:
+    """
+    Streaming version of the alignment-head processing of one `AlignAtt.infer` call.
+
+    Each decoder pass hands its cross-attention to `add()`: the rows of the alignment
+    heads are softmaxed once, and the per-frame sums and sums of squares over the token
+    axis are updated (in float64). `last_row()` then normalizes only the last token's
+    row with the statistics of all rows seen so far, median-filters it and averages
+    the heads, which is what re-processing the whole accumulated attention and taking
+    `[:, -1, :]` gives, without the quadratic cost in the number of decoded tokens.
+    """
+
+    def __init__(
+        self,
+        align_source: Dict[int, List[Tuple[int, int]]],
+        num_align_heads: int,
+        single_row: bool = False,
+        selected_heads: bool = False,
+        filter_width: int = 7,
+    ):
+        self.align_source = align_source
+        self.num_align_heads = num_align_heads
+        self.single_row = single_row
+        # the decoder already returned the alignment heads only, in `align_source` order
+        self.selected_heads = selected_heads
+        self.filter_width = filter_width
+        self.n_rows = 0
+        self._sum: Optional[Tensor] = None
+        self._sum_sq: Optional[Tensor] = None
+        self._last: Optional[Tensor] = None
+
+    def _alignment_rows(self, cross_attns: List[Tensor]) -> Optional[Tensor]:
+        """Softmaxed alignment-head attention of one pass: (batch, num_align_heads, seq_len, audio_len)."""
+        heads: List[Optional[Tensor]] = [None] * self.num_align_heads
+        for layer_rank, attn_mat in enumerate(cross_attns):
+            align_heads_in_layer = self.align_source.get(layer_rank, [])
+            if not align_heads_in_layer:
+                continue
+            if attn_mat.dim() == 3:
+                attn_mat = attn_mat.unsqueeze(0)
+            if self.single_row:
+                attn_mat = attn_mat[:1]
+            if not self.selected_heads:
+                attn_mat = attn_mat[:, [head_id for _, head_id in align_heads_in_layer]]
+            attn_mat = F.softmax(attn_mat, dim=-1)
+            for i, (align_head_rank, _) in enumerate(align_heads_in_layer):
+                heads[align_head_rank] = attn_mat[:, i]
+        heads = [h for h in heads if h is not None]
+        if not heads:
+            return None
+        return torch.stack(heads, dim=1)
+
+    def add(self, cross_attns: List[Tensor]):
+        """Accumulate the cross-attention returned by one decoder pass (one tensor per layer)."""
+        rows = self._alignment_rows(cross_attns)
+        if rows is None:
+            return
+        rows64 = rows.double()
+        if self._sum is None:
+            self._sum = rows64.sum(dim=-2, keepdim=True)
+            self._sum_sq = (rows64 * rows64).sum(dim=-2, keepdim=True)
+        else:
+            self._sum += rows64.sum(dim=-2, keepdim=True)
+            self._sum_sq += (rows64 * rows64).sum(dim=-2, keepdim=True)
+        self.n_rows += rows.shape[-2]
+        self._last = rows[:, :, -1:, :]
+
+    def last_row(self, content_mel_len: int, batch_size: int = 1, device=None) -> Tensor:
+        """
+        Normalized, filtered and head-averaged attention of the last token,
+        shape (batch, 1, content_mel_len).
+        """
+        if self._last is None:
+            return torch.zeros(batch_size, 1, content_mel_len, device=device)
+        mean = self._sum / self.n_rows
+        std = (self._sum_sq / self.n_rows - mean * mean).clamp_(min=0).sqrt_()
+        last = ((self._last - mean) / (std + 1e-8)).to(self._last.dtype)
+        last = median_filter(last, self.filter_width)
+        return last.mean(dim=1)[:, :, :content_mel_len]
@@ -3,7 +3,9 @@ import logging
 import os
 import platform
 import sys
+import threading
 from pathlib import Path
+from time import perf_counter
 from typing import List, Optional, Tuple
 
 import numpy as np
@@ -39,11 +41,16 @@ else:
     WhisperModel = None
 
 MIN_DURATION_REAL_SILENCE = 5
+DEGRADED_FRAME_THRESHOLD_FACTOR = 2
 
 class BatchFasterWhisperASR:
     """
     Offline/batch ASR op basis van faster-whisper WhisperModel.
     Los van SimulStreaming/AlignAtt, zodat batch andere decode settings kan hebben.
+
+    `share_model` uses an already loaded WhisperModel of the same `weights_ref` (the
+    fast encoder of SimulStreaming) instead of loading another one. With `lazy`, the
+    model is only loaded by the first transcription.
     """
     def __init__(
         self,
@@ -55,6 +62,7 @@ class BatchFasterWhisperASR:
         condition_on_previous_text: bool = False,
         temperature: float = 0.0,
         initial_prompt: str | None = None,
+        lazy: bool = False,
         #best_of=None,   
         #patience=None,
     ):
@@ -67,12 +75,48 @@ class BatchFasterWhisperASR:
         self.condition_on_previous_text = condition_on_previous_text
         self.temperature = temperature
         self.initial_prompt = initial_prompt
-        self.model = WhisperModel(
-            model,
-            device=device,
-            compute_type=compute_type,
+        self.model_ref = model
+        self.device = device
+        self.compute_type = compute_type
+        self.shared = False
+        self._model = None
+        self._load_lock = threading.Lock()
+        if not lazy:
+            self._model = self._load()
+
+    def _load(self) -> "WhisperModel":
+        return WhisperModel(
+            self.model_ref,
+            device=self.device,
+            compute_type=self.compute_type,
         )
 
+    @property
+    def weights_ref(self) -> tuple:
+        """What the model is loaded from and how, to compare with another WhisperModel."""
+        return (self.model_ref, self.device, self.compute_type)
+
+    def share_model(self, model: "WhisperModel"):
+        """Use `model`, loaded from the same `weights_ref`, instead of loading one."""
+        if self._model is not None and not self.shared:
+            raise RuntimeError("Batch ASR model already loaded, it cannot share another one.")
+        self._model = model
+        self.shared = True
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> "WhisperModel":
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    beg = perf_counter()
+                    self._model = self._load()
+                    logger.info(f"Batch ASR model {self.model_ref} loaded on first use in {perf_counter() - beg:.1f}s")
+        return self._model
+
     def transcribe_text(self, audio_f32: np.ndarray) -> str:
         # faster-whisper verwacht float32 numpy array in [-1,1] (dat heb jij al)
         segments, info = self.model.transcribe(
@@ -102,6 +146,8 @@ class SimulStreamingOnlineProcessor:
         self.committed: List[ASRToken] = []
         self.last_result_tokens: List[ASRToken] = []        
         self.model = self._create_alignatt()
+        # frame threshold requested by `set_degraded`, applied by the next `process_iter`
+        self._frame_threshold = self.model.frame_threshold
         
         # GT Added for debug
         self.logger.debug("=== INITIALIZING STREAMING DECODER ===")
@@ -129,8 +175,22 @@ class SimulStreamingOnlineProcessor:
                 loaded_model=self.asr.shared_model,
                 mlx_encoder=self.asr.mlx_encoder,
                 fw_encoder=self.asr.fw_encoder,
+                encoder_scheduler=getattr(self.asr, "encoder_scheduler", None),
+                decoder_scheduler=getattr(self.asr, "decoder_scheduler", None),
+                draft_model=getattr(self.asr, "shared_draft_model", None),
             )
 
+    def set_degraded(self, degraded: bool):
+        """
+        Cheaper decoding while the transcription queue is congested: the decoder stops
+        DEGRADED_FRAME_THRESHOLD_FACTOR times further from the end of the audio, so fewer
+        tokens are decoded per step (and later committed).
+        """
+        factor = DEGRADED_FRAME_THRESHOLD_FACTOR if degraded else 1
+        # called from the event loop while `process_iter` may be decoding in an executor
+        # thread: the threshold changes between two steps, not within one
+        self._frame_threshold = self.asr.cfg.frame_threshold * factor
+
     def start_silence(self):
         tokens, processed_upto = self.process_iter(is_last=True)
         return tokens, processed_upto
@@ -177,6 +237,7 @@ class SimulStreamingOnlineProcessor:
         
         Returns a tuple: (list of committed ASRToken objects, float representing the audio processed up to time).
         """
+        self.model.frame_threshold = self._frame_threshold
         try:
             timestamped_words = self.model.infer(is_last=is_last)
             
@@ -219,6 +280,12 @@ class SimulStreamingOnlineProcessor:
             return [], self.end
 
 
+    def close(self):
+        """Release the per-session resources held on the shared model."""
+        release = getattr(self.model, "release_batch_sessions", None)
+        if release is not None:
+            release()
+
     def warmup(self, audio, init_prompt=""):
         """Warmup the SimulStreaming model."""
         try:
@@ -312,6 +379,14 @@ class SimulStreamingASR:
                 init_prompt=self.init_prompt,
                 max_context_tokens=self.max_context_tokens,
                 static_init_prompt=self.static_init_prompt,
+                incremental_encoder=self.incremental_encoder,
+                encoder_lookahead=self.encoder_lookahead,
+                encoder_evict_len=self.encoder_evict_len,
+                dynamic_audio_ctx=self.dynamic_audio_ctx,
+                audio_ctx_buckets=self.audio_ctx_buckets,
+                preallocated_kv_cache=self.preallocated_kv_cache,
+                persist_prefix_cache=self.persist_prefix_cache,
+                draft_tokens=self.draft_tokens,
         )  
         
         # Set up tokenizer for translation if needed
@@ -321,7 +396,11 @@ class SimulStreamingASR:
             self.tokenizer = None
 
         self.mlx_encoder, self.fw_encoder, self.mlx_model = None, None, None
+        self.fw_encoder_ref = None
         self.shared_model = None
+        self.shared_draft_model = None
+        self.encoder_scheduler = None
+        self.decoder_scheduler = None
         
         if self.use_full_mlx and HAS_MLX_WHISPER:
             logger.info('MLX Whisper backend used.')
@@ -354,14 +433,23 @@ class SimulStreamingASR:
                 fw_model = str(self._resolved_model_path)
             else:
                 fw_model = self.model_name
+            fw_device, fw_compute_type = 'auto', 'auto'
             self.fw_encoder = WhisperModel(
                 fw_model,
-                device='auto',
-                compute_type='auto',
+                device=fw_device,
+                compute_type=fw_compute_type,
             )
+            # what the encoder was loaded from, to share it with a batch model of the same weights
+            self.fw_encoder_ref = (fw_model, fw_device, fw_compute_type)
             self.shared_model = self.load_model()
         else:
             self.shared_model = self.load_model()
+
+        if self.draft_model:
+            if self.shared_model is None:
+                logger.warning("--draft-model is not supported with the full MLX backend, ignoring it.")
+            else:
+                self.shared_draft_model = self.load_draft_model()
     
     def _warmup_mlx_model(self):
         """Warmup the full MLX model."""
@@ -424,6 +512,7 @@ class SimulStreamingASR:
             decoder_only=self.fast_encoder,
             custom_alignment_heads=self.custom_alignment_heads,
             lora_path=lora_path,
+            mmap_weights=self.mmap_weights,
         )
         warmup_audio = load_file(self.warmup_file)
         if warmup_audio is not None:
@@ -440,6 +529,54 @@ class SimulStreamingASR:
                 whisper_model.transcribe(warmup_audio, language=self.lan if self.lan != 'auto' else None)
         return whisper_model
 
+    def load_draft_model(self):
+        """
+        Draft model of speculative decoding. Without the encoder when it can read the
+        features of the main encoder (same audio dimensions), else with its own.
+        """
+        main_dims = self.shared_model.dims
+
+        def shares_encoder(dims):
+            return (dims.n_audio_state, dims.n_audio_ctx) == (main_dims.n_audio_state, main_dims.n_audio_ctx)
+
+        # one load: the checkpoint's dimensions decide whether the encoder is kept
+        draft_model = load_model(
+            name=self.draft_model, download_root=None, decoder_only=shares_encoder, mmap_weights=self.mmap_weights
+        )
+        logger.info(
+            f"Draft model {self.draft_model} loaded "
+            f"({'shared encoder features' if not hasattr(draft_model, 'encoder') else 'own encoder'})."
+        )
+        return draft_model
+
+    def encode_batch(self, mels: list) -> list:
+        """
+        One encoder forward pass for the padded mels of several sessions (one per mel length
+        with dynamic_audio_ctx). Each mel has a batch dimension of 1; returns one
+        (1, n_audio_ctx, n_audio_state) tensor per mel.
+        """
+        device = self.shared_model.device
+        if self.fw_encoder is not None:
+            features = self.fw_encoder.encode(np.concatenate(mels, axis=0))
+            if device.type == 'cpu':
+                features = np.array(features)
+            try:
+                features = torch.as_tensor(features, device=device)
+            except TypeError:
+                features = torch.as_tensor(np.array(features), device=device)
+            return list(features.split(1, dim=0))
+        # with dynamic_audio_ctx, mels of different lengths are encoded in separate passes
+        by_length = {}
+        for i, mel in enumerate(mels):
+            by_length.setdefault(mel.shape[-1], []).append(i)
+        features = [None] * len(mels)
+        with torch.no_grad():
+            for indices in by_length.values():
+                encoded = self.shared_model.encoder(torch.cat([mels[i] for i in indices], dim=0))
+                for i, feature in zip(indices, encoded.split(1, dim=0)):
+                    features[i] = feature
+        return features
+
     def set_translate_task(self):
         """Set up translation task."""
         if self.cfg.language == 'auto':
@@ -0,0 +1,170 @@
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRequest:
+    session_id: int
+    item: Any
+    enqueued_at: float = field(default_factory=perf_counter)
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class QueueDelayStats:
+    """Time spent by the requests of one session waiting for their batch."""
+    requests: int = 0
+    total_delay: float = 0.0
+    max_delay: float = 0.0
+    last_delay: float = 0.0
+    batched_with: int = 0
+    active: bool = True
+
+    def add(self, delay: float, batch_size: int):
+        self.requests += 1
+        self.total_delay += delay
+        self.max_delay = max(self.max_delay, delay)
+        self.last_delay = delay
+        self.batched_with += batch_size - 1
+
+    @property
+    def mean_delay(self) -> float:
+        return self.total_delay / self.requests if self.requests else 0.0
+
+
+class BatchScheduler:
+    """
+    Collects the requests of all live sessions sharing one model and runs them as a
+    single batched forward pass.
+
+    Sessions call `submit(session_id, item)` from their worker thread and block until
+    their own result is ready. A batch is closed when `max_batch_size` requests are
+    collected, when every active session has a pending request, or `max_wait` seconds
+    after its first request arrived, whichever comes first.
+    `run_batch` receives the list of items and returns one result per item.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.03,
+        name: str = "batch",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.name = name
+        self._requests: "queue.Queue[Optional[BatchRequest]]" = queue.Queue()
+        self._session_ids = itertools.count()
+        self._sessions: Dict[int, QueueDelayStats] = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_requests = 0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def register(self, active: bool = True) -> int:
+        """
+        Declare a new live session. Returns its id, to be passed to `submit`.
+        Only active sessions are waited for when a batch is collected.
+        """
+        with self._lock:
+            session_id = next(self._session_ids)
+            self._sessions[session_id] = QueueDelayStats(active=active)
+        return session_id
+
+    def set_active(self, session_id: int, active: bool):
+        with self._lock:
+            stats = self._sessions.get(session_id)
+            if stats is not None:
+                stats.active = active
+
+    def release(self, session_id: int) -> Optional[QueueDelayStats]:
+        """Forget a session, returning its queueing delay statistics."""
+        with self._lock:
+            stats = self._sessions.pop(session_id, None)
+        if stats is not None and stats.requests:
+            logger.info(
+                f"{self.name.capitalize()} queue delay for session {session_id}: mean {stats.mean_delay * 1000:.1f}ms, "
+                f"max {stats.max_delay * 1000:.1f}ms over {stats.requests} requests"
+            )
+        return stats
+
+    def session_stats(self, session_id: int) -> Optional[QueueDelayStats]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def submit(self, session_id: int, item: Any) -> Any:
+        """Queue `item` for the next batch and wait for its result."""
+        return self.submit_future(session_id, item).result()
+
+    def submit_future(self, session_id: int, item: Any) -> Future:
+        """Queue `item` for the next batch without waiting, for callers on an event loop."""
+        request = BatchRequest(session_id=session_id, item=item)
+        self._requests.put(request)
+        return request.future
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join(timeout=5)
+
+    def _active_sessions(self) -> int:
+        with self._lock:
+            return sum(1 for stats in self._sessions.values() if stats.active)
+
+    def _collect(self, first: BatchRequest) -> List[BatchRequest]:
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size and len(batch) < self._active_sessions():
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            started_at = perf_counter()
+            try:
+                results = self.run_batch([request.item for request in batch])
+            except Exception as e:
+                logger.exception(f"Batched {self.name} call failed for {len(batch)} requests: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            delays = []
+            with self._lock:
+                for request in batch:
+                    delay = started_at - request.enqueued_at
+                    delays.append(delay)
+                    stats = self._sessions.get(request.session_id)
+                    if stats is not None:
+                        stats.add(delay, len(batch))
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+            logger.debug(
+                f"{self.name.capitalize()} batch of {len(batch)} in {perf_counter() - started_at:.3f}s, queue delays "
+                + ", ".join(f"{r.session_id}: {d * 1000:.1f}ms" for r, d in zip(batch, delays))
+            )
@@ -0,0 +1,250 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+from whisperlivekit.whisper.model import (SDPA_AVAILABLE, MultiHeadAttention,
+                                          TextDecoder, scaled_dot_product_attention)
+
+
+@dataclass
+class DecoderRequest:
+    """One session's decoder call: new tokens, its audio features and its own kv_cache dict."""
+    tokens: Tensor
+    audio_features: Tensor
+    kv_cache: dict
+    return_cross_attn: bool = False
+    alignment_heads: Optional[Dict[int, List[int]]] = None
+
+
+def _cache_offset(decoder: TextDecoder, kv_cache: dict) -> int:
+    first_self_attn_key = decoder.blocks[0].attn.key_cache_id
+    if kv_cache and first_self_attn_key in kv_cache:
+        return kv_cache[first_self_attn_key].shape[1]
+    return 0
+
+
+def _masked_attention(
+    attn: MultiHeadAttention, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor]
+) -> Tuple[Tensor, Tensor]:
+    """MultiHeadAttention.qkv_attention with a per-row additive mask of shape (batch, 1, n_ctx, n_keys)."""
+    n_batch, n_ctx, n_state = q.shape
+    scale = (n_state // attn.n_head) ** -0.25
+    q = q.view(*q.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    v = v.view(*v.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+
+    qk = (q * scale) @ (k * scale).transpose(-1, -2)
+    if mask is not None:
+        qk = qk + mask
+    qk = qk.float()
+
+    w = F.softmax(qk, dim=-1).to(q.dtype)
+    out = (w @ v).permute(0, 2, 1, 3).flatten(start_dim=2)
+    return out, qk.detach()
+
+
+def _prepared_attention(
+    attn: MultiHeadAttention, q: Tensor, k_t: Tensor, v: Tensor, mask: Optional[Tensor]
+) -> Tuple[Tensor, Tensor]:
+    """Same as `_masked_attention`, with keys/values already split by head (see `_stacked_cross_kv`)."""
+    n_batch, n_ctx, n_state = q.shape
+    scale = (n_state // attn.n_head) ** -0.25
+    q = q.view(*q.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+
+    qk = (q * scale) @ k_t
+    if mask is not None:
+        qk = qk + mask
+    qk = qk.float()
+
+    w = F.softmax(qk, dim=-1).to(q.dtype)
+    out = (w @ v).permute(0, 2, 1, 3).flatten(start_dim=2)
+    return out, qk.detach()
+
+
+def _selected_heads_attention(
+    attn: MultiHeadAttention, q: Tensor, k: Tensor, v: Tensor, k_t_heads: Optional[Tensor],
+    heads: List[int], mask: Optional[Tensor]
+) -> Tuple[Tensor, Optional[Tensor]]:
+    """
+    SDPA over every head, keys/values split by head as (rows, n_head, audio, head_dim), and
+    qk logits only for `heads`, whose pre-scaled keys are `k_t_heads` (see `_stacked_cross_kv`).
+    """
+    n_batch, n_ctx, n_state = q.shape
+    scale = (n_state // attn.n_head) ** -0.25
+    q = q.view(*q.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    out = scaled_dot_product_attention(q, k, v, attn_mask=mask).permute(0, 2, 1, 3).flatten(start_dim=2)
+    if not heads:
+        return out, None
+    qk = (q[:, heads] * scale) @ k_t_heads
+    if mask is not None:
+        qk = qk + mask
+    return out, qk.float().detach()
+
+
+def _cross_attn_kv(attn: MultiHeadAttention, xa: Tensor, kv_cache: dict) -> Tuple[Tensor, Tensor]:
+    if attn.key_cache_id in kv_cache:
+        return kv_cache[attn.key_cache_id], kv_cache[attn.value_cache_id]
+    k = attn.key(xa)
+    v = attn.value(xa)
+    kv_cache[attn.key_cache_id] = k
+    kv_cache[attn.value_cache_id] = v
+    return k, v
+
+
+class BatchedDecoder:
+    """
+    Runs the decoder calls of several sessions as one forward pass.
+
+    Each request keeps its own number of rows (beams), number of new tokens, self-attention
+    cache length and audio length: tokens are right-padded, keys are padded per row and
+    masked by absolute position, and audio frames past each request's length are masked.
+    Every request's kv_cache dict is updated exactly as `TextDecoder.forward` would.
+
+    The stacked cross-attention keys/values are kept while the same sessions are batched
+    together with the same audio features, which is the case for every token of a chunk.
+    When the requests ask for their alignment heads only, the cross-attention of the other
+    heads goes through SDPA, as in `TextDecoder.forward(alignment_heads=...)`.
+    """
+
+    def __init__(self, decoder: TextDecoder):
+        self.decoder = decoder
+        self._cross_kv: dict = {}
+
+    def _stacked_cross_kv(self, layer: int, cross: MultiHeadAttention, requests, rows, n_audio, like: Tensor,
+                          heads: Optional[List[int]]):
+        """
+        Cross-attention keys/values of all requests, stacked by rows and laid out for
+        batched matmuls. Without `heads`: keys pre-scaled as (rows, n_head, head_dim, audio),
+        values as (rows, n_head, audio, head_dim), and None. With `heads`: keys and values as
+        (rows, n_head, audio, head_dim) for SDPA, and the pre-scaled keys of `heads` as
+        (rows, len(heads), head_dim, audio). All contiguous.
+        """
+        per_request = [_cross_attn_kv(cross, r.audio_features, r.kv_cache) for r in requests]
+        row_counts = [sl.stop - sl.start for sl in rows]
+        cached = self._cross_kv.get(layer)
+        if (
+            cached is not None
+            and len(cached[0]) == len(per_request)
+            and all(a[0] is b[0] for a, b in zip(cached[0], per_request))
+            and cached[1] == row_counts
+            and cached[2] == heads
+        ):
+            return cached[3]
+        total_rows, max_audio, n_state = rows[-1].stop, max(n_audio), like.shape[-1]
+        keys = like.new_zeros(total_rows, max_audio, n_state)
+        values = like.new_zeros(total_rows, max_audio, n_state)
+        for (k, v), sl, n in zip(per_request, rows, n_audio):
+            keys[sl, :n] = k
+            values[sl, :n] = v
+        scale = (n_state // cross.n_head) ** -0.25
+        keys = keys.view(total_rows, max_audio, cross.n_head, -1)
+        values = values.view(total_rows, max_audio, cross.n_head, -1).permute(0, 2, 1, 3).contiguous()
+        if heads is None:
+            stacked = ((keys * scale).permute(0, 2, 3, 1).contiguous(), values, None)
+        else:
+            heads_keys = (keys[:, :, heads] * scale).permute(0, 2, 3, 1).contiguous() if heads else None
+            stacked = (keys.permute(0, 2, 1, 3).contiguous(), values, heads_keys)
+        self._cross_kv[layer] = (per_request, row_counts, heads, stacked)
+        return stacked
+
+    @torch.no_grad()
+    def __call__(self, requests: List[DecoderRequest]) -> list:
+        """
+        Returns, for each request, what `decoder(tokens, audio_features, kv_cache, return_cross_attn)`
+        returns: logits, or (logits, cross_attns) with one qk tensor per layer.
+        """
+        decoder = self.decoder
+        if len(requests) == 1:
+            r = requests[0]
+            return [decoder(
+                r.tokens, r.audio_features, kv_cache=r.kv_cache,
+                return_cross_attn=r.return_cross_attn, alignment_heads=r.alignment_heads,
+            )]
+
+        device = requests[0].tokens.device
+        dtype = requests[0].audio_features.dtype
+        n_new = [r.tokens.shape[1] for r in requests]
+        offsets = [_cache_offset(decoder, r.kv_cache) for r in requests]
+        n_audio = [r.audio_features.shape[1] for r in requests]
+        rows = []
+        start = 0
+        for r in requests:
+            rows.append(slice(start, start + r.tokens.shape[0]))
+            start += r.tokens.shape[0]
+        total_rows, max_new, max_audio = start, max(n_new), max(n_audio)
+        # sessions of one model share their alignment heads
+        alignment_heads = requests[0].alignment_heads
+        if any(r.alignment_heads != alignment_heads for r in requests):
+            alignment_heads = None
+        elif alignment_heads is not None and not SDPA_AVAILABLE:
+            alignment_heads = None
+        key_len = max(o + n for o, n in zip(offsets, n_new))
+
+        tokens = torch.zeros(total_rows, max_new, dtype=torch.long, device=device)
+        query_pos = torch.zeros(total_rows, max_new, dtype=torch.long, device=device)
+        steps = torch.arange(max_new, device=device)
+        for r, sl, offset in zip(requests, rows, offsets):
+            tokens[sl, :r.tokens.shape[1]] = r.tokens
+            query_pos[sl] = offset + steps
+
+        x = decoder.token_embedding(tokens) + decoder.positional_embedding[query_pos.clamp(max=decoder.n_ctx - 1)]
+        x = x.to(dtype)
+
+        # a query at absolute position p sees the keys at positions <= p of its own session
+        key_pos = torch.arange(key_len, device=device)
+        self_mask = torch.zeros(total_rows, 1, max_new, key_len, device=device, dtype=dtype)
+        self_mask.masked_fill_(key_pos[None, None, None, :] > query_pos[:, None, :, None], -float("inf"))
+        cross_mask = None
+        if any(n != max_audio for n in n_audio):
+            cross_mask = torch.zeros(total_rows, 1, 1, max_audio, device=device, dtype=dtype)
+            for sl, n in zip(rows, n_audio):
+                cross_mask[sl, :, :, n:] = -float("inf")
+
+        cross_attns = [[] for _ in requests]
+        for layer, block in enumerate(decoder.blocks):
+            attn = block.attn
+            h = block.attn_ln(x)
+            q = attn.query(h)
+            k_new = attn.key(h)
+            v_new = attn.value(h)
+            keys = x.new_zeros(total_rows, key_len, k_new.shape[-1])
+            values = x.new_zeros(total_rows, key_len, v_new.shape[-1])
+            for r, sl, n in zip(requests, rows, n_new):
+                k, v = attn._update_self_attn_cache(k_new[sl, :n], v_new[sl, :n], r.kv_cache)
+                keys[sl, :k.shape[1]] = k
+                values[sl, :v.shape[1]] = v
+            wv, _ = _masked_attention(attn, q, keys, values, self_mask)
+            x = x + attn.out(wv)
+
+            cross = block.cross_attn
+            q = cross.query(block.cross_attn_ln(x))
+            heads = None if alignment_heads is None else alignment_heads.get(layer, [])
+            keys, values, heads_keys = self._stacked_cross_kv(layer, cross, requests, rows, n_audio, q, heads)
+            if heads is None:
+                wv, qk = _prepared_attention(cross, q, keys, values, cross_mask)
+            else:
+                wv, qk = _selected_heads_attention(cross, q, keys, values, heads_keys, heads, cross_mask)
+            x = x + cross.out(wv)
+            for i, (r, sl, n, a) in enumerate(zip(requests, rows, n_new, n_audio)):
+                if qk is None:
+                    cross_attns[i].append(None)
+                elif heads is None and r.alignment_heads is not None:
+                    # alignment heads could not be selected for the whole batch
+                    layer_heads = r.alignment_heads.get(layer, [])
+                    cross_attns[i].append(qk[sl, layer_heads, :n, :a] if layer_heads else None)
+                else:
+                    cross_attns[i].append(qk[sl, :, :n, :a])
+
+            x = x + block.mlp(block.mlp_ln(x))
+
+        x = decoder.ln(x)
+        logits = (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+        results = []
+        for i, (r, sl, n) in enumerate(zip(requests, rows, n_new)):
+            request_logits = logits[sl, :n]
+            results.append((request_logits, cross_attns[i]) if r.return_cross_attn else request_logits)
+        return results
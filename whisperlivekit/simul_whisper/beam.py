@@ -1,6 +1,9 @@
+from typing import Dict, List, Optional
+
 from torch import Tensor
 
 from whisperlivekit.whisper.decoding import PyTorchInference
+from whisperlivekit.whisper.kv_cache import SlabKVCache
 
 
 class BeamPyTorchInference(PyTorchInference):
@@ -14,6 +17,9 @@ class BeamPyTorchInference(PyTorchInference):
 
     def rearrange_kv_cache(self, source_indices):
         if source_indices != list(range(len(source_indices))):
+            if isinstance(self.kv_cache, SlabKVCache):
+                self.kv_cache.rearrange(self._kv_cache_ids(), source_indices)
+                return
             for cache_id in self._kv_cache_ids():
                 if cache_id in self.kv_cache:
                     self.kv_cache[cache_id] = self.kv_cache[cache_id][source_indices].detach()
@@ -23,10 +29,12 @@ class BeamPyTorchInference(PyTorchInference):
         tokens: Tensor, 
         audio_features: Tensor,
         return_cross_attn: bool = False,
+        alignment_heads: Optional[Dict[int, List[int]]] = None,
     ):
         """Get logits, optionally returning cross-attention weights."""
         return self.model.decoder(
             tokens, audio_features, 
             kv_cache=self.kv_cache,
             return_cross_attn=return_cross_attn,
+            alignment_heads=alignment_heads,
         )
\ No newline at end of file
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Literal
+from typing import List, Literal
 
 
 @dataclass
@@ -21,4 +21,12 @@ class AlignAttConfig():
     init_prompt: str = field(default=None)
     static_init_prompt: str = field(default=None)
     max_context_tokens: int = field(default=None)
+    incremental_encoder: bool = False
+    encoder_lookahead: float = field(default=2.0, metadata = {"help": "in second"})
+    encoder_evict_len: float = field(default=5.0, metadata = {"help": "in second"})
+    dynamic_audio_ctx: bool = False
+    audio_ctx_buckets: List[float] = field(default_factory=lambda: [5.0, 10.0, 15.0, 20.0, 30.0], metadata = {"help": "in second"})
+    preallocated_kv_cache: bool = False
+    persist_prefix_cache: bool = False
+    draft_tokens: int = 4
     
\ No newline at end of file
@@ -2,11 +2,15 @@ from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple
 import torch
 
+from whisperlivekit.whisper.kv_cache import SlabKVCache
+
 
 @dataclass
 class DecoderState:
 
     kv_cache: Dict[str, torch.Tensor] = field(default_factory=dict)
+    # token ids of the prompt prefix whose self-attention entries are kept across infer calls
+    prefix_cache_ids: List[int] = field(default_factory=list)
     
     tokenizer: Any = None
     detected_language: Optional[str] = None
@@ -19,6 +23,8 @@ class DecoderState:
     
     align_source: Dict[int, List[Tuple[int, int]]] = field(default_factory=dict)
     num_align_heads: int = 0
+    # alignment head ids by decoder layer, the only cross-attention heads the decoder returns
+    alignment_heads: Dict[int, List[int]] = field(default_factory=dict)
     
     segments: List[torch.Tensor] = field(default_factory=list)
     
@@ -47,12 +53,43 @@ class DecoderState:
     
     def clean_cache(self):
         """Clean the kv_cache after each inference step."""
-        self.kv_cache = {}
+        if isinstance(self.kv_cache, SlabKVCache):
+            # keep the preallocated slabs for the next step
+            self.kv_cache.clear()
+        else:
+            self.kv_cache = {}
         if self.decoder_type == "beam" and self.inference is not None:
             self.inference.kv_cache = self.kv_cache
             if self.token_decoder is not None:
                 self.token_decoder.reset()
     
+    def keep_cache_prefix(self, length: int, self_attn_cache_ids: List[str]):
+        """
+        Clean the kv_cache after an inference step, except the first `length` positions
+        of the self-attention entries. Cross-attention entries depend on the encoder
+        features and are always dropped.
+        """
+        if length <= 0:
+            self.clean_cache()
+            return
+        kept = {
+            cache_id: self.kv_cache[cache_id]
+            for cache_id in self_attn_cache_ids
+            if cache_id in self.kv_cache
+        }
+        if isinstance(self.kv_cache, SlabKVCache):
+            for cache_id in list(self.kv_cache):
+                if cache_id in kept:
+                    self.kv_cache.truncate(cache_id, length)
+                else:
+                    del self.kv_cache[cache_id]
+        else:
+            self.kv_cache = {cache_id: value[:, :length] for cache_id, value in kept.items()}
+        if self.decoder_type == "beam" and self.inference is not None:
+            self.inference.kv_cache = self.kv_cache
+            if self.token_decoder is not None:
+                self.token_decoder.reset()
+
     def reset(self, rewind_threshold: int = 200):
         """
         Reset transient state for a new segment.
@@ -75,6 +112,9 @@ class DecoderState:
         self.reset(rewind_threshold)
         self.segments = []
         self.tokens = []
-        self.kv_cache = {}
+        if isinstance(self.kv_cache, SlabKVCache):
+            self.kv_cache.clear()
+        else:
+            self.kv_cache = {}
         self.first_timestamp = None
 
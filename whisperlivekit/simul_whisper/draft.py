@@ -0,0 +1,132 @@
+import logging
+from typing import Dict, List, Optional
+
+import torch
+
+from whisperlivekit.whisper import tokenizer as whisper_tokenizer
+from whisperlivekit.whisper.audio import (N_FRAMES, N_SAMPLES,
+                                          log_mel_spectrogram, pad_or_trim)
+
+logger = logging.getLogger(__name__)
+
+
+class DraftDecoder:
+    """
+    Per-session greedy proposals of a smaller Whisper, verified by AlignAtt's decoder
+    (speculative decoding, `--draft-model`).
+
+    `propose(tokens, main_tokenizer, n)` continues the main model's tokens with up to `n`
+    greedy draft tokens, and stops at the first special token. Text tokens have the same
+    ids in both vocabularies; the special tokens of the prompt are mapped by name. The draft
+    keeps its own kv_cache during an infer call, reused for the longest common prefix of the
+    tokens it was already fed; `start()` drops it when the audio changes.
+
+    A draft loaded without its encoder (same audio dimensions as the main model, e.g.
+    distilled or pruned-decoder models) reads the main encoder features. Otherwise its own
+    encoder runs on the audio, lazily at the first proposal of a call.
+    """
+
+    def __init__(self, model, n_tokens: int = 4):
+        self.model = model
+        self.n_tokens = n_tokens
+        self.shares_encoder = not hasattr(model, "encoder")
+        self.kv_cache: dict = {}
+        self._fed: List[int] = []
+        self._audio: Optional[torch.Tensor] = None
+        self._main_features: Optional[torch.Tensor] = None
+        self._features: Optional[torch.Tensor] = None
+        self._main_tokenizer = None
+        self._to_draft: Optional[Dict[int, int]] = None
+        self.proposed = 0
+        self.accepted = 0
+
+    def start(self, audio: torch.Tensor, main_features: torch.Tensor):
+        """New infer call: drop the draft cache, its features are computed at the first proposal."""
+        self.kv_cache = {}
+        self._fed = []
+        self._audio = audio
+        self._main_features = main_features
+        self._features = None
+
+    def _audio_features(self) -> torch.Tensor:
+        if self._features is None:
+            if self.shares_encoder:
+                self._features = self._main_features
+            else:
+                mel = log_mel_spectrogram(
+                    self._audio, n_mels=self.model.dims.n_mels, padding=N_SAMPLES, device=self.model.device
+                )
+                self._features = self.model.encoder(pad_or_trim(mel, N_FRAMES).unsqueeze(0))
+        return self._features
+
+    def _special_token_map(self, main_tokenizer) -> Optional[Dict[int, int]]:
+        """Main special token id -> draft special token id, None if the draft cannot handle this prompt."""
+        if main_tokenizer is not self._main_tokenizer:
+            self._main_tokenizer = main_tokenizer
+            try:
+                draft_tokenizer = whisper_tokenizer.get_tokenizer(
+                    multilingual=self.model.is_multilingual,
+                    num_languages=self.model.num_languages,
+                    language=main_tokenizer.language,
+                    task=main_tokenizer.task,
+                )
+            except (KeyError, ValueError):
+                logger.warning(f"Draft model does not support language {main_tokenizer.language}, not drafting.")
+                self._to_draft = None
+            else:
+                self._to_draft = {
+                    token_id: draft_tokenizer.special_tokens[name]
+                    for name, token_id in main_tokenizer.special_tokens.items()
+                    if name in draft_tokenizer.special_tokens
+                }
+        return self._to_draft
+
+    def _truncate(self, length: int):
+        for block in self.model.decoder.blocks:
+            for cache_id in (block.attn.key_cache_id, block.attn.value_cache_id):
+                if cache_id in self.kv_cache:
+                    if length:
+                        self.kv_cache[cache_id] = self.kv_cache[cache_id][:, :length]
+                    else:
+                        del self.kv_cache[cache_id]
+        self._fed = self._fed[:length]
+
+    @torch.no_grad()
+    def propose(self, tokens: List[int], main_tokenizer, n: int) -> List[int]:
+        """Up to `n` text tokens expected after `tokens` (main vocabulary ids)."""
+        to_draft = self._special_token_map(main_tokenizer)
+        if to_draft is None or n <= 0:
+            return []
+        eot = main_tokenizer.eot
+        draft_tokens = []
+        for token in tokens:
+            if token < eot:
+                draft_tokens.append(token)
+            elif token in to_draft:
+                draft_tokens.append(to_draft[token])
+            else:
+                return []
+        n = min(n, self.model.dims.n_text_ctx - len(draft_tokens))
+        if n <= 0:
+            return []
+
+        # keep the cached positions shared with these tokens, at least the last token is fed
+        common = 0
+        limit = min(len(self._fed), len(draft_tokens) - 1)
+        while common < limit and self._fed[common] == draft_tokens[common]:
+            common += 1
+        self._truncate(common)
+
+        features = self._audio_features()
+        x = torch.tensor([draft_tokens[common:]], device=features.device)
+        proposed = []
+        for _ in range(n):
+            logits = self.model.decoder(x, features, kv_cache=self.kv_cache)
+            self._fed += x[0].tolist()
+            token = int(logits[0, -1].argmax())
+            if token >= eot:
+                break
+            proposed.append(token)
+            x = torch.tensor([[token]], device=features.device)
+        self.proposed += len(proposed)
+        return proposed
@@ -21,45 +21,93 @@ def load_cif(cfg, n_audio_state, device):
     return cif_linear, always_fire, never_fire
 
 
+def _row_sums(x, lengths=None):
+    """
+    Sum of each row over its first `lengths` values, reduced as that row alone would be:
+    a reduction over a row padded with zeros can round differently.
+    """
+    if lengths is None:
+        return x.sum(-1)
+    return torch.stack([x[i, :n].sum() for i, n in enumerate(lengths.tolist())])
+
+
 # from https://github.com/dqqcasia/mosst/blob/master/fairseq/models/speech_to_text/convtransformer_wav2vec_cif.py
-def resize(alphas, target_lengths, threshold=0.999):
+def resize(alphas, target_lengths, threshold=0.999, lengths=None):
     """
     alpha in thresh=1.0 | (0.0, +0.21)
     target_lengths: if None, apply round and resize, else apply scaling
+    lengths: content length of each row, when the rows are padded with zeros
+
+    Closed form of the original rounds over `torch.where(_alphas > threshold)`. A
+    smoothing halves a row and pulls it towards its mean: it keeps the row sum and its
+    zeros, so k smoothings give `0.5**k * a + (1 - 0.5**k) * mean * mask`. The rounds
+    smooth a row as long as one of its values still reaches the threshold, so k is the
+    number of smoothings that brings the row maximum below it (each round smooths at
+    least once, so within the original 10 rounds when k <= 10; beyond, the row is within
+    2**-10 of its mean either way). A row whose mean is above the threshold never gets
+    there: it is set to its mean.
     """
     # sum
-    _num = alphas.sum(-1)
+    _num = _row_sums(alphas, lengths)
     num = target_lengths.float()
     # scaling
     _alphas = alphas * (num / _num)[:, None].repeat(1, alphas.size(1))
+    mask = _alphas.ne(0).float()
+    mean = _row_sums(_alphas, lengths) / mask.sum(-1)
+    peak = _alphas.max(-1).values
     # rm attention value that exceeds threashold
-    count = 0
-    while len(torch.where(_alphas > threshold)[0]):
-        count += 1
-        if count > 10:
-            break
-        xs, ys = torch.where(_alphas > threshold)
-        for x, y in zip(xs, ys):
-            if _alphas[x][y] >= threshold:
-                mask = _alphas[x].ne(0).float()
-                mean = 0.5 * _alphas[x].sum() / mask.sum()
-                _alphas[x] = _alphas[x] * 0.5 + mean * mask
+    smoothed = peak > threshold
+    converges = mean < threshold
+    ratio = (peak - mean) / (threshold - mean)
+    smoothings = torch.where(smoothed & converges, torch.log2(ratio.clamp(min=1.0)).ceil(), torch.zeros_like(peak))
+    # the rounding of log2 can be off by one at exact powers of two: settle on the peak itself
+    above = smoothed & converges & (0.5 ** smoothings * (peak - mean) + mean > threshold)
+    below = smoothed & converges & (smoothings > 1) & (0.5 ** (smoothings - 1) * (peak - mean) + mean <= threshold)
+    smoothings = smoothings + above.float() - below.float()
+    decay = torch.where(smoothed & ~converges, torch.zeros_like(peak), 0.5 ** smoothings)
+    _alphas = decay[:, None] * _alphas + (1 - decay)[:, None] * mean[:, None] * mask
 
     return _alphas, _num
- 
+
+
+def fire_at_boundary_batch(encoder_features: torch.Tensor, cif_linear, lengths=None, threshold=0.999):
+    """
+    End-of-word test of `fire_at_boundary` for a batch of sessions.
+    encoder_features: (B, T, D), lengths: content frames of each row (default: T).
+    Returns a (B,) bool tensor.
+    """
+    n_batch, n_frames = encoder_features.shape[:2]
+    device = encoder_features.device
+    if n_batch == 1 and lengths is None:
+        # a single session: the batched reductions are those of the session alone
+        alphas = torch.sigmoid(cif_linear(encoder_features).squeeze(dim=2))
+        row_lengths = None
+        lengths = torch.full((1,), n_frames, device=device)
+    else:
+        if lengths is None:
+            lengths = torch.full((n_batch,), n_frames, device=device)
+        lengths = row_lengths = torch.as_tensor(lengths, device=device)
+        # the reductions (the projection, the sums) are made per session, as for that
+        # session alone: batched ones can round differently, and flip a decision at a tie
+        alphas = encoder_features.new_zeros(n_batch, n_frames)
+        for i, n in enumerate(lengths.tolist()):
+            alphas[i, :n] = torch.sigmoid(cif_linear(encoder_features[i:i + 1, :n]).squeeze(dim=2))[0]
+    positions = torch.arange(n_frames, device=device)
+    decode_length = torch.round(_row_sums(alphas, row_lengths)).int()
+    alphas, _ = resize(alphas, decode_length, threshold, row_lengths)
+    # ignore the peak value at the end of the content chunk
+    integrated_frames = positions[None, :] < (lengths - 1)[:, None]
+    integrate = torch.cumsum(alphas * integrated_frames, dim=1)
+    last = (lengths - 2).clamp(min=0)
+    exceed_count = integrate.gather(1, last[:, None]) // threshold
+    integrate = integrate - exceed_count * 1.0  # minus 1 every time intergrate exceed the threshold
+    important = (integrate >= 0) & integrated_frames
+    first_important = important.int().argmax(-1)
+    return important.any(-1) & (first_important >= lengths - 2)
+
+
 def fire_at_boundary(chunked_encoder_feature: torch.Tensor, cif_linear):
     content_mel_len = chunked_encoder_feature.shape[1] # B, T, D
-    alphas = cif_linear(chunked_encoder_feature).squeeze(dim=2) # B, T
-    alphas = torch.sigmoid(alphas)
-    decode_length = torch.round(alphas.sum(-1)).int()
-    alphas, _ = resize(alphas, decode_length)
-    alphas = alphas.squeeze(0) # (T, )
-    threshold = 0.999
-    integrate = torch.cumsum(alphas[:-1], dim=0) # ignore the peak value at the end of the content chunk
-    exceed_count = integrate[-1] // threshold
-    integrate = integrate - exceed_count*1.0 # minus 1 every time intergrate exceed the threshold
-    important_positions = (integrate >= 0).nonzero(as_tuple=True)[0]
-    if important_positions.numel() == 0:
+    if content_mel_len < 2:
         return False
-    else:
-        return important_positions[0] >= content_mel_len-2
\ No newline at end of file
+    return bool(fire_at_boundary_batch(chunked_encoder_feature[:1], cif_linear)[0])
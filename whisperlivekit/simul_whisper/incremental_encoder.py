@@ -0,0 +1,265 @@
+import logging
+from typing import List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from whisperlivekit.whisper.audio import (HOP_LENGTH, N_FFT, N_FRAMES,
+                                          TOKENS_PER_SECOND, mel_filters)
+
+logger = logging.getLogger(__name__)
+
+# encoder frames are frozen by blocks of 0.5s, so that the cache grows in few large steps
+ENCODER_BLOCK_FRAMES = 25
+
+
+class IncrementalEncoder:
+    """
+    Per-session incremental front-end for the PyTorch AudioEncoder.
+
+    The log-mel frames of audio that has already been seen are cached and only the
+    STFT frames touched by new audio are computed. The encoder output is frozen by
+    blocks once a frame has `lookahead` seconds of real audio on its right: the keys
+    and values of frozen frames are kept for every layer, and each call only runs the
+    remaining tail (last blocks of content + padding up to 30s) through the encoder,
+    attending to the cached prefix.
+
+    The mel spectrogram is identical to `log_mel_spectrogram(..., padding=N_SAMPLES)`.
+    The encoder output of frozen frames is the one computed when they were last part
+    of the tail, so it does not see audio that arrived afterwards (block-causal
+    approximation). Dropping audio at the front shifts the positional embeddings and
+    invalidates the encoder cache.
+    """
+
+    def __init__(self, model, lookahead: float = 2.0, max_len: float = 30.0, device=None):
+        self.encoder = model.encoder
+        self.n_mels = model.dims.n_mels
+        self.n_ctx = model.dims.n_audio_ctx
+        self.n_state = model.dims.n_audio_state
+        self.n_layer = len(self.encoder.blocks)
+        self.device = device if device is not None else model.device
+        self.lookahead_frames = int(lookahead * TOKENS_PER_SECOND)
+        self.max_frames = min(self.n_ctx, int(max_len * TOKENS_PER_SECOND) + ENCODER_BLOCK_FRAMES)
+        self._window = torch.hann_window(N_FFT).to(self.device)
+        self._filters = mel_filters(self.device, self.n_mels)
+        self._silence_log_mel = torch.tensor(1e-10).log10().item()
+
+        self.full_encodes = 0
+        self.encoded_frames = 0
+        self.reused_frames = 0
+        self.reset()
+
+    def reset(self):
+        """Forget all cached audio, mel frames and encoder states."""
+        self._segments: List[torch.Tensor] = []
+        self._audio: Optional[torch.Tensor] = None
+        self._log_mel: Optional[torch.Tensor] = None  # raw log10 mel of the frames touching content
+        self._mel_max: Optional[float] = None
+        self._features: Optional[torch.Tensor] = None
+        self._content_mel_len = 0
+        self._invalidate_encoder()
+
+    def _invalidate_encoder(self):
+        self._stable = 0
+        self._keys: Optional[torch.Tensor] = None
+        self._values: Optional[torch.Tensor] = None
+        self._stable_features: Optional[torch.Tensor] = None
+
+    def _sync_segments(self, segments: List[torch.Tensor]) -> Tuple[int, List[torch.Tensor]]:
+        """
+        Compare the session segments with the ones seen at the previous call.
+
+        Returns (number of samples dropped at the front, newly appended segments),
+        or (-1, segments) when the buffer cannot be expressed as drop + append.
+        """
+        old = self._segments
+        start = next((j for j, s in enumerate(old) if segments and s is segments[0]), None)
+        if start is None:
+            return -1, list(segments)
+        kept = old[start:]
+        if len(kept) > len(segments) or any(a is not b for a, b in zip(kept, segments)):
+            return -1, list(segments)
+        dropped = sum(s.shape[0] for s in old[:start])
+        return dropped, list(segments[len(kept):])
+
+    def _raw_log_mel(self, audio: torch.Tensor, t0: int, t1: int) -> torch.Tensor:
+        """log10 mel power of STFT frames [t0, t1), with the framing of torch.stft(center=True)."""
+        half = N_FFT // 2
+        start = t0 * HOP_LENGTH - half
+        stop = (t1 - 1) * HOP_LENGTH + half
+        lo = max(start, 0)
+        hi = stop if start >= 0 else max(stop, half + 1)
+        chunk = audio[lo:hi]
+        if chunk.shape[0] < hi - lo:
+            # past the end of the content, the reference spectrogram is computed on zero padding
+            chunk = F.pad(chunk, (0, hi - lo - chunk.shape[0]))
+        if start < 0:
+            chunk = F.pad(chunk[None, None], (-start, 0), mode="reflect")[0, 0, :stop - start]
+        stft = torch.stft(chunk, N_FFT, HOP_LENGTH, window=self._window, center=False, return_complex=True)
+        magnitudes = stft.abs() ** 2
+        mel_spec = self._filters @ magnitudes
+        return torch.clamp(mel_spec, min=1e-10).log10()
+
+    def _update_log_mel(self, dropped: int, appended: List[torch.Tensor]):
+        """Bring the cached audio and raw log-mel frames up to date, recomputing only what changed."""
+        old_len = 0 if self._audio is None else self._audio.shape[0] - dropped
+        parts = [] if self._audio is None else [self._audio[dropped:]]
+        parts += [s.to(self.device) for s in appended]
+        self._audio = torch.cat(parts) if len(parts) > 1 else parts[0]
+
+        length = self._audio.shape[0]
+        n_frames = min(-(-(length + N_FFT // 2) // HOP_LENGTH), N_FRAMES)
+
+        keep = 0
+        if self._log_mel is not None and dropped % HOP_LENGTH == 0 and old_len >= N_FFT:
+            shift = dropped // HOP_LENGTH
+            # frames whose window only covers samples that were already there
+            complete = (old_len - N_FFT // 2) // HOP_LENGTH + 1
+            # after a drop, the first frames are reflect-padded on different samples
+            first = 2 if shift else 0
+            keep = min(complete, self._log_mel.shape[1] - shift, n_frames)
+            if keep > first:
+                kept = self._log_mel[:, shift + first:shift + keep]
+            else:
+                keep = 0
+        if keep:
+            pieces = []
+            if first:
+                pieces.append(self._raw_log_mel(self._audio, 0, first))
+            pieces.append(kept)
+            if keep < n_frames:
+                pieces.append(self._raw_log_mel(self._audio, keep, n_frames))
+            self._log_mel = torch.cat(pieces, dim=1)
+        else:
+            self._log_mel = self._raw_log_mel(self._audio, 0, n_frames)
+
+    def _normalized_mel(self) -> torch.Tensor:
+        """Same output as log_mel_spectrogram(audio, padding=N_SAMPLES) trimmed to N_FRAMES."""
+        log_spec = self._log_mel
+        if log_spec.shape[1] < N_FRAMES:
+            log_spec = F.pad(log_spec, (0, N_FRAMES - log_spec.shape[1]), value=self._silence_log_mel)
+        mel_max = max(self._log_mel.max().item(), self._silence_log_mel)
+        if self._stable and self._mel_max is not None and mel_max != self._mel_max:
+            # the dynamic range floor (max - 8) moved: if it clamps mel values of the frozen
+            # prefix differently, the prefix was encoded from a different input
+            prefix = self._log_mel[:, :2 * self._stable + 2]
+            if prefix.min().item() < max(mel_max, self._mel_max) - 8.0:
+                self._invalidate_encoder()
+        self._mel_max = mel_max
+        log_spec = torch.maximum(log_spec, torch.tensor(mel_max - 8.0, device=log_spec.device))
+        return ((log_spec + 4.0) / 4.0).unsqueeze(0)
+
+    def _encode_tail(self, mel: torch.Tensor) -> torch.Tensor:
+        """Run the encoder on frames [stable, n_ctx), attending to the cached keys/values of the prefix."""
+        encoder = self.encoder
+        s = self._stable
+        if s == 0:
+            x = F.gelu(encoder.conv1(mel))
+            x = F.gelu(encoder.conv2(x))
+        else:
+            # conv receptive field: output frame s needs mel frames 2s-2 .. 2s+2. The first
+            # output of the sliced convolution sees the zero padding and is dropped.
+            x = F.gelu(encoder.conv1(mel[:, :, 2 * s - 2:]))
+            x = F.gelu(encoder.conv2(x))[:, :, 1:]
+        x = x.permute(0, 2, 1)
+        x = (x + encoder.positional_embedding[s:]).to(x.dtype)
+
+        tail_keys, tail_values = [], []
+        for i, block in enumerate(encoder.blocks):
+            attn = block.attn
+            h = block.attn_ln(x)
+            q = attn.query(h)
+            k = attn.key(h)
+            v = attn.value(h)
+            tail_keys.append(k)
+            tail_values.append(v)
+            if s:
+                k = torch.cat([self._keys[i, :, :s], k], dim=1)
+                v = torch.cat([self._values[i, :, :s], v], dim=1)
+            wv, _ = attn.qkv_attention(q, k, v)
+            x = x + attn.out(wv)
+            x = x + block.mlp(block.mlp_ln(x))
+        x = encoder.ln_post(x)
+
+        self.encoded_frames += x.shape[1]
+        self.reused_frames += s
+        if s == 0:
+            self.full_encodes += 1
+        self._freeze(tail_keys, tail_values, x)
+        if s:
+            return torch.cat([self._stable_features[:, :s], x], dim=1)
+        return x
+
+    def _reserve(self, frames: int, like: torch.Tensor):
+        """
+        Room for `frames` frozen frames in the caches, in the dtype of the encoder output.
+        The capacity doubles (up to max_frames), so a short session only holds what it froze.
+        """
+        capacity = 0 if self._keys is None else self._keys.shape[2]
+        if frames <= capacity:
+            return
+        capacity = min(max(frames, 2 * capacity), self.max_frames)
+        keys = like.new_empty((self.n_layer, 1, capacity, self.n_state))
+        values = like.new_empty((self.n_layer, 1, capacity, self.n_state))
+        stable_features = like.new_empty((1, capacity, self.n_state))
+        s = self._stable
+        if s:
+            keys[:, :, :s] = self._keys[:, :, :s]
+            values[:, :, :s] = self._values[:, :, :s]
+            stable_features[:, :s] = self._stable_features[:, :s]
+        self._keys, self._values, self._stable_features = keys, values, stable_features
+
+    def cache_bytes(self) -> int:
+        """Memory held by the frozen encoder caches of this session."""
+        if self._keys is None:
+            return 0
+        return sum(t.numel() * t.element_size() for t in (self._keys, self._values, self._stable_features))
+
+    def _freeze(self, tail_keys, tail_values, tail_features):
+        """Move the tail frames that have enough right context into the frozen prefix."""
+        s = self._stable
+        target = (self._content_mel_len - self.lookahead_frames) // ENCODER_BLOCK_FRAMES * ENCODER_BLOCK_FRAMES
+        target = min(target, self.max_frames)
+        if target <= s:
+            return
+        self._reserve(target, tail_features)
+        n = target - s
+        for i in range(self.n_layer):
+            self._keys[i, :, s:target] = tail_keys[i][:, :n]
+            self._values[i, :, s:target] = tail_values[i][:, :n]
+        self._stable_features[:, s:target] = tail_features[:, :n]
+        self._stable = target
+
+    @torch.no_grad()
+    def encode(self, segments: List[torch.Tensor]) -> Tuple[torch.Tensor, int]:
+        """
+        Encode the concatenation of `segments`.
+
+        Returns (encoder_feature, content_mel_len) with the same shapes and semantics
+        as the full-buffer path of AlignAtt.infer.
+        """
+        dropped, appended = self._sync_segments(segments)
+        if dropped < 0:
+            self.reset()
+        elif dropped == 0 and not appended and self._features is not None:
+            return self._features, self._content_mel_len
+        elif dropped > 0:
+            self._invalidate_encoder()
+        self._segments = list(segments)
+
+        self._update_log_mel(max(dropped, 0), appended)
+        self._content_mel_len = (self._audio.shape[0] // HOP_LENGTH) // 2
+        mel = self._normalized_mel()
+        self._features = self._encode_tail(mel)
+        return self._features, self._content_mel_len
+
+    def stats(self) -> dict:
+        """Frames actually run through the encoder vs. frames served from the cache."""
+        total = self.encoded_frames + self.reused_frames
+        return {
+            "full_encodes": self.full_encodes,
+            "encoded_frames": self.encoded_frames,
+            "reused_frames": self.reused_frames,
+            "reuse_ratio": self.reused_frames / total if total else 0.0,
+            "cache_mb": self.cache_bytes() / 2**20,
+        }
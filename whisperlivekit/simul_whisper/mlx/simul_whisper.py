@@ -169,6 +169,8 @@ class MLXAlignAtt:
         """
         self.model = mlx_model
         self.cfg = cfg
+        # raised while the session's transcription queue is congested (`set_degraded`)
+        self.frame_threshold = cfg.frame_threshold
         
         logger.info(f"MLX Model dimensions: {self.model.dims}")
         
@@ -617,7 +619,7 @@ class MLXAlignAtt:
                     break
             else:
                 self.state.last_attend_frame = most_attended_frame
-            if content_mel_len - most_attended_frame <= (4 if is_last else self.cfg.frame_threshold):
+            if content_mel_len - most_attended_frame <= (4 if is_last else self.frame_threshold):
                 logger.debug(f"attention reaches the end: {most_attended_frame}/{content_mel_len}")
                 current_tokens = current_tokens[:, :-1]
                 break
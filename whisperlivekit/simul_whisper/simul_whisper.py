@@ -1,11 +1,10 @@
 import logging
 import os
 from time import time
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
-import torch.nn.functional as F
 
 from whisperlivekit.backend_support import (faster_backend_available,
                                             mlx_backend_available)
@@ -16,13 +15,17 @@ from whisperlivekit.whisper.audio import (N_FRAMES, N_SAMPLES,
                                           log_mel_spectrogram, pad_or_trim)
 from whisperlivekit.whisper.decoding import (BeamSearchDecoder, GreedyDecoder,
                                              SuppressTokens)
-from whisperlivekit.whisper.timing import median_filter
+from whisperlivekit.whisper.kv_cache import SlabKVCache
 
 from ..timed_objects import PUNCTUATION_MARKS
+from .alignment import AlignmentAccumulator
+from .batched_decoder import DecoderRequest
 from .beam import BeamPyTorchInference
 from .config import AlignAttConfig
 from .decoder_state import DecoderState
+from .draft import DraftDecoder
 from .eow_detection import fire_at_boundary, load_cif
+from .incremental_encoder import IncrementalEncoder
 from .token_buffer import TokenBuffer
 
 DEC_PAD = 50257
@@ -85,6 +88,9 @@ class AlignAtt:
             loaded_model=None,
             mlx_encoder=None,
             fw_encoder=None,
+            encoder_scheduler=None,
+            decoder_scheduler=None,
+            draft_model=None,
         ) -> None:
         self.logger = logging.getLogger("whisperlivekit.simul_whisper.AlignAtt")
         self.logger.setLevel(logging.DEBUG)
@@ -101,6 +107,45 @@ class AlignAtt:
         self.use_mlcore = self.coreml_encoder_tuple is not None
         
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+        self.incremental_encoder = None
+        if cfg.incremental_encoder:
+            if self.mlx_encoder or self.fw_encoder or self.use_mlcore:
+                logger.warning("Incremental encoding is only available with the PyTorch encoder, ignoring it.")
+            else:
+                self.incremental_encoder = IncrementalEncoder(
+                    self.model,
+                    lookahead=cfg.encoder_lookahead,
+                    max_len=cfg.audio_max_len,
+                    device=self.device,
+                )
+
+        self.dynamic_audio_ctx = cfg.dynamic_audio_ctx
+        if self.dynamic_audio_ctx and (self.mlx_encoder or self.fw_encoder or self.use_mlcore or self.incremental_encoder):
+            logger.warning("Dynamic audio context is only available with the PyTorch encoder without --incremental-encoder, ignoring it.")
+            self.dynamic_audio_ctx = False
+
+        # speculative decoding: a smaller Whisper proposes tokens, verified in one decoder pass
+        self.draft = None
+        if draft_model is not None:
+            if cfg.beam_size > 1:
+                logger.warning("Speculative decoding with a draft model requires --beams 1, ignoring the draft model.")
+            elif draft_model.is_multilingual != self.model.is_multilingual:
+                logger.warning("The draft model does not share the vocabulary of the model, ignoring it.")
+            else:
+                self.draft = DraftDecoder(draft_model, n_tokens=cfg.draft_tokens)
+        
+        # cross-session batching of the encoder pass and decoder steps, owned by the TranscriptionEngine
+        self.encoder_scheduler = None
+        self.encoder_session_id = None
+        if encoder_scheduler is not None and self.incremental_encoder is None and not (self.mlx_encoder or self.use_mlcore):
+            self.encoder_scheduler = encoder_scheduler
+            self.encoder_session_id = encoder_scheduler.register()
+        self.decoder_scheduler = decoder_scheduler
+        self.decoder_session_id = None
+        if decoder_scheduler is not None:
+            # only sessions inside their decoding loop are waited for
+            self.decoder_session_id = decoder_scheduler.register(active=False)
         
         logger.info(f"Model dimensions: {self.model.dims}")
         self.decode_options = DecodingOptions(
@@ -113,6 +158,8 @@ class AlignAtt:
         self.max_text_len = self.model.dims.n_text_ctx
         self.num_decoder_layers = len(self.model.decoder.blocks)
         self.cfg = cfg
+        # raised while the session's transcription queue is congested (`set_degraded`)
+        self.frame_threshold = cfg.frame_threshold
         
         #GT added for debug   
         self.logger.debug("=== ALIGNATT CONFIGURATION ===")
@@ -157,6 +204,9 @@ class AlignAtt:
             heads.append((self.state.num_align_heads, head_id.item()))
             self.state.align_source[layer_rank] = heads
             self.state.num_align_heads += 1
+        self.state.alignment_heads = {
+            layer_rank: [head_id for _, head_id in heads] for layer_rank, heads in self.state.align_source.items()
+        }
 
         # Build suppress tokens function
         suppress_tokens = [
@@ -178,6 +228,9 @@ class AlignAtt:
         self.init_tokens()
         self.init_context()
 
+        if cfg.preallocated_kv_cache:
+            self.state.kv_cache = SlabKVCache(self.model.dims.n_text_ctx, max_rows=cfg.beam_size)
+
         # Set up decoder type
         self.state.decoder_type = cfg.decoder_type
         if cfg.decoder_type == "greedy":
@@ -212,6 +265,7 @@ class AlignAtt:
         self.state.tokenizer = self.tokenizer
 
     def init_context(self):
+        self._invalidate_prefix_cache()
         kw = {'tokenizer': self.tokenizer, 
               'device': self.model.device, 
               'prefix_token_ids': [self.tokenizer.sot_prev]}
@@ -244,6 +298,9 @@ class AlignAtt:
             after = len(self.cfg.static_init_prompt)
         while c > self.max_context_tokens or l > self.max_text_len - 20:
             t = self.state.context.trim_words(after=after)
+            if t:
+                # positions of the remaining context tokens changed
+                self._invalidate_prefix_cache()
             l -= t
             c -= t
             logger.debug(f"len {l}, c {c}, max_context_tokens {self.max_context_tokens}")
@@ -256,20 +313,32 @@ class AlignAtt:
         self, 
         tokens: torch.Tensor, 
         audio_features: torch.Tensor,
-        return_cross_attn: bool = False
+        return_cross_attn: bool = False,
+        alignment_heads: Optional[Dict[int, List[int]]] = None,
     ):
-        """Get logits from decoder, optionally returning cross-attention weights."""
+        """
+        Get logits from decoder, optionally returning cross-attention weights
+        (only those of `alignment_heads` if given).
+        """
+        if self.decoder_scheduler is not None:
+            kv_cache = self.state.kv_cache if self.state.decoder_type == "greedy" else self.state.inference.kv_cache
+            return self.decoder_scheduler.submit(
+                self.decoder_session_id,
+                DecoderRequest(tokens, audio_features, kv_cache, return_cross_attn, alignment_heads),
+            )
         if self.state.decoder_type == "greedy":
             return self.model.decoder(
                 tokens, audio_features, 
                 kv_cache=self.state.kv_cache,
-                return_cross_attn=return_cross_attn
+                return_cross_attn=return_cross_attn,
+                alignment_heads=alignment_heads,
             )
         else:
             logger.debug(f"Logits shape: {tokens.shape}")
             return self.state.inference.logits(
                 tokens, audio_features,
-                return_cross_attn=return_cross_attn
+                return_cross_attn=return_cross_attn,
+                alignment_heads=alignment_heads,
             )
     
 
@@ -288,6 +357,15 @@ class AlignAtt:
         self.state.log_segments += 1
         self.state.pending_incomplete_tokens = []
 
+    def release_batch_sessions(self):
+        """Unregister this session from the shared encoder and decoder batch schedulers."""
+        if self.encoder_scheduler is not None:
+            self.encoder_scheduler.release(self.encoder_session_id)
+            self.encoder_scheduler = None
+        if self.decoder_scheduler is not None:
+            self.decoder_scheduler.release(self.decoder_session_id)
+            self.decoder_scheduler = None
+
     def fire_at_boundary(self, chunked_encoder_feature: torch.Tensor):
         if self.state.always_fire: 
             return True
@@ -340,7 +418,12 @@ class AlignAtt:
         removed_len = 0
         # len of audio is bigger than buffer_len. Going to remove the first segment
         segments_len = self.segments_len()
-        while len(self.state.segments) > 1 and segments_len > self.cfg.audio_max_len:
+        max_len = self.cfg.audio_max_len
+        if self.incremental_encoder is not None and segments_len > max_len:
+            # every front removal shifts the encoder positions and forces a full re-encode:
+            # remove a larger stride at once so that it happens every encoder_evict_len seconds
+            max_len = max(self.cfg.audio_max_len - self.cfg.encoder_evict_len, 0.0)
+        while len(self.state.segments) > 1 and segments_len > max_len:
             removed_len = self.state.segments[0].shape[0] / 16000
             segments_len -= removed_len
             self.state.last_attend_frame -= int(TOKENS_PER_SECOND * removed_len)
@@ -352,9 +435,73 @@ class AlignAtt:
                 self.state.tokens = [self.state.initial_tokens] + self.state.tokens[2:]
         return removed_len
 
+    ### decoder prefix cache
+
+    def _audio_ctx_mel_frames(self, content_mel_len: int) -> int:
+        """Mel frames encoded with dynamic_audio_ctx: the content rounded up to the next bucket length."""
+        n_audio_ctx = self.model.dims.n_audio_ctx
+        for seconds in sorted(self.cfg.audio_ctx_buckets):
+            n_ctx = min(int(round(seconds * TOKENS_PER_SECOND)), n_audio_ctx)
+            if n_ctx >= content_mel_len:
+                return 2 * n_ctx
+        return 2 * n_audio_ctx
+
+    def _self_attn_cache_ids(self):
+        return [cache_id for block in self.model.decoder.blocks
+                for cache_id in (block.attn.key_cache_id, block.attn.value_cache_id)]
+
+    def _invalidate_prefix_cache(self):
+        if self.state.prefix_cache_ids:
+            self.state.prefix_cache_ids = []
+            self.state.clean_cache()
+
+    def _reuse_prefix_cache(self, context_ids: List[int]) -> int:
+        """
+        Number of leading prompt positions whose self-attention keys/values, kept from the
+        previous infer call, can be reused. Only the context prompt is kept: it only changes
+        by appending text when segments are dropped (insert_audio), and it is invalidated
+        when it is trimmed or reset (trim_context, refresh_segment, language change).
+        """
+        if not self.cfg.persist_prefix_cache:
+            return 0
+        key_id = self.model.decoder.blocks[0].attn.key_cache_id
+        cached = self.state.kv_cache.get(key_id)
+        if cached is None:
+            return 0
+        limit = min(cached.shape[1], len(self.state.prefix_cache_ids), len(context_ids))
+        reused = 0
+        while reused < limit and self.state.prefix_cache_ids[reused] == context_ids[reused]:
+            reused += 1
+        if reused < cached.shape[1]:
+            self.state.keep_cache_prefix(reused, self._self_attn_cache_ids())
+        return reused
+
+    def _draft_tokens(self, current_tokens: torch.Tensor) -> List[int]:
+        """Tokens proposed by the draft model after `current_tokens`, to be verified with the last one."""
+        if self.draft is None:
+            return []
+        n_tokens = min(self.draft.n_tokens, self.max_text_len - current_tokens.shape[1])
+        return self.draft.propose(current_tokens[0].tolist(), self.tokenizer, n_tokens)
+
+    def _truncate_self_attn_cache(self, length: int):
+        """Drop the self-attention keys/values after `length` positions (rejected draft tokens)."""
+        kv_cache = self.state.kv_cache if self.state.decoder_type == "greedy" else self.state.inference.kv_cache
+        for cache_id in self._self_attn_cache_ids():
+            if cache_id not in kv_cache:
+                continue
+            if isinstance(kv_cache, SlabKVCache):
+                kv_cache.truncate(cache_id, length)
+            else:
+                kv_cache[cache_id] = kv_cache[cache_id][:, :length]
+
     def _clean_cache(self):
         """Clean the kv_cache after each inference step."""
-        self.state.clean_cache()
+        if self.cfg.persist_prefix_cache and self.state.prefix_cache_ids:
+            self.state.keep_cache_prefix(len(self.state.prefix_cache_ids), self._self_attn_cache_ids())
+        else:
+            self.state.clean_cache()
+        if self.decoder_scheduler is not None:
+            self.decoder_scheduler.set_active(self.decoder_session_id, False)
 
     @torch.no_grad()
     def lang_id(self, encoder_features):
@@ -441,13 +588,19 @@ class AlignAtt:
             content_mel_len = int(audio_length_seconds * 100)//2      
             mel_padded_2 = self.fw_feature_extractor(waveform=input_segments.numpy(), padding=N_SAMPLES)[None, :]
             mel = fw_pad_or_trim(mel_padded_2, N_FRAMES, axis=-1)
-            encoder_feature_ctranslate = self.fw_encoder.encode(mel)
+            if self.encoder_scheduler is not None:
+                encoder_feature_ctranslate = self.encoder_scheduler.submit(self.encoder_session_id, mel)
+            else:
+                encoder_feature_ctranslate = self.fw_encoder.encode(mel)
             if self.device == 'cpu': #it seems that on gpu, passing StorageView to torch.as_tensor fails and wrapping in the array works
                 encoder_feature_ctranslate = np.array(encoder_feature_ctranslate)
             try:
                 encoder_feature = torch.as_tensor(encoder_feature_ctranslate, device=self.device)
             except TypeError: # Normally the cpu condition should prevent having exceptions, but just in case:
                 encoder_feature = torch.as_tensor(np.array(encoder_feature_ctranslate), device=self.device)
+        elif self.incremental_encoder is not None:
+            # cached mel frames + frozen encoder prefix, only the tail is re-encoded
+            encoder_feature, content_mel_len = self.incremental_encoder.encode(self.state.segments)
         else:
             # mel + padding to 30s
             mel_padded = log_mel_spectrogram(input_segments, n_mels=self.model.dims.n_mels, padding=N_SAMPLES, 
@@ -456,7 +609,13 @@ class AlignAtt:
             mel = pad_or_trim(mel_padded, N_FRAMES)
             # the len of actual audio
             content_mel_len = int((mel_padded.shape[2] - mel.shape[2])/2)
-            encoder_feature = self.model.encoder(mel)
+            if self.dynamic_audio_ctx:
+                # only the content, rounded up to a bucket length
+                mel = mel[:, :, :self._audio_ctx_mel_frames(content_mel_len)]
+            if self.encoder_scheduler is not None:
+                encoder_feature = self.encoder_scheduler.submit(self.encoder_session_id, mel)
+            else:
+                encoder_feature = self.model.encoder(mel)
         end_encode = time()
         # print('Encoder duration:', end_encode-beg_encode)
                 
@@ -476,8 +635,18 @@ class AlignAtt:
 
         self.trim_context()
         current_tokens = self._current_tokens()
+
+        # with persist_prefix_cache, the context prompt is not fed again if its keys/values were kept
+        n_context_tokens = current_tokens.shape[1] - sum(t.shape[1] for t in self.state.tokens)
+        prefix_len = 0
+        if self.cfg.persist_prefix_cache:
+            context_ids = current_tokens[0, :n_context_tokens].tolist()
+            prefix_len = self._reuse_prefix_cache(context_ids)
+            self.state.prefix_cache_ids = context_ids
    
         fire_detected = self.fire_at_boundary(encoder_feature[:, :content_mel_len, :])
+        if self.draft is not None:
+            self.draft.start(input_segments, encoder_feature)
 
 
         sum_logprobs = torch.zeros(self.cfg.beam_size, device=self.device)
@@ -488,14 +657,21 @@ class AlignAtt:
         most_attended_frame = None
 
         token_len_before_decoding = current_tokens.shape[1]
+        if self.decoder_scheduler is not None:
+            self.decoder_scheduler.set_active(self.decoder_session_id, True)
         
         l_absolute_timestamps = []
         
-        accumulated_cross_attns = []
+        alignment = AlignmentAccumulator(
+            self.state.align_source, self.state.num_align_heads, single_row=self.cfg.beam_size == 1,
+            selected_heads=True,
+        )
         
         audio_duration_s = self.segments_len()
         max_tokens_per_chunk = max(50, int(audio_duration_s * TOKENS_PER_SECOND * 2.0))  # 2x margin, min 50
         tokens_produced_this_chunk = 0
+        # decoder outputs of drafted tokens verified ahead: (logits, cross_attns, token fed at that position)
+        speculated = []
         
         while not completed and current_tokens.shape[1] < self.max_text_len:  # bos is 3 tokens
             tokens_produced_this_chunk += 1
@@ -505,21 +681,43 @@ class AlignAtt:
                 current_tokens = current_tokens[:, :token_len_before_decoding]  # Discard all new tokens
                 break
 
-            if new_segment:
-                tokens_for_logits = current_tokens
+            if speculated:
+                # the drafted token fed at this position was accepted: its outputs are already computed
+                logits, cross_attns, _ = speculated.pop(0)
+                self.draft.accepted += 1
             else:
-                # only need to use the last token except in the first forward pass
-                tokens_for_logits = current_tokens[:, -1:]
-
-            # Get logits and cross-attention weights from decoder
-            result = self.logits(tokens_for_logits, encoder_feature, return_cross_attn=True)
-            logits, cross_attns = result
+                drafted = []
+                if new_segment:
+                    tokens_for_logits = current_tokens[:, prefix_len:]
+                else:
+                    # only need to use the last token except in the first forward pass
+                    tokens_for_logits = current_tokens[:, -1:]
+                    drafted = self._draft_tokens(current_tokens)
+                    if drafted:
+                        drafted_tensor = torch.tensor([drafted], dtype=torch.long, device=current_tokens.device)
+                        tokens_for_logits = torch.cat([tokens_for_logits, drafted_tensor], dim=1)
+
+                # Get logits and cross-attention weights from decoder
+                result = self.logits(
+                    tokens_for_logits, encoder_feature, return_cross_attn=True, alignment_heads=self.state.alignment_heads
+                )
+                logits, cross_attns = result
+                if drafted:
+                    # one position per token: the last token, then the drafted ones
+                    positions = [
+                        (logits[:, i:i + 1], [None if a is None else a[:, :, i:i + 1] for a in cross_attns])
+                        for i in range(len(drafted) + 1)
+                    ]
+                    logits, cross_attns = positions[0]
+                    speculated = [(l, c, token) for (l, c), token in zip(positions[1:], drafted)]
             
-            # Accumulate cross-attention from this forward pass
-            accumulated_cross_attns.append(cross_attns)
+            # Accumulate the alignment heads of this forward pass
+            alignment.add(cross_attns)
 
             if new_segment and self.tokenizer.no_speech is not None:
-                probs_at_sot = logits[:, self.state.sot_index, :].float().softmax(dim=-1)
+                # at the SOT token, after the context prompt; the logits start after the cached prefix
+                sot_position = n_context_tokens + self.state.sot_index - prefix_len
+                probs_at_sot = logits[:, sot_position, :].float().softmax(dim=-1)
                 no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
                 if no_speech_probs[0] > self.cfg.nonspeech_prob:
                     logger.info("no speech, stop")
@@ -537,8 +735,8 @@ class AlignAtt:
             logger.debug(f"Decoding completed: {completed}, sum_logprobs: {sum_logprobs.tolist()}, tokens: ")
             self.debug_print_tokens(current_tokens)
 
-            # Process accumulated cross-attention weights for alignment
-            attn_of_alignment_heads = self._process_cross_attention(accumulated_cross_attns, content_mel_len)
+            # Alignment of the last token, normalized over all the tokens of this call
+            attn_of_alignment_heads = alignment.last_row(content_mel_len, self.cfg.beam_size, self.device)
 
             # for each beam, the most attended frame is:
             most_attended_frames = torch.argmax(attn_of_alignment_heads[:, -1, :], dim=-1)
@@ -576,11 +774,16 @@ class AlignAtt:
             else:
                 self.state.last_attend_frame = most_attended_frame
 
-            if content_mel_len - most_attended_frame <= (4 if is_last else self.cfg.frame_threshold):
+            if content_mel_len - most_attended_frame <= (4 if is_last else self.frame_threshold):
                 logger.debug(f"attention reaches the end: {most_attended_frame}/{content_mel_len}")
                 # stripping the last token, the one that is attended too close to the end
                 current_tokens = current_tokens[:, :-1]
                 break
+
+            if speculated and current_tokens[0, -1].item() != speculated[0][2]:
+                # the next drafted token is not the decoded one: drop the rest of the draft
+                speculated = []
+                self._truncate_self_attn_cache(current_tokens.shape[1] - 1)
         
             # debug print
             for i in range(self.cfg.beam_size):
@@ -661,68 +864,3 @@ class AlignAtt:
                 logger.warning(f"[UTF-8 Fix] Skipping {len(split_tokens[-1])} tokens (exceeds limit of {MAX_PENDING_TOKENS}, likely hallucination)")
 
         return timestamped_words
-
-    def _process_cross_attention(
-        self, 
-        cross_attns: List[torch.Tensor], 
-        content_mel_len: int
-    ) -> torch.Tensor:
-        """
-        Process cross-attention weights from decoder layers for alignment.
-        
-        Args:
-            cross_attns: List of cross-attention tensors from each decoder layer.
-                         Each tensor has shape (batch, n_head, seq_len, audio_len)
-            content_mel_len: Length of actual audio content in mel frames
-            
-        Returns processed attention tensor for alignment, shape (batch, seq_len, content_mel_len)
-        """
-        attn_of_alignment_heads = [[] for _ in range(self.state.num_align_heads)]
-        num_decoder_layers = len(self.model.decoder.blocks)
-
-        if cross_attns and isinstance(cross_attns[0], list):
-            flattened_attns: List[torch.Tensor] = [attn for layer_list in cross_attns for attn in layer_list]
-        else:
-            flattened_attns = cross_attns
-        
-        for idx, attn_mat in enumerate(flattened_attns):
-            layer_rank = idx % num_decoder_layers
-            # attn_mat shape: (batch, n_head, seq_len, audio_len) or (n_head, seq_len, audio_len) for batch=1
-            align_heads_in_layer = self.state.align_source.get(layer_rank, [])
-            if len(align_heads_in_layer) == 0:
-                continue
-            
-            attn_mat = F.softmax(attn_mat, dim=-1)
-            
-            for align_head_rank, head_id in align_heads_in_layer:
-                if self.cfg.beam_size == 1:
-                    # (n_head, seq_len, audio_len) when squeezed
-                    if attn_mat.dim() == 4:
-                        a = attn_mat[0, head_id, :, :]  # (seq_len, audio_len)
-                    else:
-                        a = attn_mat[head_id, :, :]
-                    a = a.unsqueeze(0)  # (1, seq_len, audio_len)
-                else:
-                    # attn_mat: (batch, n_head, seq_len, audio_len)
-                    a = attn_mat[:, head_id, :, :]  # (batch, seq_len, audio_len)
-                attn_of_alignment_heads[align_head_rank].append(a)
-        
-        tmp = []
-        for mat in attn_of_alignment_heads:
-            if mat:
-                t = torch.cat(mat, dim=1)  # (batch, total_seq_len, audio_len)
-                tmp.append(t)
-        
-        if not tmp:
-            return torch.zeros(self.cfg.beam_size, 1, content_mel_len, device=self.device)
-        
-        # stck al heads: (batch, num_align_heads, seq_len, audio_len)
-        attn_of_alignment_heads = torch.stack(tmp, dim=1)
-        
-        std, mean = torch.std_mean(attn_of_alignment_heads, dim=-2, keepdim=True, unbiased=False)
-        attn_of_alignment_heads = (attn_of_alignment_heads - mean) / (std + 1e-8)
-        
-        attn_of_alignment_heads = median_filter(attn_of_alignment_heads, 7)
-        attn_of_alignment_heads = attn_of_alignment_heads.mean(dim=1)
-        attn_of_alignment_heads = attn_of_alignment_heads[:, :, :content_mel_len]
-        return attn_of_alignment_heads
\ No newline at end of file
@@ -1,3 +1,5 @@
+from bisect import bisect_right
+from copy import copy
 from time import time
 from typing import Any, List, Optional, Tuple, Union
 
@@ -31,9 +33,16 @@ class TokensAlignment:
         self.current_line_tokens: List[ASRToken] = []
         self.diarization_buffer: List[ASRToken] = []
 
-        self.last_punctuation = None
-        self.last_uncompleted_punc_segment: PuncSegment = None
-        self.unvalidated_tokens: PuncSegment = []
+
+        # incremental diarized lines (get_lines_diarization)
+        self._open_segment_start: int = 0
+        self.punctuation_segments: List[PuncSegment] = []
+        self.diarization_segments: List[SpeakerSegment] = []
+        self._diarization_ends: List[float] = []
+        self._diarization_sorted: bool = True
+        self._n_final: int = 0
+        self._final_lines: List[Segment] = []
+        self._final_horizon: Optional[float] = None
 
     def update(self) -> None:
         """Drain state buffers into the running alignment context."""
@@ -91,13 +100,18 @@ class TokensAlignment:
         return segments
 
     def compute_new_punctuations_segments(self) -> List[PuncSegment]:
+        """
+        Close the punctuation segments of the tokens added since the last call, as
+        `compute_punctuations_segments` would, and return them. The tokens after the
+        last closed segment stay open (`_open_segment_start`).
+        """
         new_punc_segments = []
-        segment_start_idx = 0
-        self.unvalidated_tokens += self.new_tokens
-        for i, token in enumerate(self.unvalidated_tokens):
+        segment_start_idx = self._open_segment_start
+        for i in range(self._tokens_index, len(self.all_tokens)):
+            token = self.all_tokens[i]
             if token.is_silence():
                 previous_segment = PuncSegment.from_tokens(
-                        tokens=self.unvalidated_tokens[segment_start_idx: i],
+                        tokens=self.all_tokens[segment_start_idx: i],
                     )
                 if previous_segment:
                     new_punc_segments.append(previous_segment)
@@ -110,25 +124,34 @@ class TokensAlignment:
             else:
                 if token.has_punctuation():
                     segment = PuncSegment.from_tokens(
-                        tokens=self.unvalidated_tokens[segment_start_idx: i+1],
+                        tokens=self.all_tokens[segment_start_idx: i+1],
                     )
                     new_punc_segments.append(segment)
                     segment_start_idx = i+1
 
-        self.unvalidated_tokens = self.unvalidated_tokens[segment_start_idx:]
+        self._tokens_index = len(self.all_tokens)
+        self._open_segment_start = segment_start_idx
+        self.punctuation_segments.extend(new_punc_segments)
         return new_punc_segments
 
 
     def concatenate_diar_segments(self) -> List[SpeakerSegment]:
-        """Merge consecutive diarization slices that share the same speaker."""
-        if not self.all_diarization_segments:
-            return []
-        merged = [self.all_diarization_segments[0]]
-        for segment in self.all_diarization_segments[1:]:
-            if segment.speaker == merged[-1].speaker:
+        """Merge the new diarization slices into `diarization_segments`, consecutive slices of a speaker into one."""
+        merged = self.diarization_segments
+        for segment in self.all_diarization_segments[self._diarization_index:]:
+            if merged and segment.speaker == merged[-1].speaker:
                 merged[-1].end = segment.end
+                self._diarization_ends[-1] = segment.end
             else:
+                if merged and (segment.start < merged[-1].start or segment.end < merged[-1].end):
+                    # out of order: the interval search does not hold anymore
+                    self._diarization_sorted = False
                 merged.append(segment)
+                self._diarization_ends.append(segment.end)
+            if self._final_horizon is not None and segment.start < self._final_horizon:
+                # this slice overlaps finalized lines: they are attributed again
+                self._reset_final_lines()
+        self._diarization_index = len(self.all_diarization_segments)
         return merged
 
 
@@ -140,35 +163,101 @@ class TokensAlignment:
 
         return max(0, end - start)
 
+    def _attribute_speaker(self, punctuation_segment: PuncSegment) -> bool:
+        """
+        Speaker of the diarization segment overlapping `punctuation_segment` the most
+        (first one on ties, 1 without overlap). False, and speaker -1, when the segment
+        starts after the diarization horizon (it is in the diarization buffer).
+        """
+        diarization_segments = self.diarization_segments
+        if diarization_segments and punctuation_segment.start >= diarization_segments[-1].end:
+            punctuation_segment.speaker = -1
+            return False
+        max_overlap = 0.0
+        max_overlap_speaker = 1
+        if self._diarization_sorted:
+            # only the segments ending after its start and starting before its end overlap it
+            first = bisect_right(self._diarization_ends, punctuation_segment.start)
+            candidates = []
+            for diarization_segment in diarization_segments[first:]:
+                if diarization_segment.start >= punctuation_segment.end:
+                    break
+                candidates.append(diarization_segment)
+        else:
+            candidates = diarization_segments
+        for diarization_segment in candidates:
+            intersec = self.intersection_duration(punctuation_segment, diarization_segment)
+            if intersec > max_overlap:
+                max_overlap = intersec
+                max_overlap_speaker = diarization_segment.speaker + 1
+        punctuation_segment.speaker = max_overlap_speaker
+        return True
+
+    @staticmethod
+    def _append_line(lines: List[Segment], segment: Segment, shared: int) -> None:
+        """Add a segment to the lines, merged into the last line if it has the same speaker.
+        The first `shared` lines are not modified in place."""
+        if lines and segment.speaker == lines[-1].speaker:
+            if len(lines) <= shared:
+                lines[-1] = copy(lines[-1])
+            if lines[-1].text:
+                lines[-1].text += segment.text
+            lines[-1].end = segment.end
+        else:
+            lines.append(copy(segment))
+
+    def _reset_final_lines(self) -> None:
+        self._n_final = 0
+        self._final_lines = []
+        self._final_horizon = None
+
+    def _finalize_lines(self) -> None:
+        """
+        Move the closed punctuation segments that are behind the diarization horizon
+        into `_final_lines`. Diarization slices come in time order, so their speaker
+        cannot change anymore.
+        """
+        if not self.diarization_segments:
+            return
+        horizon = self.diarization_segments[-1].end
+        while self._n_final < len(self.punctuation_segments):
+            segment = self.punctuation_segments[self._n_final]
+            if not segment.is_silence():
+                if segment.end > horizon or not self._attribute_speaker(segment):
+                    break
+            self._append_line(self._final_lines, segment, 0)
+            self._n_final += 1
+        self._final_horizon = horizon
+
     def get_lines_diarization(self) -> Tuple[List[Segment], str]:
-        """Build segments when diarization is enabled and track overflow buffer."""
+        """
+        Build segments when diarization is enabled and track overflow buffer.
+
+        Incremental: only the tokens and diarization slices added since the last call
+        are processed, and only the segments not finalized yet (after the diarization
+        horizon, or still open) are attributed again.
+        """
+        self.concatenate_diar_segments()
+        self.compute_new_punctuations_segments()
+        self._finalize_lines()
+
+        tail = self.punctuation_segments[self._n_final:]
+        final_segment = PuncSegment.from_tokens(
+            tokens=self.all_tokens[self._open_segment_start:],
+        )
+        if final_segment:
+            tail = tail + [final_segment]
+
         diarization_buffer = ''
-        punctuation_segments = self.compute_punctuations_segments()
-        diarization_segments = self.concatenate_diar_segments()
-        for punctuation_segment in punctuation_segments:
+        for punctuation_segment in tail:
             if not punctuation_segment.is_silence():
-                if diarization_segments and punctuation_segment.start >= diarization_segments[-1].end:
+                if not self._attribute_speaker(punctuation_segment):
                     diarization_buffer += punctuation_segment.text
-                else:
-                    max_overlap = 0.0
-                    max_overlap_speaker = 1
-                    for diarization_segment in diarization_segments:
-                        intersec = self.intersection_duration(punctuation_segment, diarization_segment)
-                        if intersec > max_overlap:
-                            max_overlap = intersec
-                            max_overlap_speaker = diarization_segment.speaker + 1
-                    punctuation_segment.speaker = max_overlap_speaker
-        
-        segments = []
-        if punctuation_segments:
-            segments = [punctuation_segments[0]]
-            for segment in punctuation_segments[1:]:
-                if segment.speaker == segments[-1].speaker:
-                    if segments[-1].text:
-                        segments[-1].text += segment.text
-                    segments[-1].end = segment.end
-                else:
-                    segments.append(segment)
+
+        segments = list(self._final_lines)
+        shared = len(segments)
+        for segment in tail:
+            self._append_line(segments, segment, shared)
 
         return segments, diarization_buffer
 
@@ -215,5 +304,7 @@ class TokensAlignment:
                     end=end_silence
                 ))
         if translation:
+            # lines are kept across calls: translate copies, not the kept lines
+            segments = [copy(segment) for segment in segments]
             [self.add_translation(segment) for segment in segments if not segment.is_silence()]
         return segments, diarization_buffer, self.new_translation_buffer.text
@@ -1,14 +1,16 @@
 import hashlib
 import io
 import json
+import mmap
 import os
 import urllib
 import warnings
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Callable, Dict, List, Optional, Union
 
 import torch
-from torch import Tensor
+from torch import Tensor, nn
+from torch.overrides import TorchFunctionMode
 from tqdm import tqdm
 
 from whisperlivekit.whisper.audio import (load_audio, log_mel_spectrogram,
@@ -401,11 +403,13 @@ def _load_checkpoint(
     device: str,
     in_memory: bool = False,
     checkpoint_bytes: Optional[bytes] = None,
+    mmap_weights: bool = False,
 ) -> Dict[str, torch.Tensor]:
     """
     Load a checkpoint from a single file.
     
-    Handles .pt, .bin, and .safetensors formats.
+    Handles .pt, .bin, and .safetensors formats. With `mmap_weights`, the tensors
+    are memory-mapped from the file instead of read.
     """
     if checkpoint_bytes is not None:
         with io.BytesIO(checkpoint_bytes) as fp:
@@ -415,6 +419,8 @@ def _load_checkpoint(
     suffix = file_path.suffix.lower()
     
     if suffix == '.safetensors':
+        if mmap_weights:
+            return _mmap_safetensors(file_path)
         try:
             from safetensors.torch import load_file
         except ImportError:
@@ -423,6 +429,8 @@ def _load_checkpoint(
             )
         return load_file(str(file_path), device=device)
     else:
+        if mmap_weights:
+            return torch.load(str(file_path), map_location=device, mmap=True)
         if in_memory:
             with open(file_path, "rb") as f:
                 checkpoint_bytes = f.read()
@@ -436,6 +444,7 @@ def _load_checkpoint(
 def _load_sharded_checkpoint(
     shard_files: List[Path],
     device: str,
+    mmap_weights: bool = False,
 ) -> Dict[str, torch.Tensor]:
     """
     Load a sharded checkpoint (multiple .safetensors or .bin files).
@@ -445,7 +454,10 @@ def _load_sharded_checkpoint(
     merged_state_dict = {}
     first_suffix = shard_files[0].suffix.lower()
     
-    if first_suffix == '.safetensors':
+    if mmap_weights:
+        for shard_path in shard_files:
+            merged_state_dict.update(_load_checkpoint(shard_path, device, mmap_weights=True))
+    elif first_suffix == '.safetensors':
         try:
             from safetensors.torch import load_file
         except ImportError:
@@ -465,14 +477,92 @@ def _load_sharded_checkpoint(
     return merged_state_dict
 
 
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def _mmap_safetensors(file_path: Union[str, Path]) -> Dict[str, torch.Tensor]:
+    """
+    The tensors of a .safetensors file as views of a copy-on-write memory map of it.
+    Pages are read when first used, and the processes mapping the same file share them
+    in the page cache until one writes to them.
+    """
+    with open(file_path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    data_start = 8 + header_size
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        count = (end - begin) // dtype.itemsize
+        if count:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+
+class _SkipInitialization(TorchFunctionMode):
+    """
+    Makes the random initializers of the parameters no-ops, in the thread that enters it
+    only (torch function modes are thread-local): modules built meanwhile by other
+    threads (diarization, translation) are initialized as usual.
+    """
+
+    _INITIALIZERS = (nn.init.uniform_, nn.init.normal_, nn.init.kaiming_uniform_, Tensor.uniform_, Tensor.normal_)
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if func in self._INITIALIZERS:
+            # `nn.init` passes its tensor as a keyword argument
+            return args[0] if args else kwargs["tensor"]
+        return func(*args, **kwargs)
+
+
+def _uninitialized_model(dims: ModelDimensions, decoder_only: bool = False) -> Whisper:
+    """
+    A Whisper model with uninitialized parameters, meant to be replaced by
+    `load_state_dict(..., assign=True)`: their memory is allocated but never written, so
+    it is not resident, and no time is spent drawing random weights. Buffers are computed
+    as usual (sinusoids, masks).
+    """
+    with _SkipInitialization():
+        return Whisper(dims, decoder_only=decoder_only)
+
+
+def _cast_to_model_dtypes(state_dict: Dict[str, torch.Tensor], model: nn.Module) -> Dict[str, torch.Tensor]:
+    """Convert the tensors stored in another dtype than the model's (float16 checkpoints), as copying them in would."""
+    dtypes = {name: tensor.dtype for name, tensor in model.state_dict().items()}
+    return {
+        name: tensor.to(dtypes[name]) if name in dtypes and tensor.dtype != dtypes[name] else tensor
+        for name, tensor in state_dict.items()
+    }
+
+
 def load_model(
     name: str,
     device: Optional[Union[str, torch.device]] = None,
     download_root: str = None,
     in_memory: bool = False,
-    decoder_only: bool = False,
+    decoder_only: Union[bool, Callable[[ModelDimensions], bool]] = False,
     custom_alignment_heads: Optional[str] = None,
     lora_path: Optional[str] = None,
+    mmap_weights: bool = False,
 ) -> Whisper:
     """
     Load a Whisper ASR model
@@ -490,8 +580,14 @@ def load_model(
         path to download the model files; by default, it uses "~/.cache/whisper"
     in_memory: bool
         whether to preload the model weights into host memory
+    decoder_only: Union[bool, Callable[[ModelDimensions], bool]]
+        load the model without its encoder; a callable decides from the checkpoint's dimensions
     lora_path: str
         optional directory containing PEFT LoRA adapter weights (adapter_config + adapter_model)
+    mmap_weights: bool
+        memory-map the checkpoint and use its tensors as the model weights (CPU only):
+        no full read at startup and no private copy, processes loading the same file
+        share its pages. Weights stored in another dtype than the model's are still copied.
 
     Returns
     -------
@@ -505,6 +601,9 @@ def load_model(
     if download_root is None:
         default = os.path.join(os.path.expanduser("~"), ".cache")
         download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+    if mmap_weights and (in_memory or torch.device(device).type != "cpu"):
+        warnings.warn("mmap_weights only applies to CPU models loaded from a file, loading normally.")
+        mmap_weights = False
     
     checkpoint = None
     model_path_for_config = name  # Used to find config.json for dims inference
@@ -514,14 +613,14 @@ def load_model(
         if in_memory:
             checkpoint = _load_checkpoint(None, device, checkpoint_bytes=checkpoint_file)
         else:
-            checkpoint = _load_checkpoint(checkpoint_file, device)
+            checkpoint = _load_checkpoint(checkpoint_file, device, mmap_weights=mmap_weights)
     elif os.path.isfile(name):
         if in_memory:
             with open(name, "rb") as f:
                 checkpoint_bytes = f.read()
             checkpoint = _load_checkpoint(None, device, checkpoint_bytes=checkpoint_bytes)
         else:
-            checkpoint = _load_checkpoint(name, device)
+            checkpoint = _load_checkpoint(name, device, mmap_weights=mmap_weights)
         model_path_for_config = name
     elif os.path.isdir(name):
         model_info = detect_model_format(name)
@@ -533,7 +632,7 @@ def load_model(
             )
         
         if model_info.is_sharded:
-            checkpoint = _load_sharded_checkpoint(model_info.pytorch_files, device)
+            checkpoint = _load_sharded_checkpoint(model_info.pytorch_files, device, mmap_weights=mmap_weights)
         else:
             single_file = model_info.pytorch_files[0]
             if in_memory:
@@ -541,7 +640,7 @@ def load_model(
                     checkpoint_bytes = f.read()
                 checkpoint = _load_checkpoint(None, device, checkpoint_bytes=checkpoint_bytes)
             else:
-                checkpoint = _load_checkpoint(single_file, device)
+                checkpoint = _load_checkpoint(single_file, device, mmap_weights=mmap_weights)
         model_path_for_config = name
     else:
         raise RuntimeError(
@@ -577,7 +676,13 @@ def load_model(
         if not isinstance(state_dict, dict):
             state_dict = checkpoint
 
-    model = Whisper(dims, decoder_only=decoder_only)
+    if callable(decoder_only):
+        decoder_only = decoder_only(dims)
+
+    if mmap_weights:
+        model = _uninitialized_model(dims, decoder_only=decoder_only)
+    else:
+        model = Whisper(dims, decoder_only=decoder_only)
     
     if decoder_only:
         state_dict = {
@@ -585,7 +690,10 @@ def load_model(
             if 'encoder' not in k
         }
 
-    model.load_state_dict(state_dict)
+    if mmap_weights:
+        model.load_state_dict(_cast_to_model_dtypes(state_dict, model), assign=True)
+    else:
+        model.load_state_dict(state_dict)
 
     if alignment_heads is not None:
         if isinstance(alignment_heads, bytes):
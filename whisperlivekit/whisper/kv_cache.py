@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from torch import Tensor
+
+
+class SlabKVCache(dict):
+    """
+    Drop-in replacement for the dict `kv_cache` of the text decoder, with self-attention
+    keys/values written in place into slabs preallocated to `n_ctx` positions.
+
+    The dict entries of self-attention caches are views `slab[:rows, :length]`, so
+    `TextDecoder.forward` (offset from `.shape[1]`) and the cross-attention entries work
+    unchanged. `clear()` only resets the lengths: the slabs are reused by the next
+    decoding pass. `rearrange()` reorders the rows (beams) by gathering into a spare slab
+    and swapping, instead of allocating a new tensor for each cache entry.
+    """
+
+    def __init__(self, n_ctx: int, max_rows: int = 1):
+        super().__init__()
+        self.n_ctx = n_ctx
+        self.max_rows = max_rows
+        self._slabs: Dict[str, Tensor] = {}
+        self._spares: Dict[str, Tensor] = {}
+        self._lengths: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        self.allocations = 0
+
+    def _allocate(self, like: Tensor, rows: int) -> Tensor:
+        self.allocations += 1
+        return like.new_empty((max(rows, self.max_rows), self.n_ctx, like.shape[-1]))
+
+    def _write(self, cache_id: str, x: Tensor) -> Optional[Tensor]:
+        """Write `x` after the current length of a slab-backed entry. None if it does not fit."""
+        rows, n = x.shape[0], x.shape[1]
+        start = self._lengths.get(cache_id, 0)
+        if (start and rows != self._rows[cache_id]) or start + n > self.n_ctx:
+            return None
+        slab = self._slabs.get(cache_id)
+        if slab is None or slab.shape[0] < rows or slab.shape[-1] != x.shape[-1] or slab.dtype != x.dtype:
+            slab = self._allocate(x, rows)
+            self._slabs[cache_id] = slab
+            self._spares.pop(cache_id, None)
+        slab[:rows, start:start + n] = x
+        self._lengths[cache_id] = start + n
+        self._rows[cache_id] = rows
+        view = slab[:rows, :start + n]
+        super().__setitem__(cache_id, view)
+        return view
+
+    def append(self, key_id: str, value_id: str, k: Tensor, v: Tensor) -> Tuple[Tensor, Tensor]:
+        """Append new self-attention keys/values; returns the full cached keys/values."""
+        k, v = k.detach(), v.detach()
+        if key_id not in self or key_id in self._lengths:
+            start = self._lengths.get(key_id, 0)
+            if not ((start and k.shape[0] != self._rows[key_id]) or start + k.shape[1] > self.n_ctx):
+                return self._write(key_id, k), self._write(value_id, v)
+        # context overflow or entry set from outside: same behaviour as the dict cache
+        if key_id in self and k.shape[1] <= self.n_ctx:
+            k = torch.cat([self[key_id], k], dim=1)
+            v = torch.cat([self[value_id], v], dim=1)
+        self[key_id] = k
+        self[value_id] = v
+        return k, v
+
+    def forget(self, cache_id: str):
+        """Stop tracking `cache_id` in a slab (the slab itself is kept for reuse)."""
+        self._lengths.pop(cache_id, None)
+        self._rows.pop(cache_id, None)
+
+    def __setitem__(self, cache_id: str, value: Tensor):
+        # an external assignment replaces the slab contents for this entry
+        self.forget(cache_id)
+        super().__setitem__(cache_id, value)
+
+    def __delitem__(self, cache_id: str):
+        self.forget(cache_id)
+        super().__delitem__(cache_id)
+
+    def clear(self):
+        self._lengths.clear()
+        self._rows.clear()
+        super().clear()
+
+    def truncate(self, cache_id: str, length: int):
+        """Keep the first `length` positions of a slab-backed entry."""
+        if cache_id not in self._lengths:
+            super().__setitem__(cache_id, self[cache_id][:, :length])
+            return
+        length = min(length, self._lengths[cache_id])
+        self._lengths[cache_id] = length
+        super().__setitem__(cache_id, self._slabs[cache_id][:self._rows[cache_id], :length])
+
+    def rearrange(self, cache_ids: List[str], source_indices: List[int]):
+        """Reorder the rows of the given entries, e.g. to follow the surviving beams."""
+        index = None
+        for cache_id in cache_ids:
+            if cache_id not in self:
+                continue
+            if cache_id not in self._lengths:
+                super().__setitem__(cache_id, self[cache_id][source_indices].detach())
+                continue
+            slab = self._slabs[cache_id]
+            rows, length = self._rows[cache_id], self._lengths[cache_id]
+            if index is None or index.device != slab.device:
+                index = torch.tensor(source_indices, device=slab.device)
+            new_rows = len(source_indices)
+            if new_rows > slab.shape[0]:
+                self[cache_id] = self[cache_id][source_indices].detach()
+                continue
+            spare = self._spares.get(cache_id)
+            if spare is None:
+                spare = self._allocate(slab, slab.shape[0])
+            torch.index_select(slab[:rows, :length], 0, index, out=spare[:new_rows, :length])
+            self._slabs[cache_id], self._spares[cache_id] = spare, slab
+            self._rows[cache_id] = new_rows
+            super().__setitem__(cache_id, spare[:new_rows, :length])
@@ -2,7 +2,7 @@ import base64
 import gzip
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import torch
@@ -11,6 +11,7 @@ from torch import Tensor, nn
 
 from .decoding import decode as decode_function
 from .decoding import detect_language as detect_language_function
+from .kv_cache import SlabKVCache
 from .transcribe import transcribe as transcribe_function
 
 try:
@@ -103,7 +104,12 @@ class MultiHeadAttention(nn.Module):
         xa: Optional[Tensor] = None,
         mask: Optional[Tensor] = None,
         kv_cache: Optional[dict] = None,
+        qk_heads: Optional[List[int]] = None,
     ):
+        """
+        qk_heads: if given, the attention logits are only materialized (and returned) for
+        these heads, and the attention output is computed with SDPA.
+        """
         q = self.query(x)
 
         if xa is None:
@@ -124,13 +130,19 @@ class MultiHeadAttention(nn.Module):
                     kv_cache[self.key_cache_id] = k
                     kv_cache[self.value_cache_id] = v
 
-        wv, qk = self.qkv_attention(q, k, v, mask)
+        if qk_heads is not None:
+            wv, qk = self.selected_heads_attention(q, k, v, mask, qk_heads, kv_cache if xa is not None else None)
+        else:
+            wv, qk = self.qkv_attention(q, k, v, mask)
         return self.out(wv), qk
 
     def _update_self_attn_cache(
         self, k: Tensor, v: Tensor, kv_cache: dict
     ) -> Tuple[Tensor, Tensor]:
         """Update self-attention kv cache by concatenating new k,v with cached values."""
+        if isinstance(kv_cache, SlabKVCache):
+            # preallocated cache: written in place
+            return kv_cache.append(self.key_cache_id, self.value_cache_id, k, v)
         if self.key_cache_id not in kv_cache or k.shape[1] > self.n_text_ctx:
             # First token or context overflow: save as-is
             kv_cache[self.key_cache_id] = k.detach()
@@ -149,21 +161,28 @@ class MultiHeadAttention(nn.Module):
         self, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor] = None
     ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
         n_batch, n_ctx, n_state = q.shape
+        # queries are the last n_ctx positions of the keys (cached prefix + new tokens)
+        n_keys = k.shape[1]
         scale = (n_state // self.n_head) ** -0.25
         q = q.view(*q.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
         k = k.view(*k.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
         v = v.view(*v.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
 
         if SDPA_AVAILABLE and MultiHeadAttention.use_sdpa:
-            a = scaled_dot_product_attention(
-                q, k, v, is_causal=mask is not None and n_ctx > 1
-            )
+            if mask is not None and n_ctx > 1 and n_keys != n_ctx:
+                a = scaled_dot_product_attention(
+                    q, k, v, attn_mask=mask[n_keys - n_ctx:n_keys, :n_keys].to(q.dtype)
+                )
+            else:
+                a = scaled_dot_product_attention(
+                    q, k, v, is_causal=mask is not None and n_ctx > 1
+                )
             out = a.permute(0, 2, 1, 3).flatten(start_dim=2)
             qk = None
         else:
             qk = (q * scale) @ (k * scale).transpose(-1, -2)
             if mask is not None:
-                qk = qk + mask[:n_ctx, :n_ctx]
+                qk = qk + mask[n_keys - n_ctx:n_keys, :n_keys]
             qk = qk.float()
 
             w = F.softmax(qk, dim=-1).to(q.dtype)
@@ -173,6 +192,49 @@ class MultiHeadAttention(nn.Module):
         return out, qk
 
 
+    def selected_heads_attention(
+        self, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor], heads: List[int],
+        kv_cache: Optional[dict] = None,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        Attention output of every head through SDPA, with the qk logits of `heads` only,
+        shape (batch, len(heads), n_ctx, n_keys), or None if `heads` is empty.
+        For cross-attention, the pre-scaled keys of `heads` are kept in `kv_cache`.
+        """
+        if not SDPA_AVAILABLE:
+            out, qk = self.qkv_attention(q, k, v, mask)
+            return out, (qk[:, heads] if heads else None)
+
+        n_batch, n_ctx, n_state = q.shape
+        n_keys = k.shape[1]
+        scale = (n_state // self.n_head) ** -0.25
+        q = q.view(*q.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+        attn_mask = None
+        if mask is not None and n_ctx > 1:
+            attn_mask = mask[n_keys - n_ctx:n_keys, :n_keys].to(q.dtype)
+        a = scaled_dot_product_attention(
+            q,
+            k.view(*k.shape[:2], self.n_head, -1).permute(0, 2, 1, 3),
+            v.view(*v.shape[:2], self.n_head, -1).permute(0, 2, 1, 3),
+            attn_mask=attn_mask,
+        )
+        out = a.permute(0, 2, 1, 3).flatten(start_dim=2)
+        if not heads:
+            return out, None
+
+        heads_key_id = f"{self.key_cache_id}_heads"
+        k_t = kv_cache.get(heads_key_id) if kv_cache is not None else None
+        if k_t is None or k_t.shape[1] != len(heads) or k_t.shape[-1] != n_keys:
+            # (batch, len(heads), head_dim, n_keys), contiguous for the per-token matmul
+            k_t = (k.view(*k.shape[:2], self.n_head, -1)[:, :, heads] * scale).permute(0, 2, 3, 1).contiguous()
+            if kv_cache is not None:
+                kv_cache[heads_key_id] = k_t
+        qk = (q[:, heads] * scale) @ k_t
+        if mask is not None:
+            qk = qk + mask[n_keys - n_ctx:n_keys, :n_keys]
+        return out, qk.float().detach()
+
+
 class ResidualAttentionBlock(nn.Module):
     def __init__(
         self, n_state: int, n_head: int, cross_attention: bool = False, 
@@ -204,17 +266,22 @@ class ResidualAttentionBlock(nn.Module):
         xa: Optional[Tensor] = None,
         mask: Optional[Tensor] = None,
         kv_cache: Optional[dict] = None,
+        cross_attn_heads: Optional[List[int]] = None,
     ) -> Tuple[Tensor, Optional[Tensor]]:
         """
+        cross_attn_heads: if given, only the cross-attention weights of these heads are
+            computed, and every attention output goes through SDPA.
+
         Returns:
             x: The output tensor
             cross_attn_qk: Cross-attention weights (if cross_attn exists), else None
         """
-        x = x + self.attn(self.attn_ln(x), mask=mask, kv_cache=kv_cache)[0]
+        self_attn_heads = None if cross_attn_heads is None else []
+        x = x + self.attn(self.attn_ln(x), mask=mask, kv_cache=kv_cache, qk_heads=self_attn_heads)[0]
         cross_attn_qk = None
         if self.cross_attn:
             cross_out, cross_attn_qk = self.cross_attn(
-                self.cross_attn_ln(x), xa, kv_cache=kv_cache
+                self.cross_attn_ln(x), xa, kv_cache=kv_cache, qk_heads=cross_attn_heads
             )
             x = x + cross_out
         x = x + self.mlp(self.mlp_ln(x))
@@ -238,14 +305,19 @@ class AudioEncoder(nn.Module):
     def forward(self, x: Tensor):
         """
         x : torch.Tensor, shape = (batch_size, n_mels, n_ctx)
-            the mel spectrogram of the audio
+            the mel spectrogram of the audio. It can be shorter than 30s (dynamic audio
+            context): the positional embedding is then sliced to the encoded length
         """
         x = F.gelu(self.conv1(x))
         x = F.gelu(self.conv2(x))
         x = x.permute(0, 2, 1)
 
-        assert x.shape[1:] == self.positional_embedding.shape, "incorrect audio shape"
-        x = (x + self.positional_embedding).to(x.dtype)
+        n_audio_ctx = x.shape[1]
+        assert (
+            n_audio_ctx <= self.positional_embedding.shape[0]
+            and x.shape[2] == self.positional_embedding.shape[1]
+        ), "incorrect audio shape"
+        x = (x + self.positional_embedding[:n_audio_ctx]).to(x.dtype)
 
         for block in self.blocks:
             x, _ = block(x)  # Encoder blocks don't have cross-attention
@@ -284,6 +356,7 @@ class TextDecoder(nn.Module):
         xa: Tensor, 
         kv_cache: Optional[dict] = None,
         return_cross_attn: bool = False,
+        alignment_heads: Optional[Dict[int, List[int]]] = None,
     ):
         """
         x : torch.LongTensor, shape = (batch_size, <= n_ctx)
@@ -294,6 +367,10 @@ class TextDecoder(nn.Module):
             Dictionary to store/retrieve key-value cache for efficient decoding
         return_cross_attn : bool
             If True, return cross-attention weights from all decoder layers
+        alignment_heads : Optional[Dict[int, List[int]]]
+            Heads to return the cross-attention weights of, by layer. The weights of the
+            other heads are not computed (SDPA), and the cross_attns entry of a layer
+            without alignment heads is None
             
         Returns
         -------
@@ -317,9 +394,10 @@ class TextDecoder(nn.Module):
         x = x.to(xa.dtype)
 
         cross_attns = [] if return_cross_attn else None
-        for block in self.blocks:
-            x, cross_attn_qk = block(x, xa, mask=self.mask, kv_cache=kv_cache)
-            if return_cross_attn and cross_attn_qk is not None:
+        for layer, block in enumerate(self.blocks):
+            heads = None if alignment_heads is None else alignment_heads.get(layer, [])
+            x, cross_attn_qk = block(x, xa, mask=self.mask, kv_cache=kv_cache, cross_attn_heads=heads)
+            if return_cross_attn and (cross_attn_qk is not None or alignment_heads is not None):
                 cross_attns.append(cross_attn_qk)
 
         x = self.ln(x)
@@ -378,11 +456,13 @@ class Whisper(nn.Module):
         audio_features: torch.Tensor,
         kv_cache: Optional[dict] = None,
         return_cross_attn: bool = False,
+        alignment_heads: Optional[Dict[int, List[int]]] = None,
     ):
         return self.decoder(
             tokens, audio_features, 
             kv_cache=kv_cache, 
-            return_cross_attn=return_cross_attn
+            return_cross_attn=return_cross_attn,
+            alignment_heads=alignment_heads,
         )
 
     def forward(